@@ -0,0 +1,82 @@
+"""
+Compares two benchmark results - metrics that got worse by more than the threshold are regressions.
+
+    python benchmarks/compare.py baseline.json results.json [--threshold 10]
+"""
+import json
+import sys
+from argparse import ArgumentParser
+
+from cmd2.table_creator import Column, SimpleTable
+
+# Everything else is a time, memory or thread count - lower is better
+_HIGHER_IS_BETTER = ("_per_second",)
+# Counts that depend on the run rather than on pywb's performance
+_IGNORED = ("notifications",)
+DEFAULT_THRESHOLD = 10
+# Timings closer than this are within the noise of the machine, whatever the percentage
+DEFAULT_MIN_SECONDS = 0.005
+
+
+def _load(results_path) -> dict:
+    with open(results_path, "r") as f:
+        report = json.load(f)
+    return {(r["suite"], r["backend"], r["engine"], r["size"]): r.get("metrics") for r in report["results"]}
+
+
+def _change(metric, old, new):
+    if old is None or new is None or old == 0:
+        return None
+    change = 100 * (new - old) / old
+    # Positive is always an improvement
+    return change if metric.endswith(_HIGHER_IS_BETTER) else -change
+
+
+def compare(baseline_path, results_path, threshold=DEFAULT_THRESHOLD, min_seconds=DEFAULT_MIN_SECONDS) -> int:
+    baseline, results = _load(baseline_path), _load(results_path)
+    rows = []
+    regressions = 0
+    for key, metrics in results.items():
+        old_metrics = baseline.get(key)
+        if not metrics or not old_metrics:
+            continue
+        suite, backend, engine, size = key
+        case = "%s[%s%s] x%d" % (suite, backend, "/%s" % engine if engine else "", size)
+        for metric, new in metrics.items():
+            if metric in _IGNORED:
+                continue
+            old = old_metrics.get(metric)
+            change = _change(metric, old, new)
+            verdict = ""
+            if "_seconds" in metric and old is not None and new is not None and abs(new - old) < min_seconds:
+                pass
+            elif change is not None and change < -threshold:
+                verdict = "REGRESSION"
+                regressions += 1
+            elif change is not None and change > threshold:
+                verdict = "improved"
+            rows.append([case, metric, "%.6g" % old if old is not None else "-",
+                         "%.6g" % new if new is not None else "-",
+                         "%+.1f%%" % change if change is not None else "-", verdict])
+
+    columns = [Column("Case", width=32), Column("Metric", width=34), Column("Baseline", width=12),
+               Column("Result", width=12), Column("Better", width=9), Column("", width=10)]
+    print(SimpleTable(columns).generate_table(rows, row_spacing=0) if rows else "NO CASES IN COMMON")
+    print("\nREGRESSIONS (> %d%%): (%d)" % (threshold, regressions))
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(description="Compares two pywb benchmark results")
+    parser.add_argument("baseline", help="JSON results to compare against")
+    parser.add_argument("results", help="JSON results of the run to check")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="percent a metric may get worse before it counts as a regression")
+    parser.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS,
+                        help="timings changing by less than this are never regressions")
+    args = parser.parse_args(argv)
+    return compare(args.baseline, args.results, args.threshold, args.min_seconds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
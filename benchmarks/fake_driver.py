@@ -0,0 +1,141 @@
+from hashlib import blake2b
+from itertools import count
+from time import sleep
+
+from fixtures import product_page
+from lxml import html
+
+from pywb.web.browser import _SCRAPE_SCRIPT, _SNAPSHOT_SCRIPT, _WAIT_ON_PAGE_SCRIPT, _Browser
+
+# Load time reported to the waits of the browser - in ms, like the page's navigation timing
+_LOAD_TIME_MS = 100.0
+
+
+class _Window(object):
+    __slots__ = ("url", "source", "document", "fingerprint")
+
+    def __init__(self, url) -> None:
+        self.url = url
+        self.source = self.document = None
+        # Fingerprint of the last scrape while the document is unchanged - the script's mutation observer
+        self.fingerprint = None
+
+
+class _SwitchTo(object):
+    def __init__(self, driver) -> None:
+        self.__driver = driver
+
+    def window(self, window_handle) -> None:
+        self.__driver.command()
+        if window_handle not in self.__driver.windows:
+            raise RuntimeError("No such window '%s'" % window_handle)
+        self.__driver.current = window_handle
+
+
+class FakeDriver(object):
+    """
+    The part of the WebDriver API the browser uses, answered in process. Pages are the
+    fixture product pages, parsed with lxml on first load - scrape xpaths are evaluated
+    against them like the scrape script would in the browser. Every command sleeps for
+    latency seconds to stand in for the round trip to a real driver.
+    """
+    _handles = count()
+
+    def __init__(self, latency=0) -> None:
+        self.latency = latency
+        self.commands = 0
+        self.windows = {}
+        self.current = self.__new_window("about:blank")
+        self.switch_to = _SwitchTo(self)
+
+    def __new_window(self, url) -> str:
+        window_handle = "window-%d" % next(self._handles)
+        self.windows[window_handle] = _Window(url)
+        return window_handle
+
+    def command(self) -> None:
+        self.commands += 1
+        if self.latency:
+            sleep(self.latency)
+
+    def __document(self, window):
+        if window.document is None and window.url != "about:blank":
+            window.source = product_page(int(window.url.rsplit("/", 1)[1]))
+            window.document = html.document_fromstring(window.source)
+        return window.document
+
+    @property
+    def window_handles(self) -> list:
+        self.command()
+        return list(self.windows)
+
+    @property
+    def current_window_handle(self) -> str:
+        self.command()
+        return self.current
+
+    def get(self, url) -> None:
+        self.command()
+        self.windows[self.current] = _Window(url)
+
+    def set_script_timeout(self, timeout) -> None:
+        self.command()
+
+    def execute_async_script(self, script, *args):
+        self.command()
+        if script == _WAIT_ON_PAGE_SCRIPT:
+            return _LOAD_TIME_MS
+        raise NotImplementedError("Unknown async script")
+
+    def execute_script(self, script, *args):
+        self.command()
+        if script == _SCRAPE_SCRIPT:
+            return self.__scrape(*args)
+        if script == _SNAPSHOT_SCRIPT:
+            return html.tostring(self.__document(self.windows[self.current]), encoding="unicode")
+        if script.startswith("window.open("):
+            self.__new_window(script.split("'")[1])
+        if "location.reload()" in script:
+            # A new document to the script, even though the (static) fixture page stays as it is
+            self.windows[self.current].fingerprint = None
+        return None
+
+    def __scrape(self, xpaths, attributes, max_text, use_fingerprint, last_fingerprint):
+        window = self.windows[self.current]
+        document = self.__document(window)
+        fingerprint = None
+        if use_fingerprint:
+            # Like the script - the page is hashed before any xpath is evaluated. Fixture pages are static,
+            # so their source stands in for the browser's (native) serialization
+            if window.fingerprint is not None and window.fingerprint == last_fingerprint:
+                return [last_fingerprint, None]
+            fingerprint = window.fingerprint = blake2b(window.source, digest_size=8).hexdigest()
+            if fingerprint == last_fingerprint:
+                return [fingerprint, None]
+        return [fingerprint, [[[e.tag, e.text_content().strip()[:max_text],
+                                {a: e.get(a) for a in attributes if e.get(a) is not None}]
+                               for e in document.xpath(xpath)] for xpath in xpaths]]
+
+    def get_screenshot_as_png(self) -> bytes:
+        self.command()
+        return b""
+
+    def close(self) -> None:
+        self.command()
+        del self.windows[self.current]
+
+    def quit(self) -> None:
+        self.command()
+        self.windows = {}
+
+
+class FakeBrowser(_Browser):
+    # Driver latency of every fake browser - set once by the benchmark before browsers are created
+    LATENCY = 0
+
+    def load_driver(self) -> None:
+        super().load_driver()
+        self._driver = FakeDriver(self.LATENCY)
+
+    def emulate_location(self, g_lat, g_long) -> None:
+        super().emulate_location(g_lat, g_long)
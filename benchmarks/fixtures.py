@@ -0,0 +1,66 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+# Product pages are padded with listings - scrapes search a document of realistic size
+FILLER_ITEMS = 200
+WATCH_TEXT = "Add to cart"
+
+
+def product_url(base_url, i) -> str:
+    return "%s/product/%d" % (base_url, i)
+
+
+def product_page(i) -> bytes:
+    filler = "".join('<li class="listing"><a href="/product/%d">Related item %d</a><span>$%d.99</span></li>'
+                     % (j, j, j % 100) for j in range(FILLER_ITEMS))
+    # Every other product is in stock - half of the scrapes have a match to report
+    buy = '<button id="buy-%d" class="buy">%s</button>' % (i, WATCH_TEXT) if i % 2 == 0 else \
+        '<button id="buy-%d" class="buy" disabled>Sold out</button>' % i
+    return ("<!DOCTYPE html><html><head><title>Product %d</title></head><body>"
+            "<h1>Product %d</h1><div id=\"product\">%s</div><ul>%s</ul></body></html>"
+            % (i, i, buy, filler)).encode("utf-8")
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    # Keep-alive - the Http backend reuses its connections like it does against real sites
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately - without this, delayed acks stall every response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parts = self.path.split("/")
+        if len(parts) != 3 or parts[1] != "product" or not parts[2].isdigit():
+            self.send_error(404)
+            return
+        body = product_page(int(parts[2]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+class FixtureServer(object):
+    """
+    Serves the product pages on a free local port - stands in for real sites so the http
+    backend can be benchmarked without a network.
+    """
+
+    def __init__(self) -> None:
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+        self.__server.daemon_threads = True
+        self.__thread = Thread(target=self.__server.serve_forever, name="pywb-bench-fixtures", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return "http://127.0.0.1:%d" % self.__server.server_address[1]
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
@@ -0,0 +1,92 @@
+"""
+Import-time budget of pywb - imports each entry point in a fresh interpreter (python -X importtime)
+and fails when one takes longer than its budget or pulls in a dependency it shouldn't need yet.
+
+    python benchmarks/import_time.py [--repeat 5] [--scale 1]
+"""
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from os import path
+from time import perf_counter
+
+from cmd2.table_creator import Column, SimpleTable
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Loaded once a browser, notifier or table is actually needed
+_BACKENDS = ("selenium", "lxml", "notify_run", "notifypy", "requests")
+# (module, budget in ms, modules it must not import)
+CASES = (
+    ("pywb.cli", 10, _BACKENDS + ("cmd2", "yaml", "psutil", "asyncio", "pywb.core", "pywb.web", "pywb.settings")),
+    # What 'pywb ctl' imports to talk to the daemon
+    ("pywb.core.control", 10, _BACKENDS + ("cmd2", "yaml", "psutil", "asyncio", "pywb.settings", "pywb.core.service")),
+    ("pywb.core.run_manager", 150, _BACKENDS + ("cmd2", "yaml")),
+    ("pywb.app", 1000, _BACKENDS),
+)
+# Wall clock of 'python -m pywb --version' over the bare interpreter ('python -c pass')
+VERSION_BUDGET = 50
+
+_IMPORT_SCRIPT = "import json, sys; before = set(sys.modules); import %s; print(json.dumps(sorted(set(sys.modules) - before)))"
+
+
+def _python(*args, **kwargs) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + list(args), cwd=ROOT, capture_output=True, text=True, check=True, **kwargs)
+
+
+def measure_import(module, repeat) -> tuple:
+    best = None
+    for _ in range(repeat):
+        proc = _python("-X", "importtime", "-c", _IMPORT_SCRIPT % module)
+        # import time: self [us] | cumulative | imported package - the module itself is the outermost entry
+        for line in proc.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].rstrip() == " " + module:
+                cumulative = int(fields[1]) / 1000
+                best = cumulative if best is None else min(best, cumulative)
+    return best, json.loads(proc.stdout)
+
+
+def measure_version(repeat) -> float:
+    def best_of(*args):
+        timings = []
+        for _ in range(repeat):
+            started = perf_counter()
+            _python(*args)
+            timings.append(perf_counter() - started)
+        return min(timings) * 1000
+    return best_of("-m", "pywb", "--version") - best_of("-c", "pass")
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(description="Checks the import time of pywb against its budget")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each case - the fastest one counts")
+    parser.add_argument("--scale", type=float, default=1, help="factor applied to every budget (slow machines)")
+    args = parser.parse_args(argv)
+
+    rows = []
+    failures = 0
+    for module, budget, forbidden in CASES:
+        took, imported = measure_import(module, args.repeat)
+        loaded = sorted({m.split(".")[0] if not m.startswith("pywb.") else m for m in imported
+                         if any(m == f or m.startswith(f + ".") for f in forbidden)})
+        failed = took is None or took > budget * args.scale or bool(loaded)
+        failures += failed
+        rows.append([module, "%.1f" % took if took is not None else "-", "%.0f" % (budget * args.scale),
+                     ", ".join(loaded) or "-", "OVER BUDGET" if failed else "ok"])
+    took = measure_version(args.repeat)
+    failed = took > VERSION_BUDGET * args.scale
+    failures += failed
+    rows.append(["pywb --version", "%.1f" % took, "%.0f" % (VERSION_BUDGET * args.scale), "-",
+                 "OVER BUDGET" if failed else "ok"])
+
+    columns = [Column("Import", width=24), Column("Took (ms)", width=10), Column("Budget (ms)", width=12),
+               Column("Imported too early", width=40), Column("", width=12)]
+    print(SimpleTable(columns).generate_table(rows, row_spacing=0))
+    print("\nOVER BUDGET: (%d)" % failures)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
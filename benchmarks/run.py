@@ -0,0 +1,283 @@
+"""
+Offline benchmarks of pywb - runs the bot against a fake WebDriver (and the http backend
+against a local fixture server) and writes the results as JSON to compare between runs.
+
+    python benchmarks/run.py [--sizes 1,10,100,1000] [--output results.json] [--baseline old.json]
+"""
+import gc
+import json
+import platform
+import sys
+import tempfile
+from argparse import ArgumentParser
+from datetime import datetime
+from multiprocessing import get_context
+from os import environ, makedirs, path
+from threading import active_count
+from time import perf_counter, sleep
+
+# Benchmarks the working tree, not whatever version of pywb is installed
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+# Logs of the runs don't belong with the bot's own
+environ.setdefault("PYWB_LOG_DIR", path.join(tempfile.gettempdir(), "pywb-benchmarks"))
+
+import psutil  # noqa: E402
+from fake_driver import FakeBrowser  # noqa: E402
+from fixtures import WATCH_TEXT, FixtureServer, product_url  # noqa: E402
+
+from pywb import VERSION  # noqa: E402
+from pywb.core.action import Action  # noqa: E402
+from pywb.core.logger import LOG_DIR, set_logger_output_path  # noqa: E402
+from pywb.core.metrics import METRICS  # noqa: E402
+from pywb.core.plugin_manager import PluginManager  # noqa: E402
+from pywb.core.run_manager import RunManager, RunManagerStatus  # noqa: E402
+from pywb.core.runner import RunConfig  # noqa: E402
+from pywb.web import By, Http  # noqa: E402
+
+BACKENDS = {"fake": FakeBrowser, "http": Http}
+ENGINES = ("thread", "async")
+DEFAULT_SIZES = (1, 10, 100, 1000)
+# Pages of the fake backend are generated in process - the url only carries the product number
+FAKE_BASE_URL = "http://fixtures.invalid"
+FIRST_SCRAPE_TIMEOUT = 300
+
+
+class _CountingNotifier(object):
+    def __init__(self) -> None:
+        self.sent = 0
+
+    def notify(self, title, message, link) -> None:
+        self.sent += 1
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def _rss() -> int:
+    gc.collect()
+    return psutil.Process().memory_info().rss
+
+
+class _Samples(object):
+    # Every observation of the timed metrics - histogram buckets are too coarse for sub-ms checks
+    def __init__(self, names) -> None:
+        self.recording = False
+        self.samples = {name: [] for name in names}
+        self.__observe = METRICS.observe
+        METRICS.observe = self.__record
+
+    def __record(self, name, value, **labels) -> None:
+        self.__observe(name, value, **labels)
+        if self.recording and name in self.samples:
+            self.samples[name].append(value)
+
+    def describe(self, name, prefix) -> dict:
+        samples = sorted(self.samples[name])
+        if not samples:
+            return {"%s_mean" % prefix: None, "%s_p50" % prefix: None, "%s_p95" % prefix: None,
+                    "%s_max" % prefix: None}
+        return {"%s_mean" % prefix: sum(samples) / len(samples),
+                "%s_p50" % prefix: samples[len(samples) // 2],
+                "%s_p95" % prefix: samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "%s_max" % prefix: samples[-1]}
+
+
+def _n_observed(name) -> int:
+    return sum(h[2] for (metric, _), h in METRICS.snapshot()[0].items() if metric == name)
+
+
+def _make_actions(base_url, n_actions) -> list:
+    return [Action("bench-%d" % i, "InStockNotifier", [product_url(base_url, i)],
+                   watch=["Button"], text=[WATCH_TEXT], notify_on=["Appear"]) for i in range(n_actions)]
+
+
+def bench_run_manager(backend, engine, n_actions, base_url, args) -> dict:
+    """Whole bot - run manager, runners and InStockNotifier checking n actions."""
+    set_logger_output_path(path.join(LOG_DIR, "%s-%s-%d.out" % (backend, engine, n_actions)))
+    METRICS.reset()
+    samples = _Samples(("check_seconds", "scrape_seconds"))
+    plugin_manager = PluginManager()
+    plugin_manager.load_builtin_plugins()
+    notifier = _CountingNotifier()
+    run_cfg = RunConfig(actions_path="benchmark", refresh_rate=args.refresh_rate, notifier=notifier,
+                        max_browsers=args.max_browsers, engine=engine, max_concurrency=args.max_browsers)
+    run_manager = RunManager(actions=_make_actions(base_url, n_actions), plugins=plugin_manager.loaded_plugins,
+                             browser=BACKENDS[backend], run_cfg=run_cfg)
+    rss_before = _rss()
+
+    started = perf_counter()
+    run_manager.start()
+    while run_manager.status < RunManagerStatus.RUNNING and run_manager.is_alive():
+        sleep(0.001)
+    startup = perf_counter() - started
+    # Ready once every action has been scraped - its urls are loaded and its first check is done
+    while _n_observed("scrape_seconds") < n_actions:
+        if perf_counter() - started > FIRST_SCRAPE_TIMEOUT or not run_manager.is_alive():
+            raise RuntimeError("Actions were not scraped within %ds" % FIRST_SCRAPE_TIMEOUT)
+        sleep(0.01)
+    first_scrape = perf_counter() - started
+
+    # Warm up checks are left out - only what's observed during the window counts
+    samples.recording = True
+    window_started = perf_counter()
+    sleep(args.duration)
+    samples.recording = False
+    window = perf_counter() - window_started
+    rss_after = _rss()
+    threads = active_count()
+
+    started = perf_counter()
+    run_manager.shut_down()
+    run_manager.join()
+    shutdown = perf_counter() - started
+
+    result = {"startup_seconds": startup, "ready_seconds": first_scrape, "shutdown_seconds": shutdown,
+              "checks_per_second": len(samples.samples["check_seconds"]) / window,
+              "scrapes_per_second": len(samples.samples["scrape_seconds"]) / window,
+              "memory_per_action_bytes": (rss_after - rss_before) / n_actions, "threads": threads,
+              "notifications": notifier.sent}
+    result.update(samples.describe("check_seconds", "cycle_seconds"))
+    result.update(samples.describe("scrape_seconds", "scrape_seconds"))
+    return result
+
+
+def bench_browser(backend, n_urls, base_url, args) -> dict:
+    """Browser on its own - one session loading, refreshing and scraping n urls."""
+    urls = [product_url(base_url, i) for i in range(n_urls)]
+    browser = BACKENDS[backend]()
+    browser.load_driver()
+    result = {}
+    started = perf_counter()
+    browser.load_urls(urls)
+    result["load_urls_seconds_per_url"] = (perf_counter() - started) / n_urls
+
+    started = perf_counter()
+    for _ in range(args.repeat):
+        browser.refresh_sites()
+    result["refresh_sites_seconds_per_url"] = (perf_counter() - started) / (args.repeat * n_urls)
+
+    bys, texts = [By.BUTTON] * n_urls, [WATCH_TEXT] * n_urls
+    started = perf_counter()
+    for _ in range(args.repeat):
+        browser.scrape(urls, bys, texts)
+    result["scrape_seconds_per_url"] = (perf_counter() - started) / (args.repeat * n_urls)
+
+    # Unchanged pages - scrapes are answered from the fingerprint cache after the first one
+    browser.fingerprint = True
+    browser.refresh_sites()
+    browser.scrape(urls, bys, texts)
+    started = perf_counter()
+    for _ in range(args.repeat):
+        if backend == "http":
+            # Fingerprints of the http backend are taken when a page is fetched
+            browser.refresh_sites()
+        browser.scrape(urls, bys, texts)
+    result["fingerprint_scrape_seconds_per_url"] = (perf_counter() - started) / (args.repeat * n_urls)
+
+    # Unchanged pages after a refresh - a new document, fingerprinted again
+    started = perf_counter()
+    for _ in range(args.repeat):
+        browser.refresh_sites()
+        browser.scrape(urls, bys, texts)
+    result["refreshed_fingerprint_scrape_seconds_per_url"] = (perf_counter() - started) / (args.repeat * n_urls)
+
+    started = perf_counter()
+    browser.quit()
+    result["quit_seconds"] = perf_counter() - started
+    return result
+
+
+def _run_case(case, base_url, args, conn) -> None:
+    FakeBrowser.LATENCY = args.driver_latency
+    suite, backend, engine, size = case
+    try:
+        if suite == "browser":
+            result = bench_browser(backend, size, base_url, args)
+        else:
+            result = bench_run_manager(backend, engine, size, base_url, args)
+        conn.send((result, None))
+    except Exception as e:
+        conn.send((None, "%s: %s" % (type(e).__name__, str(e))))
+
+
+def run_isolated(case, base_url, args) -> dict:
+    # Every case gets a fresh process - memory and threads of earlier cases don't carry over
+    ctx = get_context("spawn")
+    conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_run_case, args=(case, base_url, args, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        result, error = conn.recv()
+    except EOFError:
+        result, error = None, "benchmark process exited with code %s" % process.exitcode
+    process.join()
+    if error:
+        raise RuntimeError(error)
+    return result
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(description="Offline benchmarks of pywb")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma separated numbers of actions (and urls) to benchmark")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma separated browser backends")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma separated run engines")
+    parser.add_argument("--suites", default="browser,run_manager", help="comma separated suites to run")
+    parser.add_argument("--duration", type=float, default=10, help="seconds each run manager case is measured")
+    parser.add_argument("--refresh-rate", type=float, default=1, help="refresh rate of the actions")
+    parser.add_argument("--max-browsers", type=int, default=4, help="pooled browsers of the run manager")
+    parser.add_argument("--driver-latency", type=float, default=0,
+                        help="seconds every fake driver command takes (round trip to a real driver)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of each browser operation")
+    parser.add_argument("--output", help="path of the JSON results (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    backends = args.backends.split(",")
+    suites = args.suites.split(",")
+    cases = []
+    for suite in suites:
+        for backend in backends:
+            engines = args.engines.split(",") if suite == "run_manager" else [None]
+            cases.extend((suite, backend, engine, size) for engine in engines for size in sizes)
+
+    # Runs in this process while the cases run in theirs - serving pages doesn't compete with pywb
+    fixture_server = FixtureServer()
+    fixture_server.start()
+    results = []
+    try:
+        for case in cases:
+            suite, backend, engine, size = case
+            base_url = fixture_server.base_url if backend == "http" else FAKE_BASE_URL
+            print("Running %s[%s%s] with %d action(s)..." % (suite, backend, "/%s" % engine if engine else "", size),
+                  flush=True)
+            entry = {"suite": suite, "backend": backend, "engine": engine, "size": size}
+            try:
+                entry["metrics"] = run_isolated(case, base_url, args)
+            except RuntimeError as e:
+                print("  failed - %s" % str(e), flush=True)
+                entry["error"] = str(e)
+            results.append(entry)
+    finally:
+        fixture_server.stop()
+
+    output = args.output or path.join(path.dirname(path.abspath(__file__)), "results",
+                                      "%s.json" % datetime.now().strftime("%Y%m%d-%H%M%S"))
+    makedirs(path.dirname(path.abspath(output)), exist_ok=True)
+    report = {"pywb_version": VERSION, "python": platform.python_version(), "platform": platform.platform(),
+              "cpus": psutil.cpu_count(), "created": datetime.now().isoformat(timespec="seconds"),
+              "settings": vars(args), "results": results}
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote results to '%s'" % output)
+
+    if args.baseline:
+        from compare import compare
+        return compare(args.baseline, output)
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,3 +5,5 @@ Pyww module variables for versioning and misc env keys
 VERSION = "0.0.1a0"
 ENVIRON_DEBUG_KEY = "PYWB_DEBUG"
 ENVIRON_LOG_DIR_KEY = "PYWB_LOG_DIR"
+ENVIRON_PROFILE_KEY = "PYWB_PROFILE"
+ENVIRON_SOCKET_KEY = "PYWB_SOCKET"
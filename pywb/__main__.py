@@ -2,7 +2,9 @@
 Main entry used with 'python -m'
 """
 
-from pywb import app
+import sys
+
+from pywb import cli
 
 if __name__ == "__main__":
-    app.run()
+    sys.exit(cli.run())
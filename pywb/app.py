@@ -8,20 +8,18 @@ Functions
 
 from argparse import Namespace
 from atexit import register
+from os import path
 from sys import exit, stdout
-from time import sleep
 
 from cmd2 import Cmd, Cmd2ArgumentParser, ansi, with_argparser
 
 from pywb.ascii.ascii import generate_ascii_art
-from pywb.core.action import parse_actions
-from pywb.core.logger import set_logger_output_path
-from pywb.core.notifier import Notifier
+from pywb.core.control import ControlClient
+from pywb.core.metrics import METRICS
 from pywb.core.plugin_manager import PluginManager
-from pywb.core.run_manager import RunManager, RunManagerStatus
-from pywb.core.runner import RunConfig
+from pywb.core.run_manager import RunEngine, RunManagerStatus
+from pywb.core.service import BotService
 from pywb.settings import SETTINGS
-from pywb.web import BrowserType
 
 
 class _App(Cmd):
@@ -44,12 +42,12 @@ class _App(Cmd):
         super().__init__()
         SETTINGS.app_ctx = self
         SETTINGS.load()
-        set_logger_output_path(SETTINGS.log_path)
+        SETTINGS.configure_logging()
 
         # Set defaults
         self.prompt = "(pywb) > "
         self.__plugin_manager = PluginManager()
-        self.__run_manager = RunManager()
+        self.__service = BotService(self.__plugin_manager)
 
     def cmdloop(self, intro=None):
         register(self.__shutdown_bot)
@@ -77,77 +75,137 @@ class _App(Cmd):
     start = service.add_parser("start", help="starts the pywb service")
     start.add_argument("--actions", "-a", completer=Cmd.path_complete,
                        help="actions yaml file for the web bot to run")
+    start.add_argument("--engine", "-e", choices=[i.name.lower() for i in RunEngine],
+                       help="engine running the actions (defaults to the 'engine' setting)")
     restart = service.add_parser("restart", help="restarts the pywb service")
+    reload = service.add_parser(
+        "reload", help="applies changes of the actions file - only changed actions are restarted")
     stop = service.add_parser("stop", help="stops the pywb service")
+    profile = service.add_parser("profile", help="samples where a runner spends its time")
+    profile.add_argument("runner_id", type=int, help="id of the runner (see 'bot status')")
+    profile.add_argument("seconds", type=int, help="seconds to sample the runner for")
     status = service.add_parser(
         "status", help="gets a status on the state of the pywb service")
+    stats = service.add_parser(
+        "stats", help="shows timings, counters and resource usage recorded by the pywb service")
+    stats.add_argument("--prometheus", "-p", action="store_true",
+                       help="prints the stats in the prometheus text format")
 
     @with_argparser(bot_cmd_parser)
     def do_bot(self, ns: Namespace) -> None:
         statement_args = ns.cmd2_statement.get().args.split()
-        if len(statement_args) == 0:
-            self.__write_ansi_table(self.__run_manager.generate_status_table,
-                                    extended=(self.__run_manager.status == RunManagerStatus.RUNNING))
+        service_cmd = statement_args[0] if statement_args else None
+        daemon = self.__daemon()
+        if daemon and service_cmd != "profile":
+            self.__control_daemon(daemon, service_cmd or "status", ns)
             return
 
-        service_cmd = statement_args[0]
-        if service_cmd == "start":
+        run_manager = self.__service.run_manager
+        if service_cmd is None:
+            self.__write_ansi_table(run_manager.generate_status_table,
+                                    extended=(run_manager.status == RunManagerStatus.RUNNING))
+        elif service_cmd == "start":
             if not ns.actions:
                 self.perror(
                     "Unable to start pywb service - Missing actions .yaml file")
                 return
-            self.__start_bot_service(ns.actions)
+            self.__start_bot_service(ns.actions, engine=ns.engine)
         elif service_cmd == "restart":
-            actions_path = self.__run_manager.run_cfg.actions_path
+            actions_path = run_manager.run_cfg.actions_path
+            engine = run_manager.run_cfg.engine
             # Stop the service
             self.__stop_bot_service(blocking=True)
             # Start the copied run manager
-            self.__start_bot_service(actions_path)
+            self.__start_bot_service(actions_path, engine=engine)
+        elif service_cmd == "reload":
+            self.__reload_bot_service()
         elif service_cmd == "status":
-            self.__write_ansi_table(self.__run_manager.generate_status_table,
-                                    extended=(self.__run_manager.status == RunManagerStatus.RUNNING))
+            self.__write_ansi_table(self.__service.generate_status_table)
+        elif service_cmd == "stats":
+            if ns.prometheus:
+                self.poutput(METRICS.render_prometheus())
+            else:
+                self.__write_ansi_table(METRICS.generate_stats_table)
+        elif service_cmd == "profile":
+            if run_manager.status != RunManagerStatus.RUNNING:
+                self.perror("Unable to profile - the pywb service is not running")
+                return
+            try:
+                output_path = run_manager.profile_runner(ns.runner_id, ns.seconds)
+            except (RuntimeError, ValueError) as e:
+                self.perror("Unable to profile - %s" % str(e))
+                return
+            self.poutput("Profiling runner %d for %ds - writing to '%s.collapsed/.txt'" % (
+                ns.runner_id, ns.seconds, output_path))
         elif service_cmd == "stop":
             # Stop the service
             self.__stop_bot_service()
 
-    def __start_bot_service(self, actions_path):
-        # Only can have one run manager
-        if self.__run_manager.status >= RunManagerStatus.SHUTTING_DOWN:
-            self.perror("The pywb service is already running!")
+    def __daemon(self):
+        # Bot commands go to a 'pywb serve' daemon when one listens - unless the service runs in this shell
+        if self.__service.status >= RunManagerStatus.SHUTTING_DOWN:
+            return None
+        daemon = ControlClient()
+        return daemon if daemon.available() else None
+
+    def __control_daemon(self, daemon, service_cmd, ns):
+        try:
+            if service_cmd == "start":
+                if not ns.actions:
+                    self.perror("Unable to start pywb service - Missing actions .yaml file")
+                    return
+                # The daemon doesn't share the shell's working directory
+                result = daemon.request("start", actions=path.abspath(ns.actions), engine=ns.engine)
+                for warning in result["warnings"]:
+                    self.pwarning("WARNING: %s" % warning)
+            elif service_cmd == "restart":
+                # Waits on the runners of the daemon to exit - however long that takes
+                info = ControlClient(daemon.socket_path, timeout=None).request("stop", wait=True)
+                if not info["actions_path"]:
+                    self.perror("Unable to restart - the pywb daemon has not run any actions")
+                    return
+                daemon.request("start", actions=info["actions_path"], engine=info["engine"])
+            elif service_cmd == "reload":
+                self.poutput("Reloaded actions - %(started)d started, %(stopped)d stopped, %(reconfigured)d "
+                             "reconfigured, %(unchanged)d unchanged" % daemon.request("reload"))
+            elif service_cmd == "stop":
+                daemon.request("stop")
+                self.poutput("Stop signaled for pywb service...")
+            elif service_cmd == "stats":
+                stats = daemon.request("stats", prometheus=ns.prometheus, table=not ns.prometheus)
+                self.__write_ansi_table(lambda: stats["prometheus"] if ns.prometheus else stats["table"])
+                return
+            info = daemon.request("status", table=True)
+            self.poutput("\npywb daemon at '%s'" % daemon.socket_path)
+            self.__write_ansi_table(lambda: info["table"])
+        except (RuntimeError, ValueError, OSError) as e:
+            self.perror("pywb daemon at '%s' - %s" % (daemon.socket_path, str(e)))
+
+    def __start_bot_service(self, actions_path, engine=None):
+        try:
+            warnings = self.__service.start(actions_path, engine=engine)
+        except RuntimeError as e:
+            self.perror(str(e))
             return
-
-        # Parse the actions from the yaml file
-        actions = parse_actions(actions_path)
-        # Get a local copy of the plugins loaded right now
-        plugins = self.__plugin_manager.loaded_plugins
-        run_cfg = RunConfig(actions_path=actions_path,
-                            refresh_rate=SETTINGS.refresh_rate,
-                            geolocation=SETTINGS.geolocation,
-                            notifier=Notifier(
-                                remote_notifications=SETTINGS.remote_notifications))
-        # Not started only is set when the thread is new
-        self.__run_manager = RunManager(
-            actions=actions, plugins=plugins, browser=BrowserType[SETTINGS.browser.upper()].value, run_cfg=run_cfg)
-
-        # Detaching run manager execution from cmd2 to respond to ctrl+d properly - using atexit.register to cleanup properly
-        self.__run_manager.daemon = True
-        self.__run_manager.start()
-        while self.__run_manager.status != RunManagerStatus.RUNNING:
-            sleep(1)
-        self.__write_ansi_table(self.__run_manager.generate_status_table)
+        for warning in warnings:
+            self.pwarning("WARNING: %s" % warning)
+        self.__write_ansi_table(self.__service.generate_status_table)
+
+    def __reload_bot_service(self):
+        try:
+            changes = self.__service.reload()
+        except (RuntimeError, ValueError) as e:
+            self.perror("Unable to reload actions - %s" % str(e))
+            return
+        self.poutput("Reloaded actions - %(started)d started, %(stopped)d stopped, %(reconfigured)d reconfigured, "
+                     "%(unchanged)d unchanged" % changes)
+        self.__write_ansi_table(self.__service.generate_status_table)
 
     def __stop_bot_service(self, blocking=False):
-        service_is_running = self.__run_manager.status >= RunManagerStatus.STARTED
-        if service_is_running:
-            self.__run_manager.shut_down()
+        if self.__service.status >= RunManagerStatus.STARTED:
             self.poutput("Stop signaled for pywb service...")
-            if blocking:
-                self.__run_manager.join()
-            self.__write_ansi_table(
-                self.__run_manager.generate_status_table, extended=False)
-        # Service is already shutting down from anotehr thread
-        elif blocking and self.__run_manager.is_alive():
-            self.__run_manager.join()
+        if self.__service.stop(blocking=blocking):
+            self.__write_ansi_table(self.__service.run_manager.generate_status_table, extended=False)
 
     def do_plugins(self, _: Namespace) -> None:
         self.__write_ansi_table(
@@ -162,8 +220,10 @@ class _App(Cmd):
         if param in SETTINGS.CUSTOM_PARAMS:
             setattr(SETTINGS, param, new_v)
         SETTINGS.save(param)
+        if param == "watch_actions":
+            self.__service.update_actions_watcher()
 
-        if self.__run_manager.status == RunManagerStatus.RUNNING and param in SETTINGS.PARAMS_BOT_RESTART_REQUIRED:
+        if self.__service.status == RunManagerStatus.RUNNING and param in SETTINGS.PARAMS_BOT_RESTART_REQUIRED:
             self.pwarning(
                 "WARNING: Run 'bot restart' to apply %s changes" % param)
 
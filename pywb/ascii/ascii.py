@@ -1,5 +1,5 @@
-from os import environ, path, walk
-from random import randint
+from os import environ, listdir, path
+from random import choice
 
 from pywb import ENVIRON_DEBUG_KEY, VERSION
 
@@ -14,13 +14,9 @@ def read_ascii():
 
 def generate_ascii_path():
     ascii_folder = path.join(path.dirname(__file__), "banners")
-    # Get filenames from ascii path
-    fnames = next(walk(ascii_folder))[2]
-    fname = fnames[randint(0, len(fnames) - 1)]
-    # Exclude any python files
-    while (path.splitext(fname)[1] == ".py"):
-        fname = fnames[randint(0, len(fnames) - 1)]
-    return path.join(ascii_folder, fname)
+    # Banners are the text files of the folder
+    fnames = [fn for fn in listdir(ascii_folder) if path.splitext(fn)[1] == ".txt"]
+    return path.join(ascii_folder, choice(fnames))
 
 
 def generate_ascii_art():
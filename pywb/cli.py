@@ -0,0 +1,81 @@
+"""
+Command line entry of pywb - kept to the standard library, so quick commands return before
+anything heavy is imported. 'serve' runs the service headless, 'ctl' talks to it over the
+control socket and anything else starts the interactive shell (pywb.app).
+"""
+
+import sys
+from os import path
+
+from pywb import VERSION
+
+_SUBCOMMANDS = ("serve", "ctl")
+
+
+def _parse_args(argv):
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(prog="pywb", description="Python Web Bot - run without arguments for the shell")
+    parser.add_argument("--version", "-V", action="store_true", help="prints the version of pywb")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="runs the pywb service headless, controlled through the control socket")
+    serve.add_argument("actions", nargs="?", help="actions yaml file to start the service with")
+    serve.add_argument("--engine", "-e", help="engine running the actions (defaults to the 'engine' setting)")
+    serve.add_argument("--socket", "-s", help="path of the control socket (default: $PYWB_SOCKET or a per-user path)")
+    ctl = commands.add_parser("ctl", help="sends a command to 'pywb serve' - prints its JSON response")
+    ctl.add_argument("control_command", choices=("start", "stop", "reload", "status", "stats"))
+    ctl.add_argument("--actions", "-a", help="actions yaml file to start (default: the last one started)")
+    ctl.add_argument("--engine", "-e", help="engine running the actions (start)")
+    ctl.add_argument("--wait", "-w", action="store_true", help="waits for the runners to exit (stop)")
+    ctl.add_argument("--prometheus", "-p", action="store_true", help="stats in the prometheus text format (stats)")
+    ctl.add_argument("--socket", "-s", help="path of the control socket (default: $PYWB_SOCKET or a per-user path)")
+    return parser.parse_args(argv)
+
+
+def _ctl(args) -> int:
+    import json
+
+    from pywb.core.control import ControlClient
+
+    client = ControlClient(args.socket, timeout=None if args.wait else 30)
+    if not client.available():
+        print("No pywb daemon is listening on '%s'" % client.socket_path, file=sys.stderr)
+        return 1
+    request_args = {}
+    if args.control_command == "start":
+        # The daemon doesn't share this working directory
+        request_args = {"actions": path.abspath(args.actions) if args.actions else None, "engine": args.engine}
+    elif args.control_command == "stop":
+        request_args = {"wait": args.wait}
+    elif args.control_command == "stats":
+        request_args = {"prometheus": args.prometheus}
+    try:
+        result = client.request(args.control_command, **request_args)
+    except (RuntimeError, OSError) as e:
+        print("Unable to %s - %s" % (args.control_command, str(e)), file=sys.stderr)
+        return 1
+    if args.control_command == "stats" and args.prometheus:
+        sys.stdout.write(result["prometheus"])
+    else:
+        print(json.dumps(result, indent=2))
+    return 0
+
+
+def run(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] in (["--version"], ["-V"]):
+        print("pywb %s" % VERSION)
+        return 0
+    if argv[:1] in (["--help"], ["-h"]) or argv[:1] and argv[0] in _SUBCOMMANDS:
+        args = _parse_args(argv)
+        if args.command == "ctl":
+            return _ctl(args)
+        from pywb.core.service import serve
+        return serve(args.actions, engine=args.engine, socket_path=args.socket)
+    # Arguments left are run as commands by the shell - i.e. pywb "bot start -a actions.yml"
+    from pywb import app
+    app.run()
+
+
+if __name__ == "__main__":
+    sys.exit(run())
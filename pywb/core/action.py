@@ -1,6 +1,31 @@
-from yaml import YAMLError, safe_load
+import pickle
+from glob import glob
+from hashlib import blake2b
+from inspect import getfile
+from math import isfinite
+from os import getpid, makedirs, path, remove, replace, stat
+from threading import Event, Thread
+
+from pywb import VERSION
+from pywb.core.logger import LOG_DIR, logger
+from pywb.web.browser import PageLoad
+
+# Compiled actions of the last actions files - keyed by the file's content and the loaded plugins
+PLAN_CACHE_DIR = path.join(LOG_DIR, "plans")
+PLAN_CACHE_SIZE = 10
+# Changes whenever compiling does - plans of older versions are compiled again
+_PLAN_FORMAT = 2
 
 _REQUIRED_ENTRY_ITEMS = ["plugin", "urls"]
+# Options handled by pywb itself for any plugin - kept out of the plugin kwargs
+_OPTIONAL_ENTRY_ITEMS = ["load_strategy", "load_selector", "load_timeout", "parallel_refresh",
+                         "refresh_rate", "jitter", "priority", "adaptive_refresh", "min_refresh_rate",
+                         "max_refresh_rate", "block"]
+# Numeric options as (integer only, minimum, minimum allowed) - checked and converted when compiled
+_NUMBER_OPTIONS = {"refresh_rate": (False, 0, True), "min_refresh_rate": (False, 0, False),
+                   "max_refresh_rate": (False, 0, False), "jitter": (False, 0, True), "priority": (True, None, True),
+                   "load_timeout": (False, 0, False)}
+_BOOL_OPTIONS = ["parallel_refresh", "adaptive_refresh"]
 
 
 def _yaml_entry_to_site(title, entry):
@@ -8,30 +33,181 @@ def _yaml_entry_to_site(title, entry):
         plugin, urls = (entry[i] for i in _REQUIRED_ENTRY_ITEMS)
         for i in _REQUIRED_ENTRY_ITEMS:
             del entry[i]
-        return Action(title, plugin, urls, **entry)
+        options = {i: entry.pop(i) for i in _OPTIONAL_ENTRY_ITEMS if i in entry}
+        return Action(title, plugin, urls, options=options, **entry)
     except KeyError as e:
         raise ValueError("%s not in entry" % str(e))
 
 
+def _to_number(value, integer):
+    if isinstance(value, bool):
+        raise ValueError
+    number = float(value)
+    if not isfinite(number) or integer and not number.is_integer():
+        raise ValueError
+    return int(number) if number.is_integer() else number
+
+
+def _compile_options(action) -> None:
+    # Options pywb handles itself are checked here - runners start from them without checking again
+    options = action.options
+    for option, (integer, minimum, minimum_allowed) in _NUMBER_OPTIONS.items():
+        if option not in options:
+            continue
+        try:
+            options[option] = _to_number(options[option], integer)
+        except (TypeError, ValueError):
+            raise ValueError("Option %s of action '%s' must be %s - got '%s'" % (
+                option, action.title, "an integer" if integer else "a number", options[option]))
+        if minimum is not None and (options[option] < minimum or options[option] == minimum and not minimum_allowed):
+            raise ValueError("Option %s of action '%s' must be %s %s - got %s" % (
+                option, action.title, "at least" if minimum_allowed else "greater than", minimum, options[option]))
+    for option in ("load_strategy", "load_selector"):
+        if option in options and not isinstance(options[option], str):
+            raise ValueError("Option %s of action '%s' must be a string - got '%s'" % (option, action.title, options[option]))
+    for option in _BOOL_OPTIONS:
+        if option in options and not isinstance(options[option], bool):
+            raise ValueError("Option %s of action '%s' must be true or false - got '%s'" % (
+                option, action.title, options[option]))
+    if options.get("min_refresh_rate", 0) > options.get("max_refresh_rate", float("inf")):
+        raise ValueError("Option min_refresh_rate of action '%s' must not be greater than max_refresh_rate" % action.title)
+    try:
+        PageLoad(strategy=options.get("load_strategy", "complete"), selector=options.get("load_selector"),
+                 timeout=options.get("load_timeout", PageLoad.DEFAULT_TIMEOUT), block=options.get("block"))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid page load options of action '%s' - %s" % (action.title, str(e)))
+
+
 def parse_actions(yaml_path):
+    with open(yaml_path, "rb") as f:
+        return _parse_yaml(f.read(), yaml_path)
+
+
+def _parse_yaml(data, yaml_path):
+    # Imported on a cache miss only - cached plans load without it
+    import yaml
+
     try:
         actions = []
-        with open(yaml_path, "r") as f:
-            yaml_data = safe_load(f)
+        # libyaml's parser (if PyYAML was built with it) - many times faster on large actions files
+        yaml_data = yaml.load(data, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
         for title in yaml_data:
             yaml_action = yaml_data[title]
             for entry in yaml_action:
                 actions.append(_yaml_entry_to_site(title, entry))
         return actions
-    except (YAMLError, ValueError) as e:
+    except (yaml.YAMLError, ValueError) as e:
         raise RuntimeError(
             "Unable to parse file at location '%s' - %s" % (yaml_path, str(e)))
 
 
+def compile_actions(yaml_path, plugins, cache_dir=PLAN_CACHE_DIR):
+    """
+    Parses the actions file and validates every action against its plugin up front - plugins
+    resolve what they need from the action's kwargs into the action's compiled record. The
+    result is cached, so an unchanged file with the same plugins is only unpickled next time.
+    """
+    with open(yaml_path, "rb") as f:
+        data = f.read()
+    plan_path = path.join(cache_dir, "%s.plan" % _plan_key(data, plugins))
+    try:
+        with open(plan_path, "rb") as f:
+            actions = pickle.load(f)
+        logger.debug("Loaded %d compiled action(s) of '%s' from cache", len(actions), yaml_path)
+        return actions
+    except Exception:
+        # Missing or not loadable anymore (i.e. written by another version) - compiled again
+        pass
+
+    actions = _parse_yaml(data, yaml_path)
+    for action in actions:
+        _compile_options(action)
+        if action.plugin_name not in plugins:
+            raise RuntimeError("Unable to compile action '%s' - plugin %s is not loaded" % (
+                action.title, action.plugin_name))
+        try:
+            plugins[action.plugin_name].compile_action(action)
+        except ValueError as e:
+            raise RuntimeError("Unable to compile action '%s' - %s" % (action.title, str(e)))
+    _cache_plan(plan_path, actions)
+    return actions
+
+
+def _plan_key(data, plugins) -> str:
+    plan_hash = blake2b(data, digest_size=16)
+    plan_hash.update(("%s:%d" % (VERSION, _PLAN_FORMAT)).encode("utf-8"))
+    # A changed plugin may compile actions differently
+    for name, plugin in sorted(plugins.items()):
+        try:
+            plugin_stat = stat(getfile(plugin))
+            plan_hash.update(("%s:%d:%d" % (name, plugin_stat.st_mtime_ns, plugin_stat.st_size)).encode("utf-8"))
+        except (OSError, TypeError):
+            plan_hash.update(name.encode("utf-8"))
+    return plan_hash.hexdigest()
+
+
+def _cache_plan(plan_path, actions) -> None:
+    try:
+        makedirs(path.dirname(plan_path), exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (plan_path, getpid())
+        with open(tmp_path, "wb") as f:
+            pickle.dump(actions, f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(tmp_path, plan_path)
+        # Only the plans of the latest files are kept
+        for old_plan in sorted(glob(path.join(path.dirname(plan_path), "*.plan")), key=path.getmtime)[:-PLAN_CACHE_SIZE]:
+            remove(old_plan)
+    except (OSError, pickle.PicklingError) as e:
+        logger.warning("Unable to cache compiled actions - %s", str(e))
+
+
 class Action(object):
-    def __init__(self, title, plugin_name, urls, **kwargs) -> None:
+    __slots__ = ("title", "urls", "plugin_name", "options", "kwargs", "compiled")
+
+    def __init__(self, title, plugin_name, urls, options=None, **kwargs) -> None:
         super().__init__()
         self.title = title
         self.urls = urls
         self.plugin_name = plugin_name
+        self.options = options or {}
         self.kwargs = kwargs
+        # Plugin specific record resolved from the kwargs when the action is compiled (if it was)
+        self.compiled = None
+
+
+class ActionsWatcher(Thread):
+    """
+    Polls an actions file and hands its actions to a callback whenever it changes. A change is
+    only picked up once the file has stopped changing for an interval - editors save in steps.
+    """
+
+    def __init__(self, yaml_path, on_change, plugins, interval=1) -> None:
+        super().__init__(name="pywb-actions-watcher", daemon=True)
+        self.yaml_path = yaml_path
+        self.plugins = plugins
+        self.interval = interval
+        self.__on_change = on_change
+        self.__stop_event = Event()
+        self.__applied = self.__pending = self.__stat()
+
+    def __stat(self):
+        try:
+            file_stat = stat(self.yaml_path)
+        except OSError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    def run(self) -> None:
+        while not self.__stop_event.wait(self.interval):
+            current = self.__stat()
+            settled = current == self.__pending
+            self.__pending = current
+            if current is None or current == self.__applied or not settled:
+                continue
+            self.__applied = current
+            try:
+                self.__on_change(compile_actions(self.yaml_path, self.plugins))
+            except (RuntimeError, ValueError) as e:
+                logger.error("Unable to reload actions from '%s' - %s", self.yaml_path, str(e))
+
+    def stop(self) -> None:
+        self.__stop_event.set()
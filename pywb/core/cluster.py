@@ -0,0 +1,449 @@
+"""
+Coordinator/worker mode - a coordinator shards the actions across worker nodes connecting to it over TCP.
+Worker nodes are started with 'python -m pywb.core.cluster --connect [host]:[port]'
+"""
+
+import socket
+from argparse import ArgumentParser
+from bisect import bisect
+from hashlib import blake2b
+from json import dumps, loads
+from os import getpid, path
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from pywb.core.action import Action
+from pywb.core.logger import DEFAULT_LOG_PATH, LOG_FORMATS, configure_logging, logger
+
+DEFAULT_CLUSTER_ADDRESS = "127.0.0.1:7470"
+
+_MSG_HELLO = "hello"
+_MSG_ASSIGN = "assign"
+_MSG_STATUS = "status"
+_MSG_NOTIFY = "notify"
+
+# Run settings owned by the coordinator - browsers and engines are up to each node
+_SHARED_SETTINGS = ["refresh_rate", "geolocation", "load_strategy", "load_timeout", "parallel_refresh",
+                    "fingerprint", "adaptive_refresh", "block", "freeze_tabs"]
+
+
+def parse_address(address) -> tuple:
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError("Unsupported format for cluster address '%s' - must be [host]:[port]" % address)
+    return host, int(port)
+
+
+def _action_key(action) -> str:
+    # Stable across coordinator restarts - the same action always hashes to the same place on the ring
+    return dumps([action.title, action.plugin_name, action.urls, action.options, action.kwargs], sort_keys=True,
+                 default=str)
+
+
+def _keyed_actions(actions) -> dict:
+    # Repeats of an action are numbered - each one runs (and is placed on the ring) on its own
+    keyed = {}
+    for action in actions:
+        key = base = _action_key(action)
+        repeat = 1
+        while key in keyed:
+            key = "%s#%d" % (base, repeat)
+            repeat += 1
+        keyed[key] = action
+    return keyed
+
+
+def _action_to_msg(action) -> dict:
+    return {"title": action.title, "plugin": action.plugin_name, "urls": action.urls,
+            "options": action.options, "kwargs": action.kwargs}
+
+
+def _action_from_msg(msg) -> Action:
+    return Action(msg["title"], msg["plugin"], msg["urls"], options=msg["options"], **msg["kwargs"])
+
+
+class _Channel(object):
+    # Newline delimited JSON messages over a socket - sends may come from any thread
+    def __init__(self, sock) -> None:
+        self.sock = sock
+        self.__reader = sock.makefile("r", encoding="utf-8")
+        self.__lock = Lock()
+
+    def send(self, msg_type, **kwargs) -> None:
+        data = (dumps(dict(type=msg_type, **kwargs)) + "\n").encode("utf-8")
+        with self.__lock:
+            self.sock.sendall(data)
+
+    def recv(self):
+        line = self.__reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by peer")
+        return loads(line)
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class HashRing(object):
+    """
+    Consistent hashing of keys onto nodes - adding or removing a node only moves the keys
+    of the ring segments it owns. Each node is placed at many points for an even spread.
+    """
+    VNODES = 128
+
+    def __init__(self, nodes=(), vnodes=VNODES) -> None:
+        self.vnodes = vnodes
+        self.__points = []
+        self.__owners = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key) -> int:
+        return int.from_bytes(blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add(self, node) -> None:
+        for i in range(self.vnodes):
+            point = self._hash("%s#%d" % (node, i))
+            self.__owners[point] = node
+            self.__points.insert(bisect(self.__points, point), point)
+
+    def remove(self, node) -> None:
+        self.__points = [p for p in self.__points if self.__owners[p] != node]
+        self.__owners = {p: n for p, n in self.__owners.items() if n != node}
+
+    def node_for(self, key):
+        if not self.__points:
+            return None
+        i = bisect(self.__points, self._hash(key)) % len(self.__points)
+        return self.__owners[self.__points[i]]
+
+
+class _Node(object):
+    def __init__(self, node_id, channel) -> None:
+        self.worker_id = node_id
+        self.channel = channel
+        self.address = "%s:%d" % channel.sock.getpeername()[:2]
+        self.last_heartbeat = monotonic()
+        self.action_keys = []
+        self.runner_rows = []
+
+
+class Coordinator(object):
+    """
+    Accepts worker nodes over TCP and assigns every action to a node with consistent hashing.
+    Nodes report status and notifications back - a node that disconnects or misses its
+    heartbeats is dropped and its actions move to the remaining nodes.
+    """
+    HEARTBEAT_TIMEOUT = 15
+
+    def __init__(self, actions, run_cfg) -> None:
+        self.run_cfg = run_cfg
+        self.__actions = _keyed_actions(actions)
+        self.__address = parse_address(run_cfg.cluster_address or DEFAULT_CLUSTER_ADDRESS)
+        self.__nodes = {}
+        self.__ring = HashRing()
+        self.__lock = Lock()
+        # Assignments are sent in the order they're computed - nodes run the last one they got
+        self.__rebalance_lock = Lock()
+        self.__server = None
+        self.__stopping = False
+
+    @property
+    def workers(self) -> list:
+        with self.__lock:
+            return list(self.__nodes.values())
+
+    @property
+    def finished(self) -> bool:
+        # Runs until stopped - nodes come and go
+        return False
+
+    def start(self) -> None:
+        self.__server = socket.create_server(self.__address)
+        logger.info("Coordinating %d action(s) on %s:%d - waiting on worker nodes", len(self.__actions),
+                    *self.__address)
+        Thread(target=self.__accept, name="pywb-coordinator", daemon=True).start()
+
+    def __accept(self) -> None:
+        while not self.__stopping:
+            try:
+                sock, _ = self.__server.accept()
+            except OSError:
+                return
+            if self.__stopping:
+                sock.close()
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            Thread(target=self.__serve_node, args=(_Channel(sock),), daemon=True).start()
+
+    def __serve_node(self, channel) -> None:
+        node = None
+        try:
+            hello = channel.recv()
+            if hello.get("type") != _MSG_HELLO:
+                raise ConnectionError("Expected hello from node, got '%s'" % hello.get("type"))
+            node = _Node(hello["node_id"], channel)
+            self.__join(node)
+            while True:
+                msg = channel.recv()
+                node.last_heartbeat = monotonic()
+                if msg["type"] == _MSG_STATUS:
+                    node.runner_rows = msg["rows"]
+                elif msg["type"] == _MSG_NOTIFY:
+                    self.run_cfg.notifier.notify(msg["title"], msg["message"], msg["link"])
+        except (ConnectionError, OSError, ValueError, KeyError) as e:
+            if node and not self.__stopping:
+                logger.warning("Lost worker node '%s' - %s", node.worker_id, str(e))
+        finally:
+            if node:
+                self.__leave(node)
+            channel.close()
+
+    def __join(self, node) -> None:
+        with self.__lock:
+            previous = self.__nodes.get(node.worker_id)
+            self.__nodes[node.worker_id] = node
+            if not previous:
+                self.__ring.add(node.worker_id)
+        if previous:
+            # Same node reconnecting - the old connection is stale
+            previous.channel.close()
+        logger.info("Worker node '%s' joined from %s", node.worker_id, node.address)
+        self.__rebalance()
+
+    def __leave(self, node) -> None:
+        with self.__lock:
+            if self.__nodes.get(node.worker_id) is not node:
+                return
+            del self.__nodes[node.worker_id]
+            self.__ring.remove(node.worker_id)
+        logger.info("Worker node '%s' left", node.worker_id)
+        if not self.__stopping:
+            self.__rebalance()
+
+    def __rebalance(self) -> None:
+        with self.__rebalance_lock:
+            with self.__lock:
+                assignments = {node_id: [] for node_id in self.__nodes}
+                for key in self.__actions:
+                    node_id = self.__ring.node_for(key)
+                    if node_id is not None:
+                        assignments[node_id].append(key)
+                changed = [(self.__nodes[n], keys) for n, keys in assignments.items()
+                           if keys != self.__nodes[n].action_keys]
+                for node, keys in changed:
+                    node.action_keys = keys
+
+            if not assignments:
+                logger.warning("No worker nodes connected - %d action(s) are not running", len(self.__actions))
+            settings = {s: getattr(self.run_cfg, s) for s in _SHARED_SETTINGS}
+            for node, keys in changed:
+                logger.info("Assigning %d action(s) to worker node '%s'", len(keys), node.worker_id)
+                try:
+                    node.channel.send(_MSG_ASSIGN, actions=[_action_to_msg(self.__actions[k]) for k in keys],
+                                      settings=settings)
+                except OSError:
+                    # Dropped by its serving thread - which rebalances again
+                    node.channel.close()
+
+    def monitor(self) -> None:
+        now = monotonic()
+        for node in self.workers:
+            if now - node.last_heartbeat > self.HEARTBEAT_TIMEOUT:
+                logger.error("Worker node '%s' sent no heartbeat for %ds - Dropping it",
+                             node.worker_id, now - node.last_heartbeat)
+                # Unblocks the serving thread, which removes the node and rebalances
+                node.channel.close()
+
+    def shut_down(self) -> None:
+        self.__stopping = True
+        if self.__server:
+            # Closing alone doesn't wake up a blocked accept
+            try:
+                self.__server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.__server.close()
+        # Nodes stop their actions when the coordinator goes away
+        for node in self.workers:
+            node.channel.close()
+
+    def generate_status_table(self) -> str:
+        from cmd2.table_creator import Column, SimpleTable
+
+        columns = [Column("Node ID", width=25), Column("Address", width=25), Column("Actions", width=10),
+                   Column("Heartbeat (s)", width=15)]
+        now = monotonic()
+        nodes = self.workers
+        node_data = [[n.worker_id, n.address, len(n.action_keys), "%.0f" % (now - n.last_heartbeat)] for n in nodes]
+        return "%s\n\nWORKER NODES: (%s) - ACTIONS ASSIGNED: (%s/%s)" % (
+            SimpleTable(columns).generate_table(node_data), len(nodes),
+            sum(len(n.action_keys) for n in nodes), len(self.__actions))
+
+
+class _NodeNotifier(object):
+    # Notifications are sent centrally by the coordinator
+    def __init__(self, node) -> None:
+        self.__node = node
+
+    def notify(self, title, message, link) -> None:
+        self.__node.send(_MSG_NOTIFY, title=title, message=message, link=link)
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class ClusterNode(object):
+    """
+    Worker node of a coordinator - runs the actions assigned to it with a local run manager and
+    reports back. Reconnects while the coordinator is unreachable.
+    """
+    RECONNECT_DELAY = 5
+
+    def __init__(self, address, plugins, browser, run_cfg, node_id=None) -> None:
+        self.node_id = node_id or "%s:%d" % (socket.gethostname(), getpid())
+        self.run_cfg = run_cfg
+        self.run_cfg.notifier = _NodeNotifier(self)
+        self.__address = parse_address(address)
+        self.__plugins = plugins
+        self.__browser = browser
+        self.__channel = None
+        self.__run_manager = None
+        self.__stop_event = Event()
+
+    def send(self, msg_type, **kwargs) -> None:
+        channel = self.__channel
+        if channel:
+            try:
+                channel.send(msg_type, **kwargs)
+            except OSError:
+                pass
+
+    def run(self) -> None:
+        while not self.__stop_event.is_set():
+            try:
+                sock = socket.create_connection(self.__address)
+            except OSError as e:
+                logger.warning("Unable to reach coordinator at %s:%d - %s", *self.__address, str(e))
+                self.__stop_event.wait(self.RECONNECT_DELAY)
+                continue
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.__channel = _Channel(sock)
+            logger.info("Connected to coordinator at %s:%d as '%s'", *self.__address, self.node_id)
+            try:
+                self.__serve()
+            except (ConnectionError, OSError, ValueError) as e:
+                logger.warning("Lost coordinator - %s", str(e))
+            finally:
+                self.__channel.close()
+                self.__channel = None
+                # Actions are reassigned on reconnect - the coordinator may have moved them meanwhile
+                self.__assign([])
+
+    def __serve(self) -> None:
+        self.__channel.send(_MSG_HELLO, node_id=self.node_id)
+        Thread(target=self.__heartbeat, args=(self.__channel,), daemon=True).start()
+        while True:
+            msg = self.__channel.recv()
+            if msg["type"] == _MSG_ASSIGN:
+                for setting, value in msg["settings"].items():
+                    setattr(self.run_cfg, setting, value)
+                self.__assign([_action_from_msg(a) for a in msg["actions"]])
+
+    def __heartbeat(self, channel) -> None:
+        while self.__channel is channel:
+            run_manager = self.__run_manager
+            self.send(_MSG_STATUS, rows=run_manager.runner_status_rows() if run_manager else [])
+            self.__stop_event.wait(1)
+
+    def __assign(self, actions) -> None:
+        # Imported here - the run manager itself starts coordinators
+        from pywb.core.run_manager import RunManager
+
+        missing = {a.plugin_name for a in actions} - set(self.__plugins)
+        if missing:
+            logger.error("Plugin(s) %s not loaded on this node - Skipping their actions", sorted(missing))
+            actions = [a for a in actions if a.plugin_name not in missing]
+        if not actions:
+            self.__stop_run_manager()
+            return
+        logger.info("Running %d assigned action(s)", len(actions))
+        # Only the difference to the running actions is applied - the others keep running
+        if self.__run_manager and self.__run_manager.wait_started():
+            try:
+                self.__run_manager.reload(actions)
+                return
+            except RuntimeError as e:
+                logger.warning("Unable to reload assigned actions - restarting them (%s)", str(e))
+        self.__stop_run_manager()
+        self.__run_manager = RunManager(actions=actions, plugins=self.__plugins, browser=self.__browser,
+                                        run_cfg=self.run_cfg)
+        self.__run_manager.daemon = True
+        self.__run_manager.start()
+
+    def __stop_run_manager(self) -> None:
+        if self.__run_manager:
+            self.__run_manager.shut_down()
+            self.__run_manager.join()
+            self.__run_manager = None
+
+    def shut_down(self) -> None:
+        self.__stop_event.set()
+        channel = self.__channel
+        if channel:
+            channel.close()
+
+
+def main(argv=None) -> None:
+    # Imported here - keeps the coordinator side free of browser and plugin imports
+    from pywb.core.plugin_manager import PluginManager
+    from pywb.core.runner import RunConfig
+    from pywb.web import BrowserType, load_browser
+
+    parser = ArgumentParser(prog="python -m pywb.core.cluster", description="pywb worker node")
+    parser.add_argument("--connect", "-c", default=DEFAULT_CLUSTER_ADDRESS,
+                        help="address of the coordinator ([host]:[port])")
+    parser.add_argument("--node-id", help="unique id of the node (defaults to [hostname]:[pid])")
+    parser.add_argument("--browser", "-b", default="Chrome", choices=[i.name.capitalize() for i in BrowserType],
+                        help="browser used by the node")
+    parser.add_argument("--plugins", "-p", action="append", default=[],
+                        help="path to external plugins to load besides the builtin ones")
+    parser.add_argument("--engine", "-e", default="async", help="engine running the assigned actions")
+    parser.add_argument("--max-browsers", type=int, default=4, help="max browser sessions of the node")
+    parser.add_argument("--log-path", default=None, help="path to the node's log file")
+    parser.add_argument("--log-format", default="text", choices=LOG_FORMATS, help="format of the node's log file")
+    parser.add_argument("--record-path", default=None, help="directory the node records loaded pages into")
+    parser.add_argument("--replay-path", default=None, help="directory of recorded pages (Replay browser)")
+    parser.add_argument("--browser-max-mb", type=int, default=0,
+                        help="MB a browser's processes may use before it's recycled (0: no limit)")
+    parser.add_argument("--memory-budget-mb", type=int, default=0,
+                        help="MB all browsers of the node may use together (0: no limit)")
+    parser.add_argument("--state-path", default=None, help="database the node's plugins keep their state in")
+    args = parser.parse_args(argv)
+
+    node_id = args.node_id or "%s:%d" % (socket.gethostname(), getpid())
+    configure_logging(output_path=args.log_path or path.join(
+        path.dirname(DEFAULT_LOG_PATH), "pywb-node-%s.out" % node_id.replace(":", "-")), log_format=args.log_format)
+    plugin_manager = PluginManager()
+    plugin_manager.load_builtin_plugins()
+    for plugin_path in args.plugins:
+        plugin_manager.load_plugins(plugin_path)
+
+    run_cfg = RunConfig(max_browsers=args.max_browsers, engine=args.engine, record_path=args.record_path,
+                        replay_path=args.replay_path, state_path=args.state_path,
+                        browser_max_mb=args.browser_max_mb, memory_budget_mb=args.memory_budget_mb)
+    node = ClusterNode(args.connect, plugin_manager.loaded_plugins, load_browser(BrowserType[args.browser.upper()]),
+                       run_cfg, node_id=node_id)
+    try:
+        node.run()
+    except KeyboardInterrupt:
+        node.shut_down()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Control socket of 'pywb serve' - clients send a request per line and get a response per line,
+both JSON, over a Unix socket: {"command": "status", "args": {...}} -> {"ok": true, "result": ...}.
+Kept to the standard library - clients (i.e. 'pywb ctl status') only import this module.
+"""
+
+import json
+import socket
+from getpass import getuser
+from os import chmod, environ, path, remove
+from socketserver import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+from tempfile import gettempdir
+from threading import Thread
+
+from pywb import ENVIRON_SOCKET_KEY
+
+CONTROL_COMMANDS = ("start", "stop", "reload", "status", "stats")
+
+
+def default_socket_path() -> str:
+    if environ.get(ENVIRON_SOCKET_KEY):
+        return environ[ENVIRON_SOCKET_KEY]
+    # The user's runtime dir where there is one - the temp dir is shared, so the socket carries the user
+    if environ.get("XDG_RUNTIME_DIR"):
+        return path.join(environ["XDG_RUNTIME_DIR"], "pywb.sock")
+    return path.join(gettempdir(), "pywb-%s.sock" % getuser())
+
+
+def _check_supported() -> None:
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("The control socket needs Unix sockets - not supported on this platform")
+
+
+class ControlClient(object):
+    def __init__(self, socket_path=None, timeout=10) -> None:
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    def available(self) -> bool:
+        if not hasattr(socket, "AF_UNIX") or not path.exists(self.socket_path):
+            return False
+        try:
+            with self.__connect():
+                return True
+        except OSError:
+            return False
+
+    def request(self, command, **args):
+        """Sends a command to the daemon - raises RuntimeError with the daemon's error if it failed."""
+        with self.__connect() as conn, conn.makefile("rwb") as f:
+            f.write(json.dumps({"command": command, "args": args}).encode("utf-8") + b"\n")
+            f.flush()
+            line = f.readline()
+        if not line:
+            raise ConnectionError("The pywb daemon closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def __connect(self) -> socket.socket:
+        _check_supported()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(self.timeout)
+        try:
+            conn.connect(self.socket_path)
+        except OSError:
+            conn.close()
+            raise
+        return conn
+
+
+class _ControlHandler(StreamRequestHandler):
+    def handle(self) -> None:
+        # Clients may send any number of requests over one connection
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                command, args = request["command"], request.get("args") or {}
+                if command not in CONTROL_COMMANDS:
+                    raise ValueError("Unknown command '%s' (Supported: %s)" % (command, ", ".join(CONTROL_COMMANDS)))
+                response = {"ok": True, "result": self.server.handle_command(command, **args)}
+            except (RuntimeError, ValueError, TypeError, KeyError, OSError) as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(response, default=str).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _ControlServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, handle_command) -> None:
+        self.handle_command = handle_command
+        super().__init__(socket_path, _ControlHandler)
+
+    def server_bind(self) -> None:
+        super().server_bind()
+        # Accessible to the user only - the socket controls the service. Set before it listens
+        chmod(self.server_address, 0o600)
+
+
+class ControlServer(object):
+    """
+    Serves the control socket - every request is handed to handle_command(command, **args) on a
+    thread of its own, so a slow command never holds up status requests. Only the user running
+    the daemon can connect.
+    """
+
+    def __init__(self, handle_command, socket_path=None) -> None:
+        self.socket_path = socket_path or default_socket_path()
+        self.__handle_command = handle_command
+        self.__server = None
+
+    def start(self) -> None:
+        _check_supported()
+        if path.exists(self.socket_path):
+            if ControlClient(self.socket_path).available():
+                raise RuntimeError("A pywb daemon is already serving '%s'" % self.socket_path)
+            # Left behind by a daemon that didn't exit cleanly
+            remove(self.socket_path)
+        self.__server = _ControlServer(self.socket_path, self.__handle_command)
+        Thread(target=self.__server.serve_forever, name="pywb-control", daemon=True).start()
+
+    def stop(self) -> None:
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+            try:
+                remove(self.socket_path)
+            except OSError:
+                pass
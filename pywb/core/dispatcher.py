@@ -0,0 +1,182 @@
+from collections import deque
+from threading import Condition, Thread
+from time import monotonic
+
+from pywb.core.logger import logger
+from pywb.core.metrics import METRICS
+
+
+class _Delivery(object):
+    __slots__ = ("title", "messages", "link", "enqueued_at", "attempts", "next_try")
+
+    # Alerts merged into one delivery - anything past this is summarized
+    MAX_MESSAGES = 5
+
+    def __init__(self, title, message, link, enqueued_at, next_try) -> None:
+        self.title = title
+        self.messages = [message]
+        self.link = link
+        self.enqueued_at = enqueued_at
+        self.attempts = 0
+        self.next_try = next_try
+
+    def merge(self, message, link) -> None:
+        if message not in self.messages:
+            self.messages.append(message)
+        self.link = link
+
+    @property
+    def message(self) -> str:
+        shown = self.messages[-self.MAX_MESSAGES:]
+        message = "\n".join(shown)
+        if len(self.messages) > len(shown):
+            message += "\n(+%d earlier)" % (len(self.messages) - len(shown))
+        return message
+
+
+class Destination(Thread):
+    """
+    Delivers notifications to one endpoint in the background - sends are rate limited, failed
+    sends are retried with exponential backoff and alerts with the same title that are still
+    waiting are merged into a single message.
+    """
+    COALESCE_WINDOW = 1
+    BACKOFF = 2
+    MAX_BACKOFF = 300
+    MAX_ATTEMPTS = 6
+
+    def __init__(self, name, send, min_interval=0) -> None:
+        super().__init__(name="pywb-notify-%s" % name, daemon=True)
+        self.destination = name
+        self.min_interval = min_interval
+        self.delivered = self.failed = self.dropped = 0
+        self.last_latency = None
+        self.__send = send
+        self.__latencies = deque(maxlen=100)
+        self.__queue = deque()
+        self.__cond = Condition()
+        self.__next_send = 0
+        self.__in_flight = False
+        self.__shut_down = False
+
+    @property
+    def depth(self) -> int:
+        return len(self.__queue) + self.__in_flight
+
+    @property
+    def mean_latency(self):
+        latencies = list(self.__latencies)
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def put(self, title, message, link) -> None:
+        now = monotonic()
+        with self.__cond:
+            pending = next((d for d in self.__queue if d.title == title), None)
+            if pending:
+                pending.merge(message, link)
+                return
+            # Held back for a moment - alerts of a burst arrive together
+            self.__queue.append(_Delivery(title, message, link, now, now + self.COALESCE_WINDOW))
+            METRICS.set("notification_queue_depth", self.depth, destination=self.destination)
+            self.__cond.notify()
+
+    def run(self) -> None:
+        while True:
+            with self.__cond:
+                while True:
+                    if self.__shut_down and not self.__queue:
+                        return
+                    now = monotonic()
+                    if self.__queue:
+                        wait_until = max(self.__queue[0].next_try, self.__next_send)
+                        # Pending alerts go out right away once shutting down
+                        if wait_until <= now or self.__shut_down:
+                            break
+                        self.__cond.wait(wait_until - now)
+                    else:
+                        self.__cond.wait()
+                delivery = self.__queue.popleft()
+                self.__in_flight = True
+            self.__deliver(delivery)
+
+    def __deliver(self, delivery) -> None:
+        delivery.attempts += 1
+        try:
+            with METRICS.timer("notification_send_seconds", destination=self.destination):
+                self.__send(delivery.title, delivery.message, delivery.link)
+            failure = None
+        except Exception as e:
+            # Any error of the endpoint is retried - a bad notification must not kill the dispatcher
+            failure = e
+
+        now = monotonic()
+        with self.__cond:
+            self.__in_flight = False
+            self.__next_send = now + self.min_interval
+            METRICS.set("notification_queue_depth", len(self.__queue), destination=self.destination)
+            if failure is None:
+                self.delivered += 1
+                self.last_latency = now - delivery.enqueued_at
+                self.__latencies.append(self.last_latency)
+                METRICS.observe("notification_latency_seconds", self.last_latency, destination=self.destination)
+                return
+
+            self.failed += 1
+            METRICS.inc("notification_failures_total", destination=self.destination)
+            if delivery.attempts >= self.MAX_ATTEMPTS or self.__shut_down:
+                self.dropped += 1
+                logger.error("Dropping %s notification '%s' after %d attempt(s) - %s", self.destination,
+                             delivery.title, delivery.attempts, str(failure))
+                return
+            backoff = min(self.BACKOFF ** delivery.attempts, self.MAX_BACKOFF)
+            logger.warning("Failed to send %s notification '%s' - Retrying in %ds (%s)", self.destination,
+                           delivery.title, backoff, str(failure))
+            delivery.next_try = now + backoff
+            # Stays first in line - later alerts with the same title keep merging into it
+            self.__queue.appendleft(delivery)
+
+    def shut_down(self, timeout=None) -> None:
+        with self.__cond:
+            self.__shut_down = True
+            self.__cond.notify()
+        if self.is_alive():
+            self.join(timeout)
+        if self.depth:
+            logger.warning("%d %s notification(s) were not delivered before shutting down", self.depth,
+                           self.destination)
+
+
+class NotificationDispatcher(object):
+    """
+    Background delivery of notifications - notify only enqueues, so plugins never wait on a slow
+    or failing endpoint. Every destination is delivered to by a thread of its own.
+    """
+
+    def __init__(self, destinations) -> None:
+        self.__destinations = destinations
+        for destination in self.__destinations:
+            destination.start()
+
+    def notify(self, title, message, link) -> None:
+        for destination in self.__destinations:
+            destination.put(title, message, link)
+
+    @property
+    def depth(self) -> int:
+        return sum(d.depth for d in self.__destinations)
+
+    def shut_down(self, timeout=10) -> None:
+        deadline = monotonic() + timeout
+        for destination in self.__destinations:
+            destination.shut_down(max(0, deadline - monotonic()))
+
+    def generate_status_table(self) -> str:
+        from cmd2.table_creator import Column, SimpleTable
+
+        columns = [Column("Destination", width=15), Column("Queued", width=10), Column("Delivered", width=10),
+                   Column("Failed", width=10), Column("Dropped", width=10), Column("Latency (s)", width=12),
+                   Column("Mean Latency (s)", width=18)]
+        data = [[d.destination, d.depth, d.delivered, d.failed, d.dropped,
+                 "%.1f" % d.last_latency if d.last_latency is not None else "-",
+                 "%.1f" % d.mean_latency if d.mean_latency is not None else "-"] for d in self.__destinations]
+        return "%s\n\nNOTIFICATIONS QUEUED: (%s)" % (SimpleTable(columns).generate_table(data), self.depth)
@@ -1,5 +1,15 @@
+import gzip
+import json
 import logging
-from os import environ, makedirs, path
+from atexit import register
+from copy import copy
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, RotatingFileHandler
+from os import environ, makedirs, path, remove
+from queue import Empty, Full, Queue
+from shutil import copyfileobj
+from threading import Thread
+from time import time
 
 from pywb import ENVIRON_DEBUG_KEY, ENVIRON_LOG_DIR_KEY
 
@@ -7,27 +17,217 @@ from pywb import ENVIRON_DEBUG_KEY, ENVIRON_LOG_DIR_KEY
 LOG_DIR = "logs" if ENVIRON_LOG_DIR_KEY not in environ else environ[ENVIRON_LOG_DIR_KEY]
 DEFAULT_LOG_PATH = path.join(LOG_DIR, "pywb.out")
 
+LOG_FORMATS = ("text", "json")
+DEFAULT_MAX_BYTES = 10 * 2 ** 20
+DEFAULT_BACKUP_COUNT = 5
 
-def _init_logging(output_path=DEFAULT_LOG_PATH) -> None:
-    makedirs(path.dirname(output_path), exist_ok=True)
-    formatter = logging.Formatter(
-        "[%(asctime)s - %(levelname)s] %(message)s")
+# Fields of the runner a record was logged from - carried into the JSON lines output
+_CONTEXT_FIELDS = ("action", "plugin", "url", "worker")
+_LOG_CONTEXT = ContextVar("pywb_log_context", default={})
+
+
+def set_log_context(**fields) -> None:
+    # Scoped to the calling thread/task - records it logs from now on carry the fields
+    _LOG_CONTEXT.set({**_LOG_CONTEXT.get(), **fields})
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record) -> bool:
+        for field, value in _LOG_CONTEXT.get().items():
+            # Records of worker processes arrive with the fields of the worker already set
+            if not hasattr(record, field):
+                setattr(record, field, value)
+        return True
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {"time": self.formatTime(record), "level": record.levelname, "thread": record.threadName,
+                 "message": record.getMessage()}
+        for field in _CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+def _compressed_name(name) -> str:
+    return name + ".gz"
+
+
+def _compress(source, dest) -> None:
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        copyfileobj(f_in, f_out)
+    remove(source)
+
+
+# Logs opened by this process so far
+_opened_logs = set()
+
+
+class _RotatingLogHandler(RotatingFileHandler):
+    # Rolls over by size and/or age - rotated logs are compressed
+    def __init__(self, output_path, max_bytes, backup_count, rotate_seconds) -> None:
+        super().__init__(output_path, "a", maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.namer = _compressed_name
+        self.rotator = _compress
+        self.rotate_seconds = rotate_seconds
+        self.rollover_at = time() + rotate_seconds if rotate_seconds else None
+        # Every start of pywb gets a fresh log - the previous one is kept as the first backup. Only the first
+        # time the log is opened, not when logging is reconfigured
+        if path.abspath(output_path) not in _opened_logs and self.stream.tell() > 0 and backup_count:
+            self.doRollover()
+        _opened_logs.add(path.abspath(output_path))
+
+    def shouldRollover(self, record) -> bool:
+        if self.rollover_at is not None and time() >= self.rollover_at:
+            return True
+        if not self.maxBytes:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        # Checked against what's already written - saves formatting every record twice
+        return self.stream.tell() >= self.maxBytes
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.rotate_seconds:
+            self.rollover_at = time() + self.rotate_seconds
+
+    def flush(self) -> None:
+        # Flushed by the writer once per batch instead of after every record
+        pass
+
+    def flush_batch(self) -> None:
+        super().flush()
+
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class _LogQueueHandler(QueueHandler):
+    # Drops debug/info records when the writer falls behind - warnings and errors wait for room
+    def __init__(self, log_queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Like QueueHandler but the exception stays a field of the record - the writer's formatter lays it out.
+        # The message and the traceback are rendered now, while the args and frames are what they were
+        record = copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _TRACEBACK_FORMATTER.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record) -> None:
+        try:
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                self.queue.put_nowait(logging.makeLogRecord({
+                    "name": record.name, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": "Dropped %d log record(s) - the log writer fell behind" % dropped}))
+            self.queue.put_nowait(record)
+        except Full:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record)
+            else:
+                self.dropped += 1
+
+
+class _LogWriter(Thread):
+    """
+    Writes the records of every thread from a queue - logging only enqueues, so runners never
+    wait on the file lock or the disk. Records are written in batches with one flush per batch.
+    """
+    QUEUE_SIZE = 10000
+    BATCH_SIZE = 500
+    _STOP = None
+
+    def __init__(self, handler) -> None:
+        super().__init__(name="pywb-log-writer", daemon=True)
+        self.handler = handler
+        self.queue = Queue(self.QUEUE_SIZE)
+
+    def run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                pass
+            for record in batch:
+                if record is self._STOP:
+                    self.handler.flush_batch()
+                    return
+                self.handler.handle(record)
+            self.handler.flush_batch()
+
+    def stop(self) -> None:
+        self.queue.put(self._STOP)
+        self.join(timeout=10)
+        self.handler.close()
+
+
+_writer = None
+_config = {"output_path": DEFAULT_LOG_PATH, "log_format": "text", "max_bytes": DEFAULT_MAX_BYTES,
+           "backup_count": DEFAULT_BACKUP_COUNT, "rotate_seconds": 0}
+
+
+def _init_logging(output_path=DEFAULT_LOG_PATH, log_format="text", max_bytes=DEFAULT_MAX_BYTES,
+                  backup_count=DEFAULT_BACKUP_COUNT, rotate_seconds=0) -> None:
+    global _writer
+    makedirs(path.dirname(output_path) or ".", exist_ok=True)
+    if log_format == "json":
+        formatter = _JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "[%(asctime)s - %(levelname)s] %(message)s")
 
     f_logger = logging.getLogger(__name__)
     for hdlr in f_logger.handlers[:]:  # remove all old handlers
         f_logger.removeHandler(hdlr)
+    if _writer:
+        _writer.stop()
 
     if f_logger.getEffectiveLevel() != logging.DEBUG:
         f_logger.setLevel(logging.DEBUG
                           if ENVIRON_DEBUG_KEY in environ else logging.INFO)
 
-    f_handler = logging.FileHandler(output_path, "w")
+    f_handler = _RotatingLogHandler(output_path, max_bytes, backup_count, rotate_seconds)
     f_handler.setFormatter(formatter)
-    f_logger.addHandler(f_handler)
+    _writer = _LogWriter(f_handler)
+    _writer.start()
+    f_logger.addHandler(_LogQueueHandler(_writer.queue))
+
+
+def configure_logging(**config) -> None:
+    # Unset options keep their current value - i.e. changing the format keeps the log path
+    _config.update({k: v for k, v in config.items() if v is not None})
+    _init_logging(**_config)
 
 
 def set_logger_output_path(output_path):
-    _init_logging(output_path=output_path)
+    configure_logging(output_path=output_path)
+
+
+@register
+def _flush_logging() -> None:
+    # Records still queued at exit are written before the process ends - anything logged later is written directly
+    if _writer:
+        f_logger = logging.getLogger(__name__)
+        for hdlr in f_logger.handlers[:]:
+            f_logger.removeHandler(hdlr)
+        _writer.stop()
+        f_logger.addHandler(_writer.handler)
 
 
 logger = logging.getLogger(__name__)
+logger.addFilter(_ContextFilter())
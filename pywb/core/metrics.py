@@ -0,0 +1,270 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import replace
+from threading import Event, Lock, Thread
+from time import perf_counter
+
+from pywb.core.logger import logger
+
+# Upper bounds in seconds - spans quick scrapes up to page loads hitting their deadline
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_PREFIX = "pywb_"
+
+
+class Histogram(object):
+    # Fixed buckets - memory stays the same however many observations are made
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Estimated by interpolating within the bucket the quantile falls in
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class MetricsRegistry(object):
+    """
+    Counters, gauges and latency histograms keyed by name and labels (i.e. action, url).
+    Collectors registered with the registry are called on every export for sampled values.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = Lock()
+        self.__histograms = {}
+        self.__counters = {}
+        self.__gauges = {}
+        self.__collectors = []
+
+    @staticmethod
+    def _key(name, labels) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    def observe(self, name, value, **labels) -> None:
+        key = self._key(name, labels)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - started, **labels)
+
+    def inc(self, name, value=1, **labels) -> None:
+        key = self._key(name, labels)
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def set(self, name, value, **labels) -> None:
+        with self.__lock:
+            self.__gauges[self._key(name, labels)] = value
+
+    def remove(self, **labels) -> None:
+        # Drops every series carrying the labels - i.e. once an action or browser is gone
+        match = set(labels.items())
+        with self.__lock:
+            for series in (self.__histograms, self.__counters, self.__gauges):
+                for key in [k for k in series if match <= set(k[1])]:
+                    del series[key]
+
+    def register_collector(self, collector) -> None:
+        with self.__lock:
+            self.__collectors.append(collector)
+
+    def unregister_collector(self, collector) -> None:
+        with self.__lock:
+            if collector in self.__collectors:
+                self.__collectors.remove(collector)
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__histograms = {}
+            self.__counters = {}
+            self.__gauges = {}
+
+    def __collect(self) -> None:
+        with self.__lock:
+            collectors = list(self.__collectors)
+        for collector in collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logger.debug("Metrics collector failed - %s", str(e))
+
+    def snapshot(self) -> tuple:
+        self.__collect()
+        with self.__lock:
+            histograms = {k: (h.buckets, list(h.counts), h.count, h.sum, h.max, h.quantile(0.5), h.quantile(0.95),
+                              h.quantile(0.99)) for k, h in self.__histograms.items()}
+            return histograms, dict(self.__counters), dict(self.__gauges)
+
+    def render_prometheus(self) -> str:
+        histograms, counters, gauges = self.snapshot()
+        lines = []
+        typed = set()
+
+        def header(name, metric_type):
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE %s%s %s" % (_PREFIX, name, metric_type))
+
+        for (name, labels), (buckets, counts, count, total, _, _, _, _) in sorted(histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += n
+                lines.append("%s%s_bucket%s %d" % (_PREFIX, name, _format_labels(labels + (("le", bound),)),
+                                                   cumulative))
+            lines.append("%s%s_sum%s %f" % (_PREFIX, name, _format_labels(labels), total))
+            lines.append("%s%s_count%s %d" % (_PREFIX, name, _format_labels(labels), count))
+        for metric_type, series in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in sorted(series.items()):
+                header(name, metric_type)
+                lines.append("%s%s%s %s" % (_PREFIX, name, _format_labels(labels), value))
+        return "\n".join(lines) + "\n"
+
+    def render_json(self) -> dict:
+        histograms, counters, gauges = self.snapshot()
+        return {"timings": [{"name": name, "labels": dict(labels), "count": h[2], "sum": h[3], "p50": h[5], "p95": h[6],
+                             "p99": h[7], "max": h[4]} for (name, labels), h in sorted(histograms.items())],
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(counters.items())],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in sorted(gauges.items())]}
+
+    def generate_stats_table(self) -> str:
+        from cmd2.table_creator import Column, SimpleTable
+
+        histograms, counters, gauges = self.snapshot()
+
+        def fmt(value):
+            return "%.3f" % value if value is not None else "-"
+
+        columns = [Column("Metric", width=25), Column("Labels", width=60), Column("Count", width=8),
+                   Column("p50 (s)", width=9), Column("p95 (s)", width=9), Column("p99 (s)", width=9),
+                   Column("Max (s)", width=9)]
+        histogram_data = [[name, _describe_labels(labels), h[2], fmt(h[5]), fmt(h[6]), fmt(h[7]), fmt(h[4])]
+                          for (name, labels), h in sorted(histograms.items())]
+        value_columns = [Column("Metric", width=25), Column("Labels", width=60), Column("Value", width=15)]
+        value_data = [[name, _describe_labels(labels), _format_value(name, value)]
+                      for (name, labels), value in sorted(list(counters.items()) + list(gauges.items()))]
+
+        return "\n%s\n\n\n%s\n\nTOTAL SERIES: (%s)\n\n" % (
+            SimpleTable(columns).generate_table(histogram_data) if histogram_data else "NO TIMINGS RECORDED",
+            SimpleTable(value_columns).generate_table(value_data) if value_data else "NO COUNTERS RECORDED",
+            len(histogram_data) + len(value_data))
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = ('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+               for k, v in labels)
+    return "{%s}" % ",".join(escaped)
+
+
+def _describe_labels(labels) -> str:
+    description = ", ".join("%s=%s" % (k, v) for k, v in labels)
+    return description if len(description) <= 60 else "%s..." % description[:57]
+
+
+def _format_value(name, value) -> str:
+    if name.endswith("_bytes"):
+        return "%.1f MB" % (value / 2 ** 20)
+    return str(value)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+class MetricsExporter(object):
+    """
+    Exposes the registry in the Prometheus text format - served on a local port and/or
+    written to a file every interval (i.e. for node_exporter's textfile collector).
+    """
+
+    def __init__(self, port=0, file_path=None, interval=15) -> None:
+        self.port = port
+        self.file_path = file_path
+        self.interval = interval
+        self.__server = None
+        self.__stop_event = Event()
+        self.__writer = None
+
+    def start(self) -> None:
+        if self.port:
+            self.__server = ThreadingHTTPServer(("127.0.0.1", self.port), _MetricsHandler)
+            Thread(target=self.__server.serve_forever, name="pywb-metrics-http", daemon=True).start()
+            logger.info("Serving metrics on http://127.0.0.1:%d/metrics", self.port)
+        if self.file_path:
+            self.__writer = Thread(target=self.__write_periodically, name="pywb-metrics-file", daemon=True)
+            self.__writer.start()
+            logger.info("Writing metrics to '%s' every %ds", self.file_path, self.interval)
+
+    def __write_periodically(self) -> None:
+        while True:
+            self.write_file()
+            if self.__stop_event.wait(self.interval):
+                return
+
+    def write_file(self) -> None:
+        # Written aside and moved in place - readers never see a partial file
+        tmp_path = "%s.tmp" % self.file_path
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(METRICS.render_prometheus())
+            replace(tmp_path, self.file_path)
+        except OSError as e:
+            logger.warning("Unable to write metrics to '%s' - %s", self.file_path, str(e))
+
+    def stop(self) -> None:
+        self.__stop_event.set()
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+        if self.__writer:
+            self.__writer.join()
+            self.write_file()
+
+
+METRICS = MetricsRegistry()
@@ -1,13 +1,19 @@
 import os
 
-from notify_run import Notify as RemoteNotify
-from notifypy import Notify as LocalNotify
-
+from pywb.core.dispatcher import Destination, NotificationDispatcher
 from pywb.core.logger import logger
 
 
 class Notifier(object):
+    REMOTE_TIMEOUT = 10
+    # Minimum seconds between two sends to the same destination
+    REMOTE_MIN_INTERVAL = 1
+    LOCAL_MIN_INTERVAL = 0.5
+
     def __init__(self, remote_notifications=False):
+        # Imported once the service starts - the notification backends are slow to import
+        from notifypy import Notify as LocalNotify
+
         self._local_notifier = LocalNotify()
         self._remote_notify_info = None
         if remote_notifications:
@@ -15,8 +21,15 @@ class Notifier(object):
         else:
             self._remote_notifier = None
 
+        destinations = [Destination("local", self._send_local_notification, self.LOCAL_MIN_INTERVAL)]
+        if self._remote_notifier:
+            destinations.append(Destination("remote", self._send_remote_notification, self.REMOTE_MIN_INTERVAL))
+        self._dispatcher = NotificationDispatcher(destinations)
+
     def _register_remote_endpoint(self):
         if not self._remote_notify_info:
+            from notify_run import Notify as RemoteNotify
+
             self._remote_notifier = RemoteNotify()
 
             logger.info(
@@ -42,15 +55,30 @@ class Notifier(object):
         return notify_info
 
     def notify(self, title, message, link):
-        if self._remote_notifier:
-            self._send_remote_notification(title, message, link)
-        self._send_local_notification(title, message)
+        # Only queued - delivered in the background by the dispatcher
+        self._dispatcher.notify(title, message, link)
+
+    def generate_status_table(self) -> str:
+        return self._dispatcher.generate_status_table()
+
+    def shut_down(self, timeout=10) -> None:
+        # Gives pending notifications a last chance to be delivered
+        self._dispatcher.shut_down(timeout)
 
-    def _send_local_notification(self, title, message):
+    def __deepcopy__(self, memo):
+        # Shared by the run configs of every action - there is one queue of notifications
+        return self
+
+    def _send_local_notification(self, title, message, _link):
         self._local_notifier.title = title
         self._local_notifier.message = message
-        self._local_notifier.send()
+        if not self._local_notifier.send(block=True):
+            raise RuntimeError("Local notification was not sent")
 
     def _send_remote_notification(self, title, message, link):
-        self._remote_notifier.send(
-            "{title} - {message}".format(title=title, message=message), link)
+        import requests
+
+        # Posting to the endpoint directly - notify_run swallows errors and has no timeout
+        resp = requests.post(self._remote_notifier.endpoint, {"message": "{title} - {message}".format(
+            title=title, message=message), "action": link}, timeout=self.REMOTE_TIMEOUT)
+        resp.raise_for_status()
@@ -1,7 +1,9 @@
+import asyncio
 from abc import ABC, abstractmethod
 from time import sleep
 
 from pywb.core.logger import logger
+from pywb.core.state import PluginState
 
 
 class Plugin(ABC):
@@ -12,6 +14,8 @@ class Plugin(ABC):
         self._shut_down = False
         self._run_initialized = False
         self._action = self._refresh_rate = self._notifier = self._browser = None
+        self._scheduler = self._schedule = None
+        self._state = None
 
     def ascii(self) -> str:
         return "=========== " + self.name + " (" + self.version + ")" + " ==========="
@@ -24,12 +28,17 @@ class Plugin(ABC):
         self._refresh_rate = run_cfg.refresh_rate
         self._notifier = run_cfg.notifier
         self._browser = browser
+        # Central scheduler deciding when the action is checked next - plugins sleep on their own without one
+        self._scheduler = run_cfg.scheduler
+        self._schedule = run_cfg.schedule
+        # State of the action kept across restarts (by url) - in memory only without a state store
+        self._state = PluginState(run_cfg.state_store, self.name, self._action.title)
 
         self._browser.load_driver()
         if run_cfg.geolocation:
             g_lat, g_long = run_cfg.geolocation
             logger.info(
-                "Geolocation - Emulating latitude[%s], longitude[%s]" % (g_lat, g_long))
+                "Geolocation - Emulating latitude[%s], longitude[%s]", g_lat, g_long)
             self._browser.emulate_location(g_lat, g_long)
         else:
             logger.warning(
@@ -39,6 +48,15 @@ class Plugin(ABC):
     def __load_urls(self):
         self._browser.load_urls(self._action.urls)
 
+    @classmethod
+    def compile_action(cls, action) -> None:
+        """
+        Validates the action and resolves its kwargs into action.compiled once, before any runner
+        starts - raises ValueError on invalid actions. Compiled actions are cached and sent to
+        worker processes, so the record may only hold builtin and pywb types.
+        """
+        pass
+
     @abstractmethod
     def validate(self) -> None:
         pass
@@ -51,8 +69,19 @@ class Plugin(ABC):
     @abstractmethod
     def stop(self) -> None:
         self._shut_down = True
+        if self._scheduler:
+            self._scheduler.unregister(self._schedule)
+
+    def _report_change(self, changed) -> None:
+        # Change signal for adaptive refresh rates - pages that change often are checked more often
+        if self._scheduler:
+            self._scheduler.report(self._schedule, changed)
 
     def _sleep_on_refresh_rate(self):
+        if self._scheduler:
+            logger.debug("Waiting on scheduler to refresh action '%s'", self._action.title)
+            self._scheduler.wait_turn(self._schedule)
+            return
         logger.info("Waiting for (%ds) to refresh action", self._refresh_rate)
         for _ in range(self._refresh_rate):
             if self._shut_down:
@@ -63,3 +92,57 @@ class Plugin(ABC):
 
     def __str__(self) -> str:
         return self.name
+
+
+class AsyncPlugin(Plugin):
+    """
+    Plugin variant whose run loop is a coroutine. Under the async engine, every action runs
+    on one event loop - browser calls go through _call_browser, which hands them to a worker
+    thread once one of the engine's browser slots is free.
+    """
+
+    def __init__(self, name, version) -> None:
+        super().__init__(name, version)
+        self.__browser_slots = None
+        self.__loop = None
+        self.__stop_event = None
+
+    def initialize(self, browser, run_cfg) -> None:
+        super().initialize(browser, run_cfg)
+        # Only set by the async engine - otherwise browser calls block the plugin's own thread
+        self.__browser_slots = run_cfg.browser_slots
+
+    async def _call_browser(self, func, *args, **kwargs):
+        if not self.__browser_slots:
+            return func(*args, **kwargs)
+        async with self.__browser_slots:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    @abstractmethod
+    async def run(self) -> None:
+        assert self._run_initialized, "Critical Error - Unable to start plugin. Run has not been initialized!"
+        self.__stop_event = asyncio.Event()
+        self.__loop = asyncio.get_running_loop()
+        if self._shut_down:
+            self.__stop_event.set()
+        await self._call_browser(self._browser.load_urls, self._action.urls)
+
+    @abstractmethod
+    def stop(self) -> None:
+        super().stop()
+        # Stop can be signaled from any thread - wake the plugin up on its own loop
+        if self.__loop and not self.__loop.is_closed():
+            self.__loop.call_soon_threadsafe(self.__stop_event.set)
+
+    async def _sleep_on_refresh_rate(self):
+        if self._scheduler:
+            logger.debug("Waiting on scheduler to refresh action '%s'", self._action.title)
+            await self._scheduler.async_wait_turn(self._schedule)
+            return
+        logger.info("Waiting for (%ds) to refresh action", self._refresh_rate)
+        try:
+            await asyncio.wait_for(self.__stop_event.wait(), timeout=self._refresh_rate)
+            logger.debug(
+                "While sleeping, plugin received shutdown signal!")
+        except asyncio.TimeoutError:
+            pass
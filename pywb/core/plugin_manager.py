@@ -5,7 +5,6 @@ from os import path, walk
 from pathlib import Path
 from sys import modules
 
-from cmd2.table_creator import Column, SimpleTable
 from genericpath import isfile
 
 
@@ -53,6 +52,8 @@ class PluginManager(object):
         return deepcopy(self.__loaded_plugins)
 
     def generate_loaded_plugins_table(self) -> str:
+        from cmd2.table_creator import Column, SimpleTable
+
         plugin_list = []
         columns = []
         w_plugin_name = 20
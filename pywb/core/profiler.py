@@ -0,0 +1,170 @@
+import re
+import sys
+from collections import Counter
+from cProfile import Profile
+from datetime import datetime
+from os import environ, makedirs, path
+from pstats import Stats
+from threading import Event, Lock, Thread, get_ident
+from time import monotonic
+
+from pywb import ENVIRON_PROFILE_KEY
+from pywb.core.logger import LOG_DIR, logger
+
+PROFILE_DIR = path.join(LOG_DIR, "profiles")
+
+# Frames from these modules are the driver talking to the browser - time spent there is waiting on WebDriver
+_DRIVER_MODULE_RE = re.compile(r"[\\/](selenium|urllib3|requests|http[\\/]client\.py|socket\.py|ssl\.py)")
+# Runners waiting on their next check
+_IDLE_FUNCTIONS = {"wait_turn", "async_wait_turn", "_sleep_on_refresh_rate"}
+# Event loops of async runners wait on their selector while every task sleeps
+_LOOP_WAIT_RE = re.compile(r"[\\/]selectors\.py$|of 'select\.\w+' objects|select\.select")
+
+# Parsed once - profiling costs a single set lookup per runner when disabled
+_PROFILE_SELECTION = {s.strip() for s in environ.get(ENVIRON_PROFILE_KEY, "").split(",") if s.strip()}
+# Held by the runner profiled with cProfile
+_PROFILE_LOCK = Lock()
+
+
+def profiling_selected(plugin_name, action_title) -> bool:
+    # PYWB_PROFILE=all profiles every runner, otherwise a comma separated list of plugin names/action titles
+    if not _PROFILE_SELECTION:
+        return False
+    return bool({"all", "1", plugin_name, action_title} & _PROFILE_SELECTION)
+
+
+def profile_path(plugin_name, action_title) -> str:
+    makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r"[^\w.-]+", "_", "%s-%s" % (plugin_name, action_title)).strip("_")
+    return path.join(PROFILE_DIR, "%s-%s" % (name, datetime.now().strftime("%Y%m%d-%H%M%S-%f")))
+
+
+def _category(filename, function) -> str:
+    if function in _IDLE_FUNCTIONS or _LOOP_WAIT_RE.search(filename) or _LOOP_WAIT_RE.search(function):
+        return "idle"
+    if _DRIVER_MODULE_RE.search(filename):
+        return "webdriver"
+    return "python"
+
+
+def _write_summary(summary_path, title, totals, top, unit) -> None:
+    total = sum(totals.values()) or 1
+    with open(summary_path, "w") as f:
+        f.write("%s\n\n" % title)
+        for category in ("python", "webdriver", "idle"):
+            share = 100 * totals[category] / total
+            f.write("%-10s %12.3f %s (%5.1f%%)\n" % (category, totals[category], unit, share))
+        f.write("\nTop functions by own %s:\n" % unit)
+        for (category, location), value in top:
+            f.write("%12.3f  %-9s  %s\n" % (value, category, location))
+
+
+def run_profiled(func, output_path) -> None:
+    # Deterministic profile of everything func runs on the calling thread. Only one cProfile can be active
+    # at a time (python 3.12+) - runners started while it is are sampled instead
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        _run_sampled(func, output_path)
+        return
+    try:
+        profile = Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiling tool is active (i.e. a debugger)
+            logger.debug("Unable to start cProfile (%s) - Sampling instead", str(e))
+            _run_sampled(func, output_path)
+            return
+        try:
+            func()
+        finally:
+            profile.disable()
+            _write_profile(profile, output_path)
+    finally:
+        _PROFILE_LOCK.release()
+
+
+def _run_sampled(func, output_path) -> None:
+    profiler = SamplingProfiler([get_ident()], output_path)
+    profiler.start()
+    try:
+        func()
+    finally:
+        profiler.stop()
+        profiler.join()
+
+
+def _write_profile(profile, output_path) -> None:
+    profile.dump_stats("%s.pstats" % output_path)
+    stats = Stats(profile).stats
+    totals = Counter()
+    own_time = Counter()
+    for (filename, line, function), (_, _, tottime, cumtime, callers) in stats.items():
+        category = _category(filename, function)
+        own_time[(category, "%s (%s:%d)" % (function, filename, line))] += tottime
+        totals["total"] += tottime
+        # Time blocked in C (sleeping, socket reads) has no python frame - attributed by the entry points
+        if function == "_sleep_on_refresh_rate":
+            totals["idle"] += cumtime
+        elif category == "idle" and function not in _IDLE_FUNCTIONS:
+            totals["idle"] += tottime
+        elif category == "webdriver":
+            totals["webdriver"] += sum(c[3] for caller, c in callers.items()
+                                       if _category(caller[0], caller[2]) != "webdriver")
+    totals["python"] = max(0, totals.pop("total") - totals["idle"] - totals["webdriver"])
+    _write_summary("%s.txt" % output_path, "Deterministic profile", totals, own_time.most_common(25), "s")
+    logger.info("Wrote profile to '%s.pstats'", output_path)
+
+
+class SamplingProfiler(Thread):
+    """
+    Samples the stacks of a set of threads at a fixed interval. Samples are written as collapsed
+    stacks (the input of flame graph tools) and summarized by where the time went - python code,
+    waiting on WebDriver, or idle until the next check.
+    """
+    INTERVAL = 0.005
+
+    def __init__(self, thread_ids, output_path, duration=None, interval=INTERVAL) -> None:
+        super().__init__(name="pywb-profiler", daemon=True)
+        self.thread_ids = set(thread_ids)
+        self.output_path = output_path
+        self.duration = duration
+        self.interval = interval
+        self.__stacks = Counter()
+        self.__stop_event = Event()
+
+    def run(self) -> None:
+        started = monotonic()
+        while not self.__stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_name, frame.f_lineno))
+                    frame = frame.f_back
+                if stack:
+                    self.__stacks[tuple(reversed(stack))] += 1
+            if self.duration is not None and monotonic() - started >= self.duration:
+                break
+        self.__write()
+
+    def __write(self) -> None:
+        totals = Counter()
+        own_samples = Counter()
+        with open("%s.collapsed" % self.output_path, "w") as f:
+            for stack, n in self.__stacks.most_common():
+                frames = ";".join("%s (%s:%d)" % (func, path.basename(fn), line) for fn, func, line in stack)
+                f.write("%s %d\n" % (frames, n))
+                # A sample counts as idle/webdriver if any frame on the stack is
+                categories = {_category(fn, func) for fn, func, _ in stack}
+                category = "idle" if "idle" in categories else "webdriver" if "webdriver" in categories else "python"
+                totals[category] += n * self.interval
+                filename, function, line = stack[-1]
+                own_samples[(category, "%s (%s:%d)" % (function, filename, line))] += n * self.interval
+        title = "Sampling profile (%d samples every %.3fs)" % (sum(self.__stacks.values()), self.interval)
+        _write_summary("%s.txt" % self.output_path, title, totals, own_samples.most_common(25), "s")
+        logger.info("Wrote profile to '%s.collapsed'", self.output_path)
+
+    def stop(self) -> None:
+        self.__stop_event.set()
@@ -1,15 +1,25 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from enum import Enum
-from threading import Thread
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep
 from typing import Dict, List
 
-from cmd2.table_creator import Column, SimpleTable
-
 from pywb.core.action import Action
+from pywb.core.cluster import Coordinator
 from pywb.core.logger import logger
+from pywb.core.metrics import METRICS
 from pywb.core.plugin import Plugin
-from pywb.core.runner import RunConfig, Runner
-from pywb.web.browser import _Browser
+from pywb.core.profiler import SamplingProfiler, profile_path
+from pywb.core.runner import AsyncRunner, RunConfig, Runner
+from pywb.core.scheduler import AdaptiveInterval, Scheduler
+from pywb.core.state import StateStore
+from pywb.core.worker import WorkerPool
+from pywb.web.browser import PageLoad, _Browser
+from pywb.web.governor import MemoryGovernor
+from pywb.web.pool import BrowserPool
 
 
 class RunManagerStatus(Enum):
@@ -40,6 +50,25 @@ class RunManagerStatus(Enum):
         return NotImplemented
 
 
+# Thread runs every action on a thread of its own, async runs them all as tasks on one event loop
+# and process shards them across worker processes (each running the async engine). Cluster only
+# coordinates - actions run on the worker nodes connected to it
+RunEngine = Enum("RunEngine", ["THREAD", "ASYNC", "PROCESS", "CLUSTER"])
+
+# Threads of the sync plugins run by the async engine - as many as there are sync plugins running
+_MAX_PLUGIN_THREADS = 2 ** 16
+
+# Action options a running action's schedule picks up without restarting its runner
+_SCHEDULE_OPTIONS = ("refresh_rate", "jitter", "priority", "adaptive_refresh", "min_refresh_rate", "max_refresh_rate")
+
+
+def _action_key(action, schedule=True) -> str:
+    # Actions are matched on their content - titles aren't unique within an actions file
+    options = {k: v for k, v in action.options.items() if schedule or k not in _SCHEDULE_OPTIONS}
+    return json.dumps([action.title, action.plugin_name, action.urls, options, action.kwargs], sort_keys=True,
+                      default=str)
+
+
 class RunManager(Thread):
     def __init__(self, actions: List[Action] = None, plugins: Dict[str, Plugin] = None,
                  browser: _Browser = None, run_cfg: RunConfig = None) -> None:
@@ -47,60 +76,331 @@ class RunManager(Thread):
         self.run_cfg = run_cfg
         self.__actions = actions
         self.__runners = []
+        # Runners stopped by a reload - waited on like the others until they exit
+        self.__retired = []
+        # Runners that exited on their own - their metrics are dropped once
+        self.__exited = set()
+        self.__runner_actions = {}
+        self.__reload_lock = Lock()
         self.__plugins = plugins
         self.__browser = browser
+        self.__browser_pool = None
+        self.__governor = None
+        self.__scheduler = None
+        self.__state_store = None
+        self.__worker_pool = None
+        self.__loop = self.__browser_slots = None
+        self.__plugin_executor = None
+        self.__engine = RunEngine[run_cfg.engine.upper()] if run_cfg else RunEngine.THREAD
         self.__shut_down = False
+        self.__status_changed = Condition()
         self.status = RunManagerStatus.NOT_STARTED
 
+    @property
+    def status(self) -> RunManagerStatus:
+        return self.__status
+
+    @status.setter
+    def status(self, status) -> None:
+        with self.__status_changed:
+            self.__status = status
+            self.__status_changed.notify_all()
+
+    def wait_started(self, timeout=None) -> bool:
+        # Woken up once the service runs or didn't make it that far - True if it runs
+        with self.__status_changed:
+            self.__status_changed.wait_for(lambda: self.__status not in (
+                RunManagerStatus.NOT_STARTED, RunManagerStatus.STARTED) or not self.is_alive(), timeout)
+        return self.__status == RunManagerStatus.RUNNING
+
     def run(self):
         assert (self.__actions and self.__plugins
                 and self.__browser and self.run_cfg), "Critical Error - RunManager did not get initialized properly"
         self.status = RunManagerStatus.STARTED
-        self.__delegate_and_wait()
+        try:
+            self.__delegate_and_wait()
+        finally:
+            # Also when starting failed - nobody is left waiting on a service that never runs
+            self.status = RunManagerStatus.STOPPED
+
+    @property
+    def shut_down_requested(self) -> bool:
+        return self.__shut_down
 
     def __delegate_and_wait(self) -> None:
+        if self.__engine in (RunEngine.PROCESS, RunEngine.CLUSTER):
+            self.__run_workers()
+            return
         self.__actions_to_runners()
-        self.__start_runners()
+        if self.__engine == RunEngine.ASYNC:
+            asyncio.run(self.__run_async())
+            return
+        self.__start_runners(self.__runners)
         self.status = RunManagerStatus.RUNNING
         # Waiting for runners to finish executing
         self.__wait_for_runners()
 
-    def __start_runners(self) -> None:
-        [runner.start() for runner in self.__runners]
+    def __start_runners(self, runners) -> None:
+        [runner.start() for runner in runners]
+
+    async def __run_async(self) -> None:
+        self.__loop = asyncio.get_running_loop()
+        # Browser calls are handed to worker threads - no more than the concurrency limit at once
+        self.__browser_slots = asyncio.Semaphore(self.run_cfg.max_concurrency)
+        self.__loop.set_default_executor(ThreadPoolExecutor(max_workers=self.run_cfg.max_concurrency,
+                                                            thread_name_prefix="pywb-browser"))
+        # Sync plugins block in their run loop - each one needs a thread of its own. One executor for the
+        # runners of every reload; threads are only started as plugins need them and reused once they exit
+        self.__plugin_executor = ThreadPoolExecutor(max_workers=_MAX_PLUGIN_THREADS, thread_name_prefix="pywb-plugin")
+        await self.__start_async_runners(self.__runners)
+        self.status = RunManagerStatus.RUNNING
+
+        runner_timeout = 60 * 5
+        attempts = 0
+        # Waiting for runners to finish executing - reloads add and retire runners in the meantime
+        while True:
+            pending = {runner.task for runner in self.__runners + self.__retired if not runner.task.done()}
+            if not pending:
+                break
+            await asyncio.wait(pending, timeout=1)
+            self.__drop_exited_metrics()
+            # If we get an external shutdown, start tracking with a timeout
+            if self.__shut_down:
+                attempts += 1
+                if attempts >= runner_timeout:
+                    logger.error(
+                        "One or more plugins did not clean up properly... Forcing task exit!")
+                    for task in pending:
+                        task.cancel()
+                    break
+        self.__plugin_executor.shutdown(wait=False, cancel_futures=True)
+        self.__tear_down()
+
+    async def __start_async_runners(self, runners) -> None:
+        for runner in runners:
+            runner.start(self.__loop, self.__browser_slots, self.__plugin_executor)
+
+    def __run_workers(self) -> None:
+        if self.__engine == RunEngine.CLUSTER:
+            # Plugins are loaded by the worker nodes - they may have plugins the coordinator doesn't
+            self.__worker_pool = Coordinator(self.__actions, self.run_cfg)
+        else:
+            for action in self.__actions:
+                if action.plugin_name not in self.__plugins:
+                    raise ValueError(
+                        "Unable to find plugin %s from loaded external plugins" % action.plugin_name)
+            self.__worker_pool = WorkerPool(self.__actions, self.__plugins, self.__browser, self.run_cfg)
+        self.__worker_pool.start()
+        self.status = RunManagerStatus.RUNNING
+
+        while not self.__shut_down:
+            self.__worker_pool.monitor()
+            if self.__worker_pool.finished:
+                break
+            sleep(1)
+        # Bounded - workers that don't stop in time are terminated, nodes are disconnected
+        self.__worker_pool.shut_down()
+        logger.info("Workers have completed execution... tearing down")
+        self.status = RunManagerStatus.STOPPED
 
     def __actions_to_runners(self) -> None:
+        self.__browser_pool = BrowserPool(self.__browser, max_browsers=self.run_cfg.max_browsers,
+                                          fingerprint=self.run_cfg.fingerprint, freeze_tabs=self.run_cfg.freeze_tabs,
+                                          snapshots=self.__snapshot_store(),
+                                          network_stats=any(action.options.get("block", self.run_cfg.block)
+                                                            for action in self.__actions))
+        if self.run_cfg.browser_max_mb or self.run_cfg.memory_budget_mb:
+            self.__governor = MemoryGovernor(self.__browser_pool, browser_max_bytes=self.run_cfg.browser_max_mb * 2 ** 20,
+                                             budget_bytes=self.run_cfg.memory_budget_mb * 2 ** 20)
+            self.__browser_pool.governor = self.__governor
+            self.__governor.start()
+        # One check at a time per pooled browser - the scheduler decides which action goes next
+        self.__scheduler = Scheduler(max_in_flight=1)
+        self.__scheduler.start()
+        if self.run_cfg.state_path:
+            # Shared by every runner - state of an action is loaded when its plugin initializes
+            self.__state_store = StateStore(self.run_cfg.state_path)
+        self.__check_plugins(self.__actions)
         # Merge actions into plugins - One plugin instance for multiple actions
-        for action in self.__actions:
+        self.__runners = [self.__create_runner(action) for action in self.__actions]
+
+    def __check_plugins(self, actions) -> None:
+        for action in actions:
             if action.plugin_name not in self.__plugins:
                 raise ValueError(
                     "Unable to find plugin %s from loaded external plugins" % action.plugin_name)
 
-            # Create a new run config with the action
-            new_cfg = deepcopy(self.run_cfg)
-            new_cfg.action = deepcopy(action)
-            # Add a new runner with the config and plugin
-            self.__runners.append(
-                Runner(self.__plugins[action.plugin_name], self.__browser, new_cfg))
+    def __create_runner(self, action):
+        # Create a new run config with the action
+        new_cfg = deepcopy(self.run_cfg)
+        new_cfg.action = deepcopy(action)
+        # Action options take precedence over the global page load settings
+        page_load = PageLoad(strategy=action.options.get("load_strategy", self.run_cfg.load_strategy),
+                             selector=action.options.get("load_selector"),
+                             timeout=action.options.get("load_timeout", self.run_cfg.load_timeout),
+                             parallel=action.options.get("parallel_refresh", self.run_cfg.parallel_refresh),
+                             block=action.options.get("block", self.run_cfg.block))
+        lease = self.__browser_pool.lease(page_load, label=action.title)
+        new_cfg.refresh_rate = action.options.get("refresh_rate", self.run_cfg.refresh_rate)
+        new_cfg.scheduler = self.__scheduler
+        new_cfg.state_store = self.__state_store
+        new_cfg.schedule = self.__scheduler.register(action.title, new_cfg.refresh_rate,
+                                                     jitter=action.options.get("jitter", 0),
+                                                     priority=action.options.get("priority", 0),
+                                                     resource=lease.browser_id,
+                                                     adaptive=self.__adaptive_interval(action, new_cfg.refresh_rate))
+        # Add a new runner with the config, plugin and a lease on a pooled browser
+        runner_type = AsyncRunner if self.__engine == RunEngine.ASYNC else Runner
+        runner = runner_type(self.__plugins[action.plugin_name], lease, new_cfg)
+        self.__runner_actions[runner] = action
+        return runner
+
+    def reload(self, actions) -> dict:
+        """
+        Applies a changed list of actions to the running service - runners of unchanged actions
+        keep running, changed schedule options are applied in place and only added, removed or
+        otherwise changed actions start/stop a runner. Browsers stay in the pool throughout.
+        """
+        if self.__worker_pool:
+            raise RuntimeError("Actions of the %s engine can't be reloaded - run 'bot restart'" % self.__engine.name.lower())
+        if self.status != RunManagerStatus.RUNNING:
+            raise RuntimeError("The pywb service is not running")
+        if not actions:
+            raise ValueError("No actions to run - stop the service instead")
+        self.__check_plugins(actions)
+
+        with self.__reload_lock:
+            unchanged, remaining = [], {}
+            for runner in self.__runners:
+                remaining.setdefault(_action_key(self.__runner_actions[runner]), []).append(runner)
+            changed = []
+            for action in actions:
+                runners = remaining.get(_action_key(action))
+                if runners:
+                    unchanged.append(runners.pop(0))
+                else:
+                    changed.append(action)
+
+            # Leftover runners whose action only differs in its schedule are reconfigured
+            candidates = {}
+            for runner in [r for runners in remaining.values() for r in runners]:
+                candidates.setdefault(_action_key(self.__runner_actions[runner], schedule=False), []).append(runner)
+            reconfigured, added = [], []
+            for action in changed:
+                runners = candidates.get(_action_key(action, schedule=False))
+                if runners:
+                    reconfigured.append((runners.pop(0), action))
+                else:
+                    added.append(action)
+            stopped = [r for runners in candidates.values() for r in runners]
+            # Actions replacing removed ones take their place - only a net gain of runners needs memory
+            if len(added) > len(stopped) and self.__governor and self.__governor.near_budget():
+                raise RuntimeError("Memory is short (%.0f MB used by browsers) - not starting %d more action(s)" % (
+                    self.__governor.total_bytes / 2 ** 20, len(added) - len(stopped)))
+            for runner, action in reconfigured:
+                self.__reconfigure_runner(runner, action)
+
+            # Started before the removed runners stop - their browsers are leased again instead of quitting
+            started = [self.__create_runner(action) for action in added]
+            if self.__engine == RunEngine.ASYNC:
+                # Started on the event loop - the runners are listed once their tasks exist
+                asyncio.run_coroutine_threadsafe(self.__start_async_runners(started), self.__loop).result()
+            else:
+                self.__start_runners(started)
+            self.__retired = self.__retired + stopped
+            self.__exited.difference_update(stopped)
+            self.__runners = [r for r in self.__runners if r not in stopped] + started
+            for runner in stopped:
+                runner.shut_down()
+                del self.__runner_actions[runner]
+            self.__actions = actions
+
+        logger.info("Reloaded actions - %d started, %d stopped, %d reconfigured, %d unchanged",
+                    len(started), len(stopped), len(reconfigured), len(unchanged))
+        return {"started": len(started), "stopped": len(stopped), "reconfigured": len(reconfigured),
+                "unchanged": len(unchanged)}
+
+    def __reconfigure_runner(self, runner, action) -> None:
+        refresh_rate = action.options.get("refresh_rate", self.run_cfg.refresh_rate)
+        self.__scheduler.reconfigure(runner.schedule, refresh_rate, jitter=action.options.get("jitter", 0),
+                                     priority=action.options.get("priority", 0),
+                                     adaptive=self.__adaptive_interval(action, refresh_rate))
+        runner.action.options = deepcopy(action.options)
+        self.__runner_actions[runner] = action
+
+    def __snapshot_store(self):
+        # The replay browser serves pages from its store - any other browser records into one (if set)
+        from pywb.web.replay import Replay, SnapshotStore
+
+        replay = issubclass(self.__browser, Replay)
+        store_path = self.run_cfg.replay_path if replay else self.run_cfg.record_path
+        if not store_path:
+            return None
+        logger.info("%s page snapshots in '%s'", "Replaying" if replay else "Recording", store_path)
+        return SnapshotStore(store_path)
+
+    def __adaptive_interval(self, action, refresh_rate):
+        if not action.options.get("adaptive_refresh", self.run_cfg.adaptive_refresh):
+            return None
+        # Without explicit bounds, adapt between a quarter and eight times the action's refresh rate
+        return AdaptiveInterval(refresh_rate,
+                                action.options.get("min_refresh_rate", max(1, refresh_rate / 4)),
+                                action.options.get("max_refresh_rate", max(1, refresh_rate * 8)))
 
     def __wait_for_runners(self) -> None:
         runner_timeout = 60 * 5
-        rogue_plugin = False
-        # Wait for timeout in secs for each runner to finish cleaning up properly
-        for runner in self.__runners:
-            attempts = 0
-            while runner.is_alive():
-                runner.join(timeout=1)
-                # If we get an external shutdown, start tracking with a timeout
-                if self.__shut_down:
-                    if attempts < runner_timeout:
-                        attempts += 1
-                    else:
-                        # Plugin isn't playing nicely... We'll try to clean up the rest
-                        rogue_plugin = True
-                        break
-        if rogue_plugin:
-            logger.error(
-                "One or more plugins did not clean up properly... Forcing thread exit!")
+        attempts = 0
+        # Wait for every runner to finish - reloads add and retire runners in the meantime
+        while True:
+            alive = [runner for runner in self.__runners + self.__retired if runner.is_alive()]
+            if not alive:
+                break
+            alive[0].join(timeout=1)
+            self.__drop_exited_metrics()
+            # If we get an external shutdown, start tracking with a timeout
+            if self.__shut_down:
+                attempts += 1
+                if attempts >= runner_timeout:
+                    # Plugin isn't playing nicely... We'll try to clean up the rest
+                    logger.error(
+                        "One or more plugins did not clean up properly... Forcing thread exit!")
+                    break
+        self.__tear_down()
+
+    def __drop_exited_metrics(self) -> None:
+        # Series of runners that exited (stopped by a reload or done) - unless a live runner still records them.
+        # Checked again on the next round while a reload is under way
+        if self.__shut_down or not self.__reload_lock.acquire(blocking=False):
+            return
+        try:
+            exited = [r for r in self.__runners + self.__retired if not r.is_alive() and r not in self.__exited]
+            if not exited:
+                return
+            self.__retired = [r for r in self.__retired if r.is_alive()]
+            self.__exited.update(r for r in exited if r in self.__runners)
+            live_urls = {}
+            for runner in self.__runners + self.__retired:
+                if runner.is_alive():
+                    live_urls.setdefault(runner.action.title, set()).update(runner.action.urls)
+            for runner in exited:
+                title = runner.action.title
+                if title not in live_urls:
+                    METRICS.remove(action=title)
+                    continue
+                for url in set(runner.action.urls) - live_urls[title]:
+                    METRICS.remove(action=title, url=url)
+        finally:
+            self.__reload_lock.release()
+
+    def __tear_down(self) -> None:
+        self.__scheduler.shut_down()
+        if self.__governor:
+            self.__governor.stop()
+        # Runners return their leases on exit - closing catches anything a rogue plugin left behind
+        self.__browser_pool.close()
+        if self.__state_store:
+            # Writes still pending are written before the run is reported stopped
+            self.__state_store.close()
         logger.info("Runners have completed execution... tearing down")
         self.status = RunManagerStatus.STOPPED
 
@@ -108,28 +408,83 @@ class RunManager(Thread):
         # Signal shut_down for each runner
         for runner in self.__runners:
             runner.shut_down()
+        if self.__plugin_executor:
+            # Running plugins exit on their own - nothing new is handed to the executor
+            self.__plugin_executor.shutdown(wait=False)
 
         # Wait for runners to finish execution
         self.__shut_down = True
         self.status = RunManagerStatus.SHUTTING_DOWN
 
     def generate_status_table(self, extended=True) -> str:
-        columns = [Column("Service", width=50), Column("Status", width=20)]
-        status = [["Python Web Bot (pywb) Service", str(self.status.name)]]
+        # Imported on demand - importing cmd2 takes longer than anything the service does at startup
+        from cmd2.table_creator import Column, SimpleTable
+
+        columns = [Column("Service", width=50), Column("Status", width=20), Column("Engine", width=10)]
+        status = [["Python Web Bot (pywb) Service", str(self.status.name), self.__engine.name]]
         status_str = SimpleTable(columns).generate_table(status)
 
         runner_data = []
         runner_str = ""
         if extended:
             columns = [Column("Runner ID", width=15),
-                       Column("Action Title", width=50), Column("Plugin", width=20)]
-            for i in range(len(self.__runners)):
-                runner = self.__runners[i]
-                runner_data.append(
-                    [i, "'%s'" % runner.action.title, str(runner.plugin)])
+                       Column("Action Title", width=50), Column("Plugin", width=20), Column("Browser ID", width=15),
+                       Column("Refresh (s)", width=12), Column("Priority", width=10), Column("Checks", width=10),
+                       Column("Overruns", width=10)]
+            if self.__worker_pool:
+                columns.insert(1, Column("Worker ID", width=10))
+            runner_data = self.__runner_data()
+            title_index = 2 if self.__worker_pool else 1
+            for row in runner_data:
+                row[title_index] = "'%s'" % row[title_index]
 
             if len(runner_data) > 0:
                 runner_str = "\n\n\n%s\n\nTOTAL RUNNERS: (%s)" % (
                     SimpleTable(columns).generate_table(runner_data), len(runner_data))
+            if self.__browser_pool:
+                runner_str += "\n\n\n%s" % self.__browser_pool.generate_status_table()
+            if self.__worker_pool:
+                runner_str += "\n\n\n%s" % self.__worker_pool.generate_status_table()
 
         return ("\n%s%s\n\n" % (status_str, runner_str))
+
+    def status_info(self) -> dict:
+        fields = (["id"] + (["worker"] if self.__worker_pool else []) +
+                  ["action", "plugin", "browser", "refresh", "priority", "checks", "overruns"])
+        return {"status": self.status.name, "engine": self.__engine.name,
+                "runners": [dict(zip(fields, row)) for row in self.__runner_data()]}
+
+    def __runner_data(self) -> list:
+        if self.__worker_pool:
+            # Runners live in the worker processes - rows are from their last status report
+            runner_data = [[w.worker_id] + row for w in self.__worker_pool.workers for row in w.runner_rows]
+        else:
+            runner_data = self.runner_status_rows()
+        return [[i] + row for i, row in enumerate(runner_data)]
+
+    def runner_status_rows(self) -> list:
+        return [[runner.action.title, str(runner.plugin), runner.browser.browser_id,
+                 "%.0f%s" % (runner.schedule.interval, "*" if runner.schedule.adaptive else ""),
+                 runner.schedule.priority, runner.schedule.n_checks, runner.schedule.overruns]
+                for runner in self.__runners]
+
+    def longest_check(self) -> float:
+        # Seconds the longest running check has been going - checks are only tracked once scheduled
+        now = monotonic()
+        # Schedules of runners that exited (or unregistered) no longer hold a check
+        granted = [runner.schedule.granted_at for runner in self.__runners
+                   if runner.schedule.active and runner.is_alive()]
+        return max([now - g for g in granted if g is not None], default=0)
+
+    def profile_runner(self, runner_id, seconds) -> str:
+        if self.__worker_pool:
+            raise RuntimeError("Runners of the %s engine live in worker processes - profile them with %s" % (
+                self.__engine.name.lower(), "PYWB_PROFILE"))
+        if not 0 <= runner_id < len(self.__runners):
+            raise ValueError("Runner ID %d does not exist" % runner_id)
+        runner = self.__runners[runner_id]
+        if not runner.thread_ids:
+            raise RuntimeError("Runner %d is not running" % runner_id)
+        output_path = profile_path(runner.plugin.name, runner.action.title)
+        SamplingProfiler(runner.thread_ids, output_path, duration=seconds).start()
+        return output_path
@@ -1,18 +1,75 @@
+import asyncio
+from contextvars import copy_context
+from logging import DEBUG
 from os import environ
-from threading import Thread
+from threading import Thread, get_ident
 from traceback import format_exc
 
 from pywb import ENVIRON_DEBUG_KEY
-from pywb.core.logger import logger
+from pywb.core.logger import logger, set_log_context
+from pywb.core.plugin import AsyncPlugin
+from pywb.core.profiler import SamplingProfiler, profile_path, profiling_selected, run_profiled
+
+
+def _err_from_driver(err):
+    # Common errors associated with the driver are from selenium and urllib3
+    # Generically identifying them here - otherwise except statement would be massive...
+    return hasattr(err, "__module__") and \
+        ("selenium" in err.__module__ or "urllib3" in err.__module__)
+
+
+def _log_plugin_error(plugin, err):
+    if (_err_from_driver(err)):
+        # Only formatted when debug logging is on - tracebacks aren't cheap
+        if logger.isEnabledFor(DEBUG):
+            logger.debug("%s: %s\n%s", plugin.name, str(err), format_exc())
+    else:
+        err_str = "%s: %s" % (plugin.name, str(err))
+        if ENVIRON_DEBUG_KEY in environ:
+            err_str += "\n%s" % format_exc()
+        logger.error(err_str)
 
 
 class RunConfig(object):
-    def __init__(self, action=None, actions_path=None, refresh_rate=None, geolocation=None, notifier=None) -> None:
+    def __init__(self, action=None, actions_path=None, refresh_rate=None, geolocation=None, notifier=None,
+                 max_browsers=1, load_strategy="complete", load_timeout=30, parallel_refresh=True,
+                 fingerprint=False, engine="thread", max_concurrency=32, adaptive_refresh=False,
+                 max_workers=0, cluster_address=None, record_path=None, replay_path=None,
+                 state_path=None, block=None, browser_max_mb=0, memory_budget_mb=0,
+                 freeze_tabs=False) -> None:
         self.action = action
         self.actions_path = actions_path
         self.refresh_rate = refresh_rate
         self.geolocation = geolocation
         self.notifier = notifier
+        self.max_browsers = max_browsers
+        # Memory limits of a single browser's processes and of all of them together - 0 is no limit
+        self.browser_max_mb = browser_max_mb
+        self.memory_budget_mb = memory_budget_mb
+        self.load_strategy = load_strategy
+        self.load_timeout = load_timeout
+        self.parallel_refresh = parallel_refresh
+        # Resource types/url patterns blocked on every page - actions can block their own
+        self.block = block
+        self.fingerprint = fingerprint
+        self.freeze_tabs = freeze_tabs
+        self.engine = engine
+        self.max_concurrency = max_concurrency
+        self.adaptive_refresh = adaptive_refresh
+        # Worker processes of the process engine - 0 starts one per core
+        self.max_workers = max_workers
+        # Address the coordinator of the cluster engine listens on
+        self.cluster_address = cluster_address
+        # Snapshot stores - pages are recorded into record_path, the replay browser serves them from replay_path
+        self.record_path = record_path
+        self.replay_path = replay_path
+        # Database plugins keep their state in - nothing is kept across runs without one
+        self.state_path = state_path
+        # Set by the async engine - limits how many browser calls run at once
+        self.browser_slots = None
+        # Set by the run manager per action - not copied between configs
+        self.scheduler = self.schedule = None
+        self.state_store = None
 
 
 class Runner(Thread):
@@ -20,9 +77,9 @@ class Runner(Thread):
         super().__init__()
         self.__run_cfg = run_cfg
         self.__plugin = plugin()
-        self.__browser = browser()
-        logger.debug("Initialized runner for plugin '%s'..." %
-                     str(self.__plugin.name))
+        # Browser lease handed out by the run manager's browser pool
+        self.__browser = browser
+        logger.debug("Initialized runner for plugin '%s'...", self.__plugin.name)
 
     def _send_notification(self, site):
         site_item = site.get_item_name()
@@ -41,29 +98,122 @@ class Runner(Thread):
     def plugin(self):
         return self.__plugin
 
+    @property
+    def browser(self):
+        return self.__browser
+
+    @property
+    def schedule(self):
+        return self.__run_cfg.schedule
+
+    @property
+    def thread_ids(self) -> list:
+        return [self.ident] if self.ident else []
+
     def run(self):
+        set_log_context(action=self.action.title, plugin=self.__plugin.name)
+        if profiling_selected(self.__plugin.name, self.action.title):
+            run_profiled(self.__run, profile_path(self.__plugin.name, self.action.title))
+        else:
+            self.__run()
+
+    def __run(self):
         try:
             self.__plugin.initialize(self.__browser, self.__run_cfg)
             self.__plugin.validate()
             logger.info("\n" + self.__plugin.ascii())
-            self.__plugin.run()
+            if isinstance(self.__plugin, AsyncPlugin):
+                # Async plugins get an event loop of their own on this thread
+                asyncio.run(self.__plugin.run())
+            else:
+                self.__plugin.run()
         except Exception as e:
             # Generically catching errors as a catch-all for any exceptions thrown by the plugin
-            if (self._err_from_driver(e)):
-                logger.debug("%s: %s\n%s" %
-                             (self.__plugin.name, str(e), format_exc()))
+            _log_plugin_error(self.__plugin, e)
+        finally:
+            # Releases the plugin's scheduler grant - a check that raised still holds its browser's slot
+            self.__plugin.stop()
+            self.__browser.quit()
+
+    def shut_down(self):
+        self.__plugin.stop()
+
+
+class AsyncRunner(object):
+    """
+    Runs an action as a task on the async engine's event loop instead of a thread of its own.
+    Sync plugins are adapted by running their (blocking) run loop on the engine's plugin executor.
+    """
+
+    def __init__(self, plugin, browser, run_cfg) -> None:
+        self.__run_cfg = run_cfg
+        self.__plugin = plugin()
+        self.__browser = browser
+        self.__thread_id = None
+        self.task = None
+        logger.debug("Initialized async runner for plugin '%s'...", self.__plugin.name)
+
+    @property
+    def action(self):
+        return self.__run_cfg.action
+
+    @property
+    def plugin(self):
+        return self.__plugin
+
+    @property
+    def browser(self):
+        return self.__browser
+
+    @property
+    def schedule(self):
+        return self.__run_cfg.schedule
+
+    @property
+    def thread_ids(self) -> list:
+        # The event loop's thread - shared by every runner of the async engine
+        return [self.__thread_id] if self.__thread_id else []
+
+    def is_alive(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, loop, browser_slots, plugin_executor) -> None:
+        self.__run_cfg.browser_slots = browser_slots
+        self.task = loop.create_task(self.run(plugin_executor))
+
+    async def run(self, plugin_executor):
+        self.__thread_id = get_ident()
+        # Every task has a context of its own - browser calls handed to threads take it along
+        set_log_context(action=self.action.title, plugin=self.__plugin.name)
+        profiler = None
+        if profiling_selected(self.__plugin.name, self.action.title):
+            # Tasks share a thread - deterministic profiles would mix every runner's calls
+            profiler = SamplingProfiler(self.thread_ids, profile_path(self.__plugin.name, self.action.title))
+            profiler.start()
+        try:
+            await self.__run(plugin_executor)
+        finally:
+            if profiler:
+                profiler.stop()
+
+    async def __run(self, plugin_executor):
+        try:
+            # Initializing loads the browser driver - keep it off the event loop
+            async with self.__run_cfg.browser_slots:
+                await asyncio.to_thread(self.__plugin.initialize, self.__browser, self.__run_cfg)
+            self.__plugin.validate()
+            logger.info("\n" + self.__plugin.ascii())
+            if isinstance(self.__plugin, AsyncPlugin):
+                await self.__plugin.run()
             else:
-                err_str = "%s: %s" % (self.__plugin.name, str(e))
-                if ENVIRON_DEBUG_KEY in environ:
-                    err_str += "\n%s" % format_exc()
-                logger.error(err_str)
-        self.__browser.quit()
-
-    def _err_from_driver(self, err):
-        # Common errors associated with the driver are from selenium and urllib3
-        # Generically identifying them here - otherwise except statement would be massive...
-        return hasattr(err, "__module__") and \
-            ("selenium" in err.__module__ or "urllib3" in err.__module__)
+                await asyncio.get_running_loop().run_in_executor(plugin_executor, copy_context().run,
+                                                                 self.__plugin.run)
+        except Exception as e:
+            # Generically catching errors as a catch-all for any exceptions thrown by the plugin
+            _log_plugin_error(self.__plugin, e)
+        finally:
+            self.__plugin.stop()
+            await asyncio.to_thread(self.__browser.quit)
 
     def shut_down(self):
         self.__plugin.stop()
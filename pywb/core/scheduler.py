@@ -0,0 +1,258 @@
+import asyncio
+from collections import defaultdict, deque
+from heapq import heappop, heappush
+from itertools import count
+from random import uniform
+from threading import Condition, Event, Thread
+from time import monotonic
+from traceback import format_exc
+
+from pywb.core.logger import logger
+from pywb.core.metrics import METRICS
+
+# Golden ratio steps spread the first checks evenly over an interval, whatever the number of actions
+_GOLDEN_RATIO = 0.6180339887
+
+
+def _check_timing(key, interval, jitter, priority) -> tuple:
+    # Anything else would only fail once the scheduler orders the check - converted here instead
+    try:
+        interval, jitter, priority = float(interval), float(jitter), int(priority)
+    except (TypeError, ValueError):
+        raise ValueError("Refresh rate, jitter and priority of '%s' must be numbers - got %r, %r and %r" % (
+            key, interval, jitter, priority))
+    if interval < 0:
+        raise ValueError("Refresh rate for '%s' must not be negative" % key)
+    if jitter < 0:
+        raise ValueError("Jitter for '%s' must not be negative" % key)
+    return interval, jitter, priority
+
+
+def _wake_future(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveInterval(object):
+    """
+    Refresh interval that follows how often a page changes - it shrinks after every observed
+    change and backs off exponentially while the page stays quiet, within [min, max].
+    """
+    SHRINK = 4
+    BACKOFF = 1.5
+    HISTORY = 16
+
+    def __init__(self, interval, min_interval, max_interval) -> None:
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Adaptive refresh rates must satisfy 0 < min (%s) <= max (%s)" % (
+                min_interval, max_interval))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(interval, min_interval), max_interval)
+        # Times of the most recent changes - only the gaps between them are of interest
+        self.changes = deque(maxlen=self.HISTORY)
+
+    def record(self, changed, now=None) -> float:
+        now = monotonic() if now is None else now
+        if changed:
+            self.changes.append(now)
+        gap = self.mean_gap
+        if changed:
+            # Once the change rate is known, a page is polled at twice that rate - otherwise shrink right away
+            interval = gap / 2 if gap else self.interval / self.SHRINK
+        else:
+            interval = self.interval * self.BACKOFF
+            # Regular pages aren't backed off past their change rate until they go quiet for longer than usual
+            if gap and now - self.changes[-1] < 2 * gap:
+                interval = min(interval, gap / 2)
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        return self.interval
+
+    @property
+    def mean_gap(self):
+        if len(self.changes) < 2:
+            return None
+        return (self.changes[-1] - self.changes[0]) / (len(self.changes) - 1)
+
+
+class Schedule(object):
+    __slots__ = ("key", "interval", "jitter", "priority", "resource", "adaptive", "next_due", "granted_at",
+                 "last_duration", "overruns", "n_checks", "active", "_wake", "_seq")
+
+    def __init__(self, key, interval, jitter=0, priority=0, resource=None, adaptive=None) -> None:
+        self.key = key
+        self.interval = interval if adaptive is None else adaptive.interval
+        self.jitter = jitter
+        self.priority = priority
+        # Checks sharing a resource (i.e. a pooled browser) compete for its capacity
+        self.resource = resource
+        self.adaptive = adaptive
+        self.next_due = None
+        self.granted_at = None
+        self.last_duration = None
+        self.overruns = 0
+        self.n_checks = 0
+        self.active = True
+        self._wake = None
+        # Entry of the schedule that's current - older ones left behind in the queues are skipped
+        self._seq = None
+
+
+class Scheduler(Thread):
+    """
+    Central timeline of all action checks, keyed by the time each check is next due. Due checks
+    are admitted in priority order while their resource has capacity - when a browser is saturated,
+    higher priority actions go first and lower priority ones wait for the next free slot.
+    """
+
+    def __init__(self, max_in_flight=1) -> None:
+        super().__init__(name="pywb-scheduler", daemon=True)
+        self.max_in_flight = max_in_flight
+        self.__cond = Condition()
+        self.__timeline = []
+        self.__ready = defaultdict(list)
+        self.__in_flight = defaultdict(int)
+        self.__seq = count()
+        self.__n_registered = 0
+        self.__shut_down = False
+
+    def register(self, key, interval, jitter=0, priority=0, resource=None, adaptive=None) -> Schedule:
+        interval, jitter, priority = _check_timing(key, interval, jitter, priority)
+        schedule = Schedule(key, interval, jitter=jitter, priority=priority, resource=resource, adaptive=adaptive)
+        with self.__cond:
+            offset = (self.__n_registered * _GOLDEN_RATIO) % 1 * schedule.interval
+            schedule.next_due = monotonic() + offset
+            self.__n_registered += 1
+        return schedule
+
+    def unregister(self, schedule) -> None:
+        with self.__cond:
+            if not schedule.active:
+                return
+            schedule.active = False
+            if schedule.granted_at is not None:
+                self.__in_flight[schedule.resource] -= 1
+                schedule.granted_at = None
+            self.__wake(schedule)
+            self.__cond.notify()
+
+    def reconfigure(self, schedule, interval, jitter=0, priority=0, adaptive=None) -> None:
+        interval, jitter, priority = _check_timing(schedule.key, interval, jitter, priority)
+        with self.__cond:
+            previous = schedule.interval
+            schedule.interval = interval if adaptive is None else adaptive.interval
+            schedule.jitter = jitter
+            schedule.priority = priority
+            schedule.adaptive = adaptive
+            # A waiting check is moved up to the shorter interval - a longer one applies from the next check on
+            if schedule._wake is None or schedule.granted_at is not None or schedule.interval >= previous:
+                return
+            next_due = max(schedule.next_due - previous + schedule.interval, monotonic())
+            if next_due < schedule.next_due:
+                schedule.next_due = next_due
+                schedule._seq = next(self.__seq)
+                heappush(self.__timeline, (schedule.next_due, schedule._seq, schedule))
+                self.__cond.notify()
+
+    def report(self, schedule, changed) -> None:
+        # Feeds the result of a check back into an adaptive schedule - applies from the next check on
+        if schedule.adaptive is None:
+            return
+        with self.__cond:
+            previous = schedule.interval
+            schedule.interval = schedule.adaptive.record(changed)
+        if schedule.interval != previous:
+            logger.debug("Refresh rate for '%s' adapted from %.1fs to %.1fs", schedule.key, previous, schedule.interval)
+
+    def wait_turn(self, schedule) -> None:
+        # Ends the schedule's current check (if any) and blocks until the next one is due
+        event = Event()
+        if self.__enqueue(schedule, event.set):
+            event.wait()
+
+    async def async_wait_turn(self, schedule) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self.__enqueue(schedule, lambda: loop.call_soon_threadsafe(_wake_future, future)):
+            await future
+
+    def __enqueue(self, schedule, wake) -> bool:
+        with self.__cond:
+            if not schedule.active or self.__shut_down:
+                return False
+            if schedule.granted_at is not None:
+                self.__complete(schedule)
+            schedule._wake = wake
+            schedule._seq = next(self.__seq)
+            heappush(self.__timeline, (schedule.next_due, schedule._seq, schedule))
+            self.__cond.notify()
+        return True
+
+    def __complete(self, schedule) -> None:
+        now = monotonic()
+        self.__in_flight[schedule.resource] -= 1
+        schedule.n_checks += 1
+        schedule.last_duration = now - schedule.granted_at
+        METRICS.observe("check_seconds", schedule.last_duration, action=schedule.key)
+        if schedule.last_duration > schedule.interval:
+            schedule.overruns += 1
+            METRICS.inc("check_overruns_total", action=schedule.key)
+            logger.warning("Check for '%s' overran its refresh rate (%.1fs > %.1fs)",
+                           schedule.key, schedule.last_duration, schedule.interval)
+        next_due = schedule.granted_at + schedule.interval
+        if schedule.jitter:
+            next_due += uniform(-schedule.jitter, schedule.jitter)
+        # An overrun check is due again right away
+        schedule.next_due = max(next_due, now)
+        schedule.granted_at = None
+
+    def __wake(self, schedule) -> None:
+        wake, schedule._wake = schedule._wake, None
+        if wake:
+            wake()
+
+    def run(self) -> None:
+        with self.__cond:
+            while not self.__shut_down:
+                now = monotonic()
+                try:
+                    self.__move_due(now)
+                    self.__admit_ready(now)
+                except Exception as e:
+                    # Every check waits on this thread - it has to keep going whatever happened
+                    logger.error("Scheduler failed to admit checks - %s\n%s", str(e), format_exc())
+                timeout = self.__timeline[0][0] - now if self.__timeline else None
+                self.__cond.wait(timeout)
+
+    def __move_due(self, now) -> None:
+        while self.__timeline and self.__timeline[0][0] <= now:
+            due, seq, schedule = heappop(self.__timeline)
+            if not schedule.active or seq != schedule._seq:
+                continue
+            try:
+                heappush(self.__ready[schedule.resource], (-schedule.priority, due, seq, schedule))
+            except TypeError as e:
+                # Never admitted - its runner waits until it's unregistered, the others go on
+                schedule._seq = None
+                logger.error("Dropping check for '%s' from the schedule - %s", schedule.key, str(e))
+
+    def __admit_ready(self, now) -> None:
+        for resource, ready in self.__ready.items():
+            while ready and self.__in_flight[resource] < self.max_in_flight:
+                _, _, seq, schedule = heappop(ready)
+                if not schedule.active or seq != schedule._seq:
+                    continue
+                self.__in_flight[resource] += 1
+                schedule.granted_at = now
+                logger.debug("Admitting check for '%s' (priority %d)", schedule.key, schedule.priority)
+                self.__wake(schedule)
+
+    def shut_down(self) -> None:
+        with self.__cond:
+            self.__shut_down = True
+            for _, _, schedule in self.__timeline:
+                self.__wake(schedule)
+            for ready in self.__ready.values():
+                for item in ready:
+                    self.__wake(item[3])
+            self.__cond.notify()
@@ -0,0 +1,236 @@
+"""
+The pywb service without a front end - driven in process by the shell, or by the clients of
+the control socket when started with 'pywb serve'.
+"""
+
+import signal
+from os import path
+from threading import Event, Lock, Thread
+
+from pywb.core.action import ActionsWatcher, compile_actions
+from pywb.core.control import ControlServer
+from pywb.core.logger import logger
+from pywb.core.metrics import METRICS, MetricsExporter
+from pywb.core.notifier import Notifier
+from pywb.core.plugin_manager import PluginManager
+from pywb.core.run_manager import RunManager, RunManagerStatus
+from pywb.core.runner import RunConfig
+from pywb.settings import SETTINGS
+from pywb.web import BrowserType, load_browser
+
+
+def _shut_down_notifier(run_manager) -> None:
+    # Once the runners are done - nothing notifies after that
+    run_manager.join()
+    run_manager.run_cfg.notifier.shut_down()
+
+
+class BotService(object):
+    """
+    Runs the actions of a file with the current settings - one run at a time. Start, stop and
+    reload are serialized, status and stats can be asked for at any time.
+    """
+
+    def __init__(self, plugin_manager) -> None:
+        self.__plugin_manager = plugin_manager
+        self.__run_manager = RunManager()
+        self.__metrics_exporter = None
+        self.__actions_watcher = None
+        self.__lock = Lock()
+
+    @property
+    def run_manager(self) -> RunManager:
+        return self.__run_manager
+
+    @property
+    def status(self) -> RunManagerStatus:
+        return self.__run_manager.status
+
+    def start(self, actions_path, engine=None) -> list:
+        # Returns warnings of the start - the service runs regardless
+        with self.__lock:
+            # Only can have one run manager
+            if self.__run_manager.status >= RunManagerStatus.SHUTTING_DOWN:
+                raise RuntimeError("The pywb service is already running!")
+            # Get a local copy of the plugins loaded right now
+            plugins = self.__plugin_manager.loaded_plugins
+            # Parse the actions from the yaml file - validated against their plugins before anything starts
+            actions = compile_actions(actions_path, plugins)
+            notifier = Notifier(remote_notifications=SETTINGS.remote_notifications)
+            try:
+                run_cfg = RunConfig(actions_path=actions_path,
+                                    refresh_rate=SETTINGS.refresh_rate,
+                                    geolocation=SETTINGS.geolocation,
+                                    notifier=notifier,
+                                    max_browsers=SETTINGS.max_browsers,
+                                    browser_max_mb=SETTINGS.browser_max_mb,
+                                    memory_budget_mb=SETTINGS.memory_budget_mb,
+                                    load_strategy=SETTINGS.load_strategy,
+                                    load_timeout=SETTINGS.load_timeout,
+                                    parallel_refresh=SETTINGS.parallel_refresh,
+                                    block=SETTINGS.block,
+                                    fingerprint=SETTINGS.fingerprint,
+                                    freeze_tabs=SETTINGS.freeze_tabs,
+                                    engine=engine or SETTINGS.engine,
+                                    max_concurrency=SETTINGS.max_concurrency,
+                                    adaptive_refresh=SETTINGS.adaptive_refresh,
+                                    max_workers=SETTINGS.max_workers,
+                                    cluster_address=SETTINGS.cluster_address,
+                                    record_path=SETTINGS.record_path,
+                                    replay_path=SETTINGS.replay_path,
+                                    state_path=SETTINGS.state_path)
+                # Stats are per run of the service
+                METRICS.reset()
+                warnings = self.__start_metrics_exporter()
+                self.__run_manager = RunManager(
+                    actions=actions, plugins=plugins, browser=load_browser(BrowserType[SETTINGS.browser.upper()]),
+                    run_cfg=run_cfg)
+                # Detached from whoever started it - the service is stopped through stop()
+                self.__run_manager.daemon = True
+                self.__run_manager.start()
+                if not self.__run_manager.wait_started():
+                    raise RuntimeError("The pywb service failed to start - see the log for details")
+            except BaseException:
+                # Nothing of a failed start is left running
+                self.__stop_run_services(notifier)
+                raise
+            self.update_actions_watcher()
+            return warnings
+
+    def reload(self) -> dict:
+        with self.__lock:
+            if self.__run_manager.status != RunManagerStatus.RUNNING:
+                raise RuntimeError("The pywb service is not running")
+            return self.__run_manager.reload(compile_actions(self.__run_manager.run_cfg.actions_path,
+                                                             self.__plugin_manager.loaded_plugins))
+
+    def stop(self, blocking=False) -> bool:
+        # True if the service was running - blocking waits for its runners to exit
+        with self.__lock:
+            service_is_running = self.__run_manager.status >= RunManagerStatus.STARTED
+            if self.__actions_watcher:
+                self.__actions_watcher.stop()
+                self.__actions_watcher = None
+            if service_is_running:
+                self.__run_manager.shut_down()
+                if blocking:
+                    self.__run_manager.join()
+                    self.__stop_run_services(self.__run_manager.run_cfg.notifier)
+                else:
+                    Thread(target=_shut_down_notifier, args=(self.__run_manager,), name="pywb-stop",
+                           daemon=True).start()
+            # Service is already shutting down from another thread
+            elif blocking and self.__run_manager.is_alive():
+                self.__run_manager.join()
+            return service_is_running
+
+    def __stop_run_services(self, notifier) -> None:
+        notifier.shut_down()
+        if self.__metrics_exporter:
+            self.__metrics_exporter.stop()
+            self.__metrics_exporter = None
+
+    def update_actions_watcher(self) -> None:
+        # Watches the actions file of the running service - if the setting is on
+        watch = SETTINGS.watch_actions and self.__run_manager.status == RunManagerStatus.RUNNING
+        if self.__actions_watcher and not watch:
+            self.__actions_watcher.stop()
+            self.__actions_watcher = None
+        elif watch and not self.__actions_watcher:
+            self.__actions_watcher = ActionsWatcher(self.__run_manager.run_cfg.actions_path, self.__run_manager.reload,
+                                                    self.__plugin_manager.loaded_plugins)
+            self.__actions_watcher.start()
+
+    def __start_metrics_exporter(self) -> list:
+        if self.__metrics_exporter:
+            self.__metrics_exporter.stop()
+            self.__metrics_exporter = None
+        if SETTINGS.metrics_port or SETTINGS.metrics_file:
+            self.__metrics_exporter = MetricsExporter(port=SETTINGS.metrics_port, file_path=SETTINGS.metrics_file)
+            try:
+                self.__metrics_exporter.start()
+            except OSError as e:
+                self.__metrics_exporter = None
+                return ["Unable to export metrics - %s" % str(e)]
+        return []
+
+    def status_info(self) -> dict:
+        info = self.__run_manager.status_info()
+        info["actions_path"] = self.__run_manager.run_cfg.actions_path if self.__run_manager.run_cfg else None
+        return info
+
+    def generate_status_table(self) -> str:
+        status_table = self.__run_manager.generate_status_table(
+            extended=(self.__run_manager.status == RunManagerStatus.RUNNING))
+        if self.__run_manager.run_cfg:
+            status_table += "%s\n\n" % self.__run_manager.run_cfg.notifier.generate_status_table()
+        return status_table
+
+    def handle_command(self, command, **args):
+        """Commands of the control socket - results are JSON serializable."""
+        if command == "start":
+            actions_path = args.get("actions") or (self.__run_manager.run_cfg.actions_path
+                                                   if self.__run_manager.run_cfg else None)
+            if not actions_path:
+                raise ValueError("Unable to start pywb service - Missing actions .yaml file")
+            # Settings changed since the daemon started (i.e. with 'set' in a shell) apply to every start
+            SETTINGS.load()
+            warnings = self.start(path.abspath(actions_path), engine=args.get("engine"))
+            return dict(self.status_info(), warnings=warnings)
+        if command == "stop":
+            stopped = self.stop(blocking=bool(args.get("wait")))
+            return dict(self.status_info(), stopped=stopped)
+        if command == "reload":
+            return self.reload()
+        if command == "status":
+            info = self.status_info()
+            if args.get("table"):
+                info["table"] = self.generate_status_table()
+            return info
+        if command == "stats":
+            if args.get("prometheus"):
+                return {"prometheus": METRICS.render_prometheus()}
+            stats = METRICS.render_json()
+            if args.get("table"):
+                stats["table"] = METRICS.generate_stats_table()
+            return stats
+        raise ValueError("Unknown command '%s'" % command)
+
+
+def serve(actions_path=None, engine=None, socket_path=None) -> int:
+    """
+    Runs the service headless until SIGTERM/SIGINT - started with the actions (if given) and
+    controlled through the control socket. Nothing is read from or written to a terminal.
+    """
+    import yaml
+
+    SETTINGS.load()
+    SETTINGS.configure_logging()
+    plugin_manager = PluginManager()
+    plugin_manager.load_builtin_plugins()
+    service = BotService(plugin_manager)
+    server = ControlServer(service.handle_command, socket_path=socket_path)
+    try:
+        server.start()
+    except (RuntimeError, OSError) as e:
+        # i.e. another daemon already serves the socket
+        logger.error("Unable to serve pywb control socket - %s", str(e))
+        return 1
+    logger.info("Serving pywb control socket at '%s'", server.socket_path)
+
+    stop_event = Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop_event.set())
+    try:
+        if actions_path:
+            for warning in service.start(path.abspath(actions_path), engine=engine):
+                logger.warning(warning)
+        stop_event.wait()
+    except (RuntimeError, ValueError, OSError, yaml.YAMLError) as e:
+        logger.error("Unable to start pywb service - %s", str(e))
+        return 1
+    finally:
+        logger.info("Shutting down the pywb daemon")
+        server.stop()
+        service.stop(blocking=True)
+    return 0
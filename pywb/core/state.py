@@ -0,0 +1,144 @@
+import json
+import sqlite3
+from os import makedirs, path
+from threading import Condition, Lock, Thread
+from time import time
+
+from pywb.core.logger import logger
+
+_DELETED = object()
+
+
+class StateStore(object):
+    """
+    SQLite store of plugin state keyed by plugin, action title, url and key. Writes are
+    collected in memory and written by a background thread in one transaction per batch -
+    plugins never wait on the disk. State of an action is loaded with a single query.
+    """
+    FLUSH_INTERVAL = 1
+
+    def __init__(self, db_path) -> None:
+        self.db_path = db_path
+        makedirs(path.dirname(db_path) or ".", exist_ok=True)
+        # Shared by the writer and the runners loading their state - access is serialized by the lock
+        self.__conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.__db_lock = Lock()
+        with self.__db_lock:
+            # Worker processes of the same run write to the same file - WAL lets them read while one writes
+            self.__conn.execute("PRAGMA journal_mode=WAL")
+            self.__conn.execute("PRAGMA synchronous=NORMAL")
+            self.__conn.execute("CREATE TABLE IF NOT EXISTS plugin_state (plugin TEXT NOT NULL, action TEXT NOT NULL, "
+                                "url TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated REAL NOT NULL, "
+                                "PRIMARY KEY (plugin, action, url, key))")
+            self.__conn.commit()
+        self.__pending = {}
+        # Batch being written - still newer than what's stored until it's committed
+        self.__flushing = {}
+        self.__flush_lock = Lock()
+        self.__cond = Condition()
+        self.__closed = False
+        self.__writer = Thread(target=self.__write_periodically, name="pywb-state-writer", daemon=True)
+        self.__writer.start()
+
+    def load(self, plugin, action) -> dict:
+        # Held until the writes that haven't made it to the database yet are applied - a batch is
+        # committed either before the query or after them
+        with self.__db_lock:
+            rows = self.__conn.execute("SELECT url, key, value FROM plugin_state WHERE plugin = ? AND action = ?",
+                                       (plugin, action)).fetchall()
+            state = {(url, key): json.loads(value) for url, key, value in rows}
+            with self.__cond:
+                for (p, a, url, key), value in list(self.__flushing.items()) + list(self.__pending.items()):
+                    if p == plugin and a == action:
+                        if value is _DELETED:
+                            state.pop((url, key), None)
+                        else:
+                            state[(url, key)] = json.loads(value)
+        return state
+
+    def put(self, plugin, action, url, key, value) -> None:
+        # Serialized right away - the plugin may keep changing the value it passed
+        self.__queue((plugin, action, url, key), json.dumps(value))
+
+    def delete(self, plugin, action, url, key) -> None:
+        self.__queue((plugin, action, url, key), _DELETED)
+
+    def __queue(self, state_key, value) -> None:
+        with self.__cond:
+            # Only the last write of a key within a batch is written - the first one wakes the writer
+            if not self.__pending:
+                self.__cond.notify()
+            self.__pending[state_key] = value
+
+    def __write_periodically(self) -> None:
+        while True:
+            with self.__cond:
+                while not self.__pending and not self.__closed:
+                    self.__cond.wait()
+                if self.__closed:
+                    return
+                # Writes of the next moment go into the same transaction
+                self.__cond.wait(self.FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self) -> None:
+        with self.__flush_lock:
+            with self.__cond:
+                pending = self.__flushing = self.__pending
+                self.__pending = {}
+            if not pending:
+                return
+            now = time()
+            upserts = [k + (v, now) for k, v in pending.items() if v is not _DELETED]
+            deletes = [k for k, v in pending.items() if v is _DELETED]
+            with self.__db_lock:
+                try:
+                    with self.__conn:
+                        self.__conn.executemany("INSERT OR REPLACE INTO plugin_state VALUES (?, ?, ?, ?, ?, ?)", upserts)
+                        self.__conn.executemany(
+                            "DELETE FROM plugin_state WHERE plugin = ? AND action = ? AND url = ? AND key = ?", deletes)
+                except sqlite3.Error as e:
+                    logger.error("Unable to write %d plugin state change(s) to '%s' - %s", len(pending), self.db_path,
+                                 str(e))
+                with self.__cond:
+                    self.__flushing = {}
+
+    def close(self) -> None:
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify()
+        self.__writer.join()
+        self.flush()
+        with self.__db_lock:
+            self.__conn.close()
+
+
+class PluginState(object):
+    """
+    State of one plugin's action - read from memory, written through to the state store (if any).
+    Values have to be JSON serializable.
+    """
+
+    def __init__(self, store, plugin, action) -> None:
+        self.__store = store
+        self.__plugin = plugin
+        self.__action = action
+        self.__state = store.load(plugin, action) if store else {}
+
+    def get(self, url, key, default=None):
+        return self.__state.get((url, key), default)
+
+    def items(self, key) -> dict:
+        # Values of the key by url
+        return {url: value for (url, k), value in self.__state.items() if k == key}
+
+    def set(self, url, key, value) -> None:
+        if self.__state.get((url, key), _DELETED) == value:
+            return
+        self.__state[(url, key)] = value
+        if self.__store:
+            self.__store.put(self.__plugin, self.__action, url, key, value)
+
+    def delete(self, url, key) -> None:
+        if self.__state.pop((url, key), _DELETED) is not _DELETED and self.__store:
+            self.__store.delete(self.__plugin, self.__action, url, key)
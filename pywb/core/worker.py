@@ -0,0 +1,287 @@
+from copy import copy
+from inspect import getfile
+from math import ceil
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from os import cpu_count
+from threading import Lock, Thread
+from time import monotonic
+
+import psutil
+
+from pywb.core.logger import _LogQueueHandler, logger
+
+# Workers are spawned fresh - forking a process that already runs browser threads is unsafe
+_MP_CONTEXT = get_context("spawn")
+
+_EVENT_LOG = "log"
+_EVENT_NOTIFY = "notify"
+_EVENT_STATUS = "status"
+
+
+def _signal_process(signal_func) -> None:
+    try:
+        signal_func()
+    except psutil.Error:
+        # Already gone
+        pass
+
+
+def _terminate_tree(process, timeout) -> None:
+    # Browsers and their drivers run as children of the worker - looked up while they're still its children
+    try:
+        children = psutil.Process(process.pid).children(recursive=True)
+    except psutil.Error:
+        children = []
+    process.terminate()
+    for child in children:
+        _signal_process(child.terminate)
+    process.join(timeout=timeout)
+    if process.is_alive():
+        process.kill()
+        process.join()
+    _, alive = psutil.wait_procs(children, timeout=timeout)
+    for child in alive:
+        logger.warning("Killing process %d left behind by %s", child.pid, process.name)
+        _signal_process(child.kill)
+
+
+class _EventChannel(object):
+    # Worker end of the pipe to the parent - a pipe per worker, so terminating one can't corrupt the others
+    def __init__(self, conn) -> None:
+        self.__conn = conn
+        self.__lock = Lock()
+
+    def send(self, event, data) -> None:
+        with self.__lock:
+            self.__conn.send((event, data))
+
+
+class _EventLogHandler(_LogQueueHandler):
+    # Log records of a worker are handled by the parent's logger - one log file for all processes
+    def __init__(self, channel, worker_id) -> None:
+        super().__init__(channel)
+        self.__worker_id = worker_id
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.msg = "[worker %d] %s" % (self.__worker_id, record.msg)
+        record.worker = self.__worker_id
+        return record
+
+    def enqueue(self, record) -> None:
+        self.queue.send(_EVENT_LOG, record)
+
+
+class _EventNotifier(object):
+    # Stands in for the notifier inside a worker - notifications are sent by the parent process
+    def __init__(self, channel) -> None:
+        self.__channel = channel
+
+    def notify(self, title, message, link) -> None:
+        self.__channel.send(_EVENT_NOTIFY, (title, message, link))
+
+    def __deepcopy__(self, memo):
+        # Shared by every run config of the worker, like the notifier it stands in for
+        return self
+
+
+def _worker_main(worker_id, actions, plugin_paths, browser, run_cfg, conn, stop_event, log_level) -> None:
+    # Imported here - the run manager itself starts worker pools
+    from pywb.core.plugin_manager import PluginManager
+    from pywb.core.run_manager import RunManager
+
+    channel = _EventChannel(conn)
+    logger.handlers = [_EventLogHandler(channel, worker_id)]
+    logger.propagate = False
+    logger.setLevel(log_level)
+
+    plugin_manager = PluginManager()
+    for plugin_path in plugin_paths:
+        plugin_manager.load_plugins(plugin_path)
+    run_cfg.notifier = _EventNotifier(channel)
+    run_manager = RunManager(actions=actions, plugins=plugin_manager.loaded_plugins, browser=browser, run_cfg=run_cfg)
+    run_manager.start()
+
+    while run_manager.is_alive():
+        if stop_event.wait(timeout=1) and not run_manager.shut_down_requested:
+            run_manager.shut_down()
+        # Doubles as the heartbeat of the worker
+        channel.send(_EVENT_STATUS, (run_manager.runner_status_rows(), run_manager.longest_check()))
+    run_manager.join()
+
+
+class _Worker(object):
+    def __init__(self, worker_id, actions) -> None:
+        self.worker_id = worker_id
+        self.actions = actions
+        self.process = None
+        self.conn = None
+        self.stop_event = None
+        self.restarts = 0
+        self.last_heartbeat = None
+        self.longest_check = 0
+        self.runner_rows = []
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class WorkerPool(object):
+    """
+    Shards actions across worker processes, each with a run manager of its own. Logs, notifications
+    and status of the workers come back over a pipe per worker - a worker that stops sending
+    them or has a check stuck for too long is terminated and respawned.
+    """
+    HEARTBEAT_TIMEOUT = 30
+    STOP_TIMEOUT = 30
+    TERMINATE_TIMEOUT = 5
+
+    def __init__(self, actions, plugins, browser, run_cfg) -> None:
+        n_workers = min(run_cfg.max_workers or cpu_count() or 1, len(actions))
+        self.run_cfg = run_cfg
+        # A check running much longer than a page load can take is considered hung
+        self.hang_timeout = max(4 * run_cfg.load_timeout, 120)
+        self.__browser = browser
+        self.__plugin_paths = {name: getfile(plugin) for name, plugin in plugins.items()}
+        self.__workers = [_Worker(i, actions[i::n_workers]) for i in range(n_workers)]
+        self.__lock = Lock()
+        # Pipes of terminated workers - kept until the listener drains them to EOF
+        self.__retired_conns = []
+        self.__listener = Thread(target=self.__listen, name="pywb-worker-events", daemon=True)
+        self.__stopping = False
+
+    @property
+    def workers(self) -> list:
+        return self.__workers
+
+    def start(self) -> None:
+        logger.info("Starting %d worker process(es) for %d action(s)", len(self.__workers),
+                    sum(len(w.actions) for w in self.__workers))
+        self.__listener.start()
+        for worker in self.__workers:
+            self.__spawn(worker)
+
+    def __spawn(self, worker) -> None:
+        run_cfg = copy(self.run_cfg)
+        # Notifiers hold endpoints that don't cross processes - workers get one forwarding to the parent
+        run_cfg.notifier = None
+        run_cfg.engine = "async"
+        run_cfg.max_browsers = max(1, ceil(self.run_cfg.max_browsers / len(self.__workers)))
+        # The memory budget is shared by all workers like the browsers are
+        run_cfg.memory_budget_mb = ceil(self.run_cfg.memory_budget_mb / len(self.__workers))
+        plugin_paths = sorted({self.__plugin_paths[a.plugin_name] for a in worker.actions
+                               if a.plugin_name in self.__plugin_paths})
+
+        conn, child_conn = _MP_CONTEXT.Pipe(duplex=False)
+        worker.stop_event = _MP_CONTEXT.Event()
+        worker.last_heartbeat = monotonic()
+        worker.longest_check = 0
+        worker.process = _MP_CONTEXT.Process(
+            target=_worker_main, name="pywb-worker-%d" % worker.worker_id, daemon=True,
+            args=(worker.worker_id, worker.actions, plugin_paths, self.__browser, run_cfg, child_conn,
+                  worker.stop_event, logger.getEffectiveLevel()))
+        worker.process.start()
+        # Only the worker writes to the pipe - the parent's copy of its end has to be closed to see EOF
+        child_conn.close()
+        with self.__lock:
+            worker.conn = conn
+        logger.info("Started worker %d (pid %d) with %d action(s)", worker.worker_id, worker.process.pid,
+                    len(worker.actions))
+
+    def __listen(self) -> None:
+        while True:
+            with self.__lock:
+                conns = {w.conn: w for w in self.__workers if w.conn is not None}
+                conns |= {conn: None for conn in self.__retired_conns}
+            if not conns:
+                if self.__stopping:
+                    return
+                wait([], timeout=1)
+                continue
+
+            for conn in wait(list(conns), timeout=1):
+                worker = conns[conn]
+                try:
+                    event, data = conn.recv()
+                except (EOFError, OSError):
+                    # Worker exited (or was terminated) - nothing more will come from this pipe
+                    self.__close_conn(worker, conn)
+                    continue
+
+                if event == _EVENT_LOG:
+                    logger.handle(data)
+                elif event == _EVENT_NOTIFY:
+                    self.run_cfg.notifier.notify(*data)
+                elif event == _EVENT_STATUS and worker:
+                    worker.last_heartbeat = monotonic()
+                    worker.runner_rows, worker.longest_check = data
+
+    def __close_conn(self, worker, conn) -> None:
+        with self.__lock:
+            if worker and worker.conn is conn:
+                worker.conn = None
+            elif conn in self.__retired_conns:
+                self.__retired_conns.remove(conn)
+        conn.close()
+
+    @property
+    def finished(self) -> bool:
+        return not any(w.is_alive for w in self.__workers)
+
+    def monitor(self) -> None:
+        # Respawns workers that crashed or hung - a worker exiting cleanly has finished all of its actions
+        if self.__stopping:
+            return
+        now = monotonic()
+        for worker in self.__workers:
+            if worker.process.exitcode == 0:
+                continue
+            reason = None
+            if worker.process.exitcode is not None:
+                reason = "exited with code %d" % worker.process.exitcode
+            elif now - worker.last_heartbeat > self.HEARTBEAT_TIMEOUT:
+                reason = "sent no heartbeat for %ds" % (now - worker.last_heartbeat)
+            elif worker.longest_check > self.hang_timeout:
+                reason = "has a check running for %ds" % worker.longest_check
+            if reason:
+                logger.error("Worker %d (pid %d) %s - Respawning", worker.worker_id, worker.process.pid, reason)
+                self.__terminate(worker)
+                worker.restarts += 1
+                self.__spawn(worker)
+
+    def __terminate(self, worker) -> None:
+        _terminate_tree(worker.process, timeout=self.TERMINATE_TIMEOUT)
+        with self.__lock:
+            # The listener may still be waiting on the old pipe - it closes it once drained
+            if worker.conn is not None:
+                self.__retired_conns.append(worker.conn)
+                worker.conn = None
+
+    def shut_down(self) -> None:
+        self.__stopping = True
+        for worker in self.__workers:
+            worker.stop_event.set()
+
+        # Workers get a shared deadline to stop their runners - anything left after it is terminated
+        deadline = monotonic() + self.STOP_TIMEOUT
+        for worker in self.__workers:
+            worker.process.join(timeout=max(0, deadline - monotonic()))
+            if worker.process.is_alive():
+                logger.error("Worker %d (pid %d) did not stop in time... Terminating process!",
+                             worker.worker_id, worker.process.pid)
+                self.__terminate(worker)
+        self.__listener.join(timeout=5)
+
+    def generate_status_table(self) -> str:
+        from cmd2.table_creator import Column, SimpleTable
+
+        columns = [Column("Worker ID", width=15), Column("PID", width=10), Column("Actions", width=10),
+                   Column("Status", width=10), Column("Restarts", width=10), Column("Heartbeat (s)", width=15)]
+        now = monotonic()
+        worker_data = [[w.worker_id, w.process.pid if w.process else "-", len(w.actions),
+                        "ALIVE" if w.is_alive else "EXITED", w.restarts,
+                        "%.0f" % (now - w.last_heartbeat) if w.last_heartbeat else "-"] for w in self.__workers]
+        return "%s\n\nWORKERS ALIVE: (%s/%s)" % (SimpleTable(columns).generate_table(worker_data),
+                                                 len([w for w in self.__workers if w.is_alive]), len(self.__workers))
@@ -3,11 +3,12 @@ from enum import Enum
 from urllib.parse import urlparse
 
 from pywb.core.logger import logger
-from pywb.core.plugin import Plugin
+from pywb.core.metrics import METRICS
+from pywb.core.plugin import AsyncPlugin
 from pywb.web import By
 
 
-class InStockNotifier(Plugin):
+class InStockNotifier(AsyncPlugin):
     VERSION = "0.1"
 
     ACTION_KWARG_WATCH = "watch"
@@ -16,60 +17,112 @@ class InStockNotifier(Plugin):
 
     NotifyOnType = Enum("NotifyOnType", ["APPEAR", "DISAPPEAR"])
 
+    # Kept across restarts - a restarted action neither re-baselines nor repeats its notifications
+    STATE_BASELINE = "baseline"
+    STATE_LAST_NOTIFY = "last_notify"
+
     def __init__(self) -> None:
         self.__element_baseline = {}
+        self.__last_stats = None
         self.__last_notify_time = {}
+        self.__watched = {}
+        self.__texts = self.__notify_on = ()
         super().__init__(__class__.__name__, self.VERSION)
 
-    def __validate_action_kwargs(self) -> None:
-        for k, v in self._action.kwargs.items():
+    @classmethod
+    def compile_action(cls, action) -> None:
+        for k in (cls.ACTION_KWARG_WATCH, cls.ACTION_KWARG_TEXT, cls.ACTION_KWARG_NOTIFY_ON):
+            v = action.kwargs.get(k)
             if type(v) != list:
                 raise ValueError(
-                    "For self._action '%s' - '%s' must be a list" % (self._action.title, k))
-            if len(v) != len(self._action.urls):
+                    "For action '%s' - '%s' must be a list" % (action.title, k))
+            if len(v) != len(action.urls):
                 raise ValueError(
-                    "For self._action '%s' - '%s' must have %s values" % (self._action.title, k, len(self._action.urls)))
+                    "For action '%s' - '%s' must have %s values" % (action.title, k, len(action.urls)))
+        try:
+            bys = tuple(By[watch_type.upper()] for watch_type in action.kwargs[cls.ACTION_KWARG_WATCH])
+            notify_on = tuple(cls.NotifyOnType[notify_type.upper()]
+                              for notify_type in action.kwargs[cls.ACTION_KWARG_NOTIFY_ON])
+        except (KeyError, AttributeError) as e:
+            raise ValueError("For action '%s' - unknown watch or notify_on type %s" % (action.title, str(e)))
+        # Notify types are kept by name - the plugin's own enum isn't importable in worker processes
+        action.compiled = (bys, tuple(str(text) for text in action.kwargs[cls.ACTION_KWARG_TEXT]),
+                           tuple(n.name for n in notify_on))
 
     def initialize(self, browser, run_cfg) -> None:
         super().initialize(browser, run_cfg)
 
     def validate(self) -> None:
         super().validate()
-        self.__validate_action_kwargs()
-
-    def run(self) -> None:
-        super().run()
-        # Replace watch and notify string strings with element types
-        self._action.kwargs[self.ACTION_KWARG_WATCH] = [By[watch_type.upper(
-        )] for watch_type in self._action.kwargs[self.ACTION_KWARG_WATCH]]
-
-        self._action.kwargs[self.ACTION_KWARG_NOTIFY_ON] = [self.NotifyOnType[notify_type.upper(
-        )] for notify_type in self._action.kwargs[self.ACTION_KWARG_NOTIFY_ON]]
+        # Actions that didn't come from the actions compiler (i.e. assigned by a coordinator)
+        if self._action.compiled is None:
+            self.compile_action(self._action)
+
+    async def run(self) -> None:
+        await super().run()
+        bys, texts, notify_on = self._action.compiled
+        self.__texts = texts
+        self.__notify_on = [self.NotifyOnType[n] for n in notify_on]
+        # What each url's baseline counts - baselines of anything else are stale
+        self.__watched = {url: "%s:%s" % (by.name, text) for url, by, text in zip(self._action.urls, bys, texts)}
+        self.__restore_state()
 
         while not self._shut_down:
-            self.__notify_changes(self._browser.scrape(
-                self._action.urls, self._action.kwargs[self.ACTION_KWARG_WATCH], self._action.kwargs[self.ACTION_KWARG_TEXT]))
-            self._sleep_on_refresh_rate()
+            scrape_results = await self._call_browser(self._browser.scrape, self._action.urls, bys, texts)
+            with METRICS.timer("plugin_eval_seconds", action=self._action.title):
+                self.__notify_changes(scrape_results)
+            await self._sleep_on_refresh_rate()
             if not self._shut_down:
-                self._browser.refresh_sites()
+                await self._call_browser(self._browser.refresh_sites)
 
     def stop(self) -> None:
         return super().stop()
 
+    def __restore_state(self) -> None:
+        for url, baseline in self._state.items(self.STATE_BASELINE).items():
+            if self.__watched.get(url) == baseline["watched"]:
+                self.__element_baseline[url] = baseline["count"]
+            else:
+                self._state.delete(url, self.STATE_BASELINE)
+        for url, notify_time in self._state.items(self.STATE_LAST_NOTIFY).items():
+            if url in self.__element_baseline:
+                self.__last_notify_time[url] = datetime.fromtimestamp(notify_time)
+            else:
+                self._state.delete(url, self.STATE_LAST_NOTIFY)
+        if self.__element_baseline:
+            baseline_str = "\n".join(["URL=[%s], Baseline # of Elements=[%s]" % (
+                k, v) for k, v in self.__element_baseline.items()])
+            logger.info("Resuming tracking changes for action '%s'\n%s", self._action.title, baseline_str)
+
+    def __set_last_notify_time(self, url) -> None:
+        self.__last_notify_time[url] = datetime.now()
+        self._state.set(url, self.STATE_LAST_NOTIFY, self.__last_notify_time[url].timestamp())
+
+    def __reset_last_notify_time(self, url) -> None:
+        del self.__last_notify_time[url]
+        self._state.delete(url, self.STATE_LAST_NOTIFY)
+
     def __notify_changes(self, scrape_results) -> None:
         stats = self.__compile_results(self._action.urls, scrape_results)
-        if not self.__element_baseline:
-            self.__element_baseline = stats
+        # Any change in element counts since the last check counts as page activity
+        if self.__last_stats is not None:
+            self._report_change(stats != self.__last_stats)
+        self.__last_stats = stats
+        # Urls without a (restored) baseline are baselined on their first check
+        new_baseline = {url: stats[url] for url in self._action.urls if url not in self.__element_baseline}
+        if new_baseline:
+            for url, count in new_baseline.items():
+                self.__element_baseline[url] = count
+                self._state.set(url, self.STATE_BASELINE, {"count": count, "watched": self.__watched[url]})
             baseline_str = "\n".join(["URL=[%s], Baseline # of Elements=[%s]" % (
-                k, v) for k, v in self.__element_baseline.items()])
-            logger.info("Tracking changes for action '%s'\n%s" %
-                        (self._action.title, baseline_str))
+                k, v) for k, v in new_baseline.items()])
+            logger.info("Tracking changes for action '%s'\n%s", self._action.title, baseline_str)
 
         for i in range(len(self._action.urls)):
             notification = None
             url = self._action.urls[i]
-            notify_type = self._action.kwargs[self.ACTION_KWARG_NOTIFY_ON][i]
-            text = self._action.kwargs[self.ACTION_KWARG_TEXT][i]
+            notify_type = self.__notify_on[i]
+            text = self.__texts[i]
             netloc = urlparse(url).netloc
 
             notification_duration = (datetime.now(
@@ -83,30 +136,30 @@ class InStockNotifier(Plugin):
                 # On appear, only send the notification once per hour if already sent
                 if stats[url] > self.__element_baseline[url] and (notification_duration >= timedelta(hours=1)
                                                                   or url not in self.__last_notify_time):
-                    self.__last_notify_time[url] = datetime.now()
+                    self.__set_last_notify_time(url)
                     notification = ("ALERT: '%s'" % self._action.title, "'%s' has appeared at %s" % (
                         text, netloc))
                 # On appear, send a notification if we've reported the element appeared in the past but now it's gone
                 elif stats[url] == self.__element_baseline[url] and url in self.__last_notify_time:
                     # Reset the last notify time
-                    del self.__last_notify_time[url]
+                    self.__reset_last_notify_time(url)
                     notification = ("NOTICE: '%s'" % self._action.title, "'%s' no longer appears at %s" % (
                         text, netloc))
             elif notify_type == self.NotifyOnType.DISAPPEAR:
                 if (stats[url] < self.__element_baseline[url] or stats[url] == 0) and \
                         (notification_duration >= timedelta(hours=1) or url not in self.__last_notify_time):
-                    self.__last_notify_time[url] = datetime.now()
+                    self.__set_last_notify_time(url)
                     notification = ("ALERT: '%s'" % self._action.title, "'%s' disappeared at %s" % (
                         text, netloc))
                 # On disappear, send a notification if we've reported the element gone in the past
                 elif stats[url] == self.__element_baseline[url] and stats[url] > 0 and url in self.__last_notify_time:
                     # Reset the last notify time
-                    del self.__last_notify_time[url]
+                    self.__reset_last_notify_time(url)
                     notification = ("NOTICE: '%s'" % self._action.title, "'%s' has reappeared at %s" % (
                         text, netloc))
             if notification:
                 title, msg = notification
-                logger.info("**** %s: %s (%s) ****" % (title, msg, netloc))
+                logger.info("**** %s: %s (%s) ****", title, msg, netloc)
                 self._notifier.notify(title, msg, netloc)
 
     def __compile_results(self, urls, scrape_results) -> dict:
@@ -2,10 +2,12 @@ from json import dumps, load
 from json.decoder import JSONDecodeError
 from os import path
 
-from cmd2 import Cmd, Settable
-
-from pywb.core.logger import DEFAULT_LOG_PATH, set_logger_output_path
+from pywb.core.cluster import DEFAULT_CLUSTER_ADDRESS, parse_address
+from pywb.core.logger import (DEFAULT_BACKUP_COUNT, DEFAULT_LOG_PATH, DEFAULT_MAX_BYTES, LOG_FORMATS, configure_logging,
+                              set_logger_output_path)
+from pywb.core.run_manager import RunEngine
 from pywb.web import BrowserType
+from pywb.web.browser import BLOCK_TYPES, LoadStrategy, block_patterns
 
 
 class Settings(object):
@@ -14,14 +16,50 @@ class Settings(object):
     __PARAM_REMOTE_NOTIFICATIONS = "remote_notifications"
     __PARAM_GEOLOCATION = "geolocation"
     __PARAM_LOG_PATH = "log_path"
+    __PARAM_MAX_BROWSERS = "max_browsers"
+    __PARAM_LOAD_STRATEGY = "load_strategy"
+    __PARAM_LOAD_TIMEOUT = "load_timeout"
+    __PARAM_PARALLEL_REFRESH = "parallel_refresh"
+    __PARAM_FINGERPRINT = "fingerprint"
+    __PARAM_ENGINE = "engine"
+    __PARAM_MAX_CONCURRENCY = "max_concurrency"
+    __PARAM_ADAPTIVE_REFRESH = "adaptive_refresh"
+    __PARAM_MAX_WORKERS = "max_workers"
+    __PARAM_CLUSTER_ADDRESS = "cluster_address"
+    __PARAM_METRICS_PORT = "metrics_port"
+    __PARAM_METRICS_FILE = "metrics_file"
+    __PARAM_RECORD_PATH = "record_path"
+    __PARAM_REPLAY_PATH = "replay_path"
+    __PARAM_LOG_FORMAT = "log_format"
+    __PARAM_LOG_MAX_MB = "log_max_mb"
+    __PARAM_LOG_BACKUPS = "log_backups"
+    __PARAM_LOG_ROTATE_HOURS = "log_rotate_hours"
+    __PARAM_STATE_PATH = "state_path"
+    __PARAM_WATCH_ACTIONS = "watch_actions"
+    __PARAM_BLOCK = "block"
+    __PARAM_BROWSER_MAX_MB = "browser_max_mb"
+    __PARAM_MEMORY_BUDGET_MB = "memory_budget_mb"
+    __PARAM_FREEZE_TABS = "freeze_tabs"
 
     CUSTOM_PARAMS = [__PARAM_BROWSER, __PARAM_REFRESH_RATE,
-                     __PARAM_REMOTE_NOTIFICATIONS, __PARAM_GEOLOCATION, __PARAM_LOG_PATH]
+                     __PARAM_REMOTE_NOTIFICATIONS, __PARAM_GEOLOCATION, __PARAM_LOG_PATH, __PARAM_MAX_BROWSERS,
+                     __PARAM_LOAD_STRATEGY, __PARAM_LOAD_TIMEOUT, __PARAM_PARALLEL_REFRESH, __PARAM_FINGERPRINT,
+                     __PARAM_ENGINE, __PARAM_MAX_CONCURRENCY, __PARAM_ADAPTIVE_REFRESH, __PARAM_MAX_WORKERS,
+                     __PARAM_CLUSTER_ADDRESS, __PARAM_METRICS_PORT, __PARAM_METRICS_FILE, __PARAM_RECORD_PATH,
+                     __PARAM_REPLAY_PATH, __PARAM_LOG_FORMAT, __PARAM_LOG_MAX_MB, __PARAM_LOG_BACKUPS,
+                     __PARAM_LOG_ROTATE_HOURS, __PARAM_STATE_PATH,
+                     __PARAM_WATCH_ACTIONS, __PARAM_BLOCK, __PARAM_BROWSER_MAX_MB, __PARAM_MEMORY_BUDGET_MB,
+                     __PARAM_FREEZE_TABS]
 
     PARAMS_BOT_RESTART_REQUIRED = [
-        __PARAM_BROWSER, __PARAM_REFRESH_RATE, __PARAM_REMOTE_NOTIFICATIONS, __PARAM_GEOLOCATION]
+        __PARAM_BROWSER, __PARAM_REFRESH_RATE, __PARAM_REMOTE_NOTIFICATIONS, __PARAM_GEOLOCATION, __PARAM_MAX_BROWSERS,
+        __PARAM_LOAD_STRATEGY, __PARAM_LOAD_TIMEOUT, __PARAM_PARALLEL_REFRESH, __PARAM_FINGERPRINT,
+        __PARAM_MAX_CONCURRENCY, __PARAM_ADAPTIVE_REFRESH, __PARAM_MAX_WORKERS, __PARAM_CLUSTER_ADDRESS,
+        __PARAM_METRICS_PORT, __PARAM_METRICS_FILE, __PARAM_RECORD_PATH, __PARAM_REPLAY_PATH,
+        __PARAM_STATE_PATH, __PARAM_BLOCK, __PARAM_BROWSER_MAX_MB, __PARAM_MEMORY_BUDGET_MB, __PARAM_FREEZE_TABS]
 
     SAVE_FILE = path.join(path.dirname(__file__), "user_settings.json")
+    DEFAULT_STATE_PATH = path.join(path.dirname(__file__), "plugin_state.db")
 
     def __init__(self) -> None:
         # Internal - Defaults
@@ -33,6 +71,30 @@ class Settings(object):
         self.__log_path = DEFAULT_LOG_PATH
         self.__remote_notifications = False
         self.__geolocation = []
+        self.__max_browsers = 4
+        self.__load_strategy = "Complete"
+        self.__load_timeout = 30
+        self.__parallel_refresh = True
+        self.__fingerprint = False
+        self.__freeze_tabs = False
+        self.__engine = "Thread"
+        self.__max_concurrency = 32
+        self.__adaptive_refresh = False
+        self.__max_workers = 0
+        self.__cluster_address = DEFAULT_CLUSTER_ADDRESS
+        self.__metrics_port = 0
+        self.__metrics_file = ""
+        self.__record_path = ""
+        self.__replay_path = ""
+        self.__log_format = "Text"
+        self.__log_max_mb = DEFAULT_MAX_BYTES // 2 ** 20
+        self.__log_backups = DEFAULT_BACKUP_COUNT
+        self.__log_rotate_hours = 0
+        self.__state_path = self.DEFAULT_STATE_PATH
+        self.__watch_actions = False
+        self.__block = ""
+        self.__browser_max_mb = 0
+        self.__memory_budget_mb = 0
         self.__app_ctx = None
 
     def load(self) -> None:
@@ -42,12 +104,14 @@ class Settings(object):
                 ctx = self
                 # Access the private member version to avoid unnecessary checks/initialization
                 s_name = "_%s__%s" % (self.__class__.__name__, s_name)
-            else:
+            elif self.__app_ctx:
                 ctx = self.__app_ctx
+            else:
+                # Settings of the shell itself - nothing to apply them to without one (i.e. 'pywb serve')
+                continue
             setattr(ctx, s_name, value)
 
     def __load_from_save_file(self) -> dict:
-        assert self.__app_ctx, "App ctx must have a value when loading settings from file"
         saved_settings = {}
         if path.exists(self.SAVE_FILE):
             with open(self.SAVE_FILE, "r") as settings_file:
@@ -67,6 +131,8 @@ class Settings(object):
             settings_file.write(dumps(saved_settings))
 
     def __add_custom_settables(self, app_ctx):
+        from cmd2 import Settable
+
         # Add custom settings
         app_ctx.add_settable(Settable(self.__PARAM_BROWSER, str, "Browser used by pywb (Supported: %s)" % str(
             [i.name.capitalize() for i in BrowserType]), self, onchange_cb=app_ctx.change_setting))
@@ -75,12 +141,84 @@ class Settings(object):
                      self, onchange_cb=app_ctx.change_setting))
         app_ctx.add_settable(Settable(self.__PARAM_LOG_PATH, str, "Path to log file for web bot output",
                                       self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_LOG_FORMAT, str, "Format of the log file (Supported: %s)" % str(
+                [i.capitalize() for i in LOG_FORMATS]), self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_LOG_MAX_MB, int, "Size in MB the log file is rotated at (0: no size limit)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_LOG_BACKUPS, int, "Rotated (compressed) log files kept",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_LOG_ROTATE_HOURS, int, "Hours after which the log file is rotated (0: no time limit)",
+                     self, onchange_cb=app_ctx.change_setting))
         app_ctx.add_settable(
             Settable(self.__PARAM_REMOTE_NOTIFICATIONS, bool, "Receive remote notifcations from pywb",
                      self, onchange_cb=app_ctx.change_setting))
         app_ctx.add_settable(
             Settable(self.__PARAM_GEOLOCATION, str, "Used for emulating location (format: [lat],[long])",
                      self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_MAX_BROWSERS, int, "Max browser sessions shared by all actions",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_BROWSER_MAX_MB, int, "MB a browser's processes may use before it's recycled (0: no limit)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_MEMORY_BUDGET_MB, int, "MB all browsers may use together (0: no limit)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_LOAD_STRATEGY, str, "Page state to wait for on load/refresh (Supported: %s)" % str(
+                [i.name.capitalize() for i in LoadStrategy if i != LoadStrategy.SELECTOR]),
+                self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_LOAD_TIMEOUT, int, "Deadline in seconds to wait on a page load before scraping it",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_PARALLEL_REFRESH, bool, "Reload all windows of an action at once on refresh",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_BLOCK, str, "Requests blocked on refresh, comma separated (types: %s, or url patterns)" % (
+                ", ".join(BLOCK_TYPES)), self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_FINGERPRINT, bool, "Skip scraping pages whose content is unchanged since the last scrape",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_FREEZE_TABS, bool, "Freeze tabs between checks - no scripts run in them while idle",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(Settable(self.__PARAM_ENGINE, str, "Engine running the actions (Supported: %s)" % str(
+            [i.name.capitalize() for i in RunEngine]), self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_MAX_CONCURRENCY, int, "Max browser calls in flight at once (Async engine)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_ADAPTIVE_REFRESH, bool, "Adapt each action's refresh rate to how often its pages change",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_MAX_WORKERS, int, "Worker processes running the actions (Process engine, 0: one per core)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_CLUSTER_ADDRESS, str, "Address the coordinator listens on (Cluster engine, [host]:[port])",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_METRICS_PORT, int, "Local port serving metrics in the prometheus format (0: off)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_METRICS_FILE, str, "File the metrics are written to in the prometheus format (empty: off)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_RECORD_PATH, str, "Directory every loaded/refreshed page is recorded into (empty: off)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_REPLAY_PATH, str, "Directory of recorded pages served by the Replay browser",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_STATE_PATH, str, "Database plugins keep their state in across restarts (empty: off)",
+                     self, onchange_cb=app_ctx.change_setting))
+        app_ctx.add_settable(
+            Settable(self.__PARAM_WATCH_ACTIONS, bool, "Reload the running actions whenever their actions file changes",
+                     self, onchange_cb=app_ctx.change_setting))
 
         # Hacky way to save builtin settings with cmd2
         for param, settable in app_ctx._settables.items():
@@ -88,7 +226,7 @@ class Settings(object):
                 settable.onchange_cb = app_ctx.change_setting
 
     @property
-    def app_ctx(self) -> Cmd:
+    def app_ctx(self):
         return self.__app_ctx
 
     @app_ctx.setter
@@ -114,6 +252,58 @@ class Settings(object):
         set_logger_output_path(new_log_path)
         self.__log_path = new_log_path
 
+    def configure_logging(self) -> None:
+        configure_logging(output_path=self.__log_path, log_format=self.__log_format.lower(),
+                          max_bytes=self.__log_max_mb * 2 ** 20, backup_count=self.__log_backups,
+                          rotate_seconds=self.__log_rotate_hours * 3600)
+
+    @property
+    def log_format(self):
+        return self.__log_format
+
+    @log_format.setter
+    def log_format(self, new_format):
+        if new_format.lower() not in LOG_FORMATS:
+            raise ValueError("Log format '%s' is unsupported" % new_format)
+        self.__log_format = new_format.capitalize()
+        self.configure_logging()
+
+    @property
+    def log_max_mb(self):
+        return self.__log_max_mb
+
+    @log_max_mb.setter
+    def log_max_mb(self, new_max):
+        if new_max < 0:
+            raise ValueError(
+                "Log size limit can't be negative")
+        self.__log_max_mb = new_max
+        self.configure_logging()
+
+    @property
+    def log_backups(self):
+        return self.__log_backups
+
+    @log_backups.setter
+    def log_backups(self, new_backups):
+        if new_backups < 1:
+            raise ValueError(
+                "At least one rotated log file must be kept")
+        self.__log_backups = new_backups
+        self.configure_logging()
+
+    @property
+    def log_rotate_hours(self):
+        return self.__log_rotate_hours
+
+    @log_rotate_hours.setter
+    def log_rotate_hours(self, new_hours):
+        if new_hours < 0:
+            raise ValueError(
+                "Log rotation interval can't be negative")
+        self.__log_rotate_hours = new_hours
+        self.configure_logging()
+
     @property
     def refresh_rate(self):
         return self.__refresh_rate
@@ -125,6 +315,207 @@ class Settings(object):
                 "Refresh rate must be greater than zero")
         self.__refresh_rate = new_rate
 
+    @property
+    def max_browsers(self):
+        return self.__max_browsers
+
+    @max_browsers.setter
+    def max_browsers(self, new_max):
+        if new_max < 1:
+            raise ValueError(
+                "Max browsers must be at least one")
+        self.__max_browsers = new_max
+
+    @property
+    def load_strategy(self):
+        return self.__load_strategy
+
+    @load_strategy.setter
+    def load_strategy(self, new_strategy):
+        try:
+            strategy = LoadStrategy[new_strategy.upper()]
+        except KeyError:
+            strategy = None
+        # Selector strategies need an xpath - only supported per action
+        if strategy in (None, LoadStrategy.SELECTOR):
+            raise ValueError("Load strategy '%s' is unsupported" % new_strategy)
+        self.__load_strategy = new_strategy.capitalize()
+
+    @property
+    def load_timeout(self):
+        return self.__load_timeout
+
+    @load_timeout.setter
+    def load_timeout(self, new_timeout):
+        if new_timeout <= 0:
+            raise ValueError(
+                "Load timeout must be greater than zero")
+        self.__load_timeout = new_timeout
+
+    @property
+    def parallel_refresh(self):
+        return self.__parallel_refresh
+
+    @parallel_refresh.setter
+    def parallel_refresh(self, new_pr):
+        self.__parallel_refresh = new_pr
+
+    @property
+    def fingerprint(self):
+        return self.__fingerprint
+
+    @fingerprint.setter
+    def fingerprint(self, new_fp):
+        self.__fingerprint = new_fp
+
+    @property
+    def freeze_tabs(self):
+        return self.__freeze_tabs
+
+    @freeze_tabs.setter
+    def freeze_tabs(self, freeze):
+        self.__freeze_tabs = freeze
+
+    @property
+    def engine(self):
+        return self.__engine
+
+    @engine.setter
+    def engine(self, new_engine):
+        try:
+            RunEngine[new_engine.upper()]
+        except KeyError:
+            raise ValueError("Engine '%s' is unsupported" % new_engine)
+        self.__engine = new_engine.capitalize()
+
+    @property
+    def max_concurrency(self):
+        return self.__max_concurrency
+
+    @max_concurrency.setter
+    def max_concurrency(self, new_max):
+        if new_max < 1:
+            raise ValueError(
+                "Max concurrency must be at least one")
+        self.__max_concurrency = new_max
+
+    @property
+    def adaptive_refresh(self):
+        return self.__adaptive_refresh
+
+    @adaptive_refresh.setter
+    def adaptive_refresh(self, new_ar):
+        self.__adaptive_refresh = new_ar
+
+    @property
+    def max_workers(self):
+        return self.__max_workers
+
+    @max_workers.setter
+    def max_workers(self, new_max):
+        if new_max < 0:
+            raise ValueError(
+                "Max workers can't be negative")
+        self.__max_workers = new_max
+
+    @property
+    def cluster_address(self):
+        return self.__cluster_address
+
+    @cluster_address.setter
+    def cluster_address(self, new_address):
+        parse_address(new_address)
+        self.__cluster_address = new_address
+
+    @property
+    def metrics_port(self):
+        return self.__metrics_port
+
+    @metrics_port.setter
+    def metrics_port(self, new_port):
+        if not 0 <= new_port <= 65535:
+            raise ValueError(
+                "Metrics port must be between 0 and 65535")
+        self.__metrics_port = new_port
+
+    @property
+    def metrics_file(self):
+        return self.__metrics_file
+
+    @metrics_file.setter
+    def metrics_file(self, new_file):
+        self.__metrics_file = new_file
+
+    @property
+    def record_path(self):
+        return self.__record_path
+
+    @record_path.setter
+    def record_path(self, new_path):
+        self.__record_path = new_path
+
+    @property
+    def replay_path(self):
+        return self.__replay_path
+
+    @replay_path.setter
+    def replay_path(self, new_path):
+        if new_path and not path.isdir(new_path):
+            raise ValueError(
+                "Replay path '%s' is not a directory" % new_path)
+        self.__replay_path = new_path
+
+    @property
+    def state_path(self):
+        return self.__state_path
+
+    @state_path.setter
+    def state_path(self, new_path):
+        if new_path and path.isdir(new_path):
+            raise ValueError(
+                "State path '%s' is a directory" % new_path)
+        self.__state_path = new_path
+
+    @property
+    def watch_actions(self):
+        return self.__watch_actions
+
+    @watch_actions.setter
+    def watch_actions(self, watch):
+        self.__watch_actions = watch
+
+    @property
+    def browser_max_mb(self):
+        return self.__browser_max_mb
+
+    @browser_max_mb.setter
+    def browser_max_mb(self, new_max):
+        if new_max < 0:
+            raise ValueError(
+                "Browser memory limit must be 0 (no limit) or greater")
+        self.__browser_max_mb = new_max
+
+    @property
+    def memory_budget_mb(self):
+        return self.__memory_budget_mb
+
+    @memory_budget_mb.setter
+    def memory_budget_mb(self, new_budget):
+        if new_budget < 0:
+            raise ValueError(
+                "Memory budget must be 0 (no limit) or greater")
+        self.__memory_budget_mb = new_budget
+
+    @property
+    def block(self):
+        return self.__block
+
+    @block.setter
+    def block(self, new_block):
+        # Validated up front - raises on unknown resource types
+        block_patterns(new_block)
+        self.__block = new_block
+
     @property
     def geolocation(self) -> list[float]:
         return self.__geolocation
@@ -166,6 +557,8 @@ class Settings(object):
         self.__browser = new_browser.capitalize()
 
     def __delete_cmd2_builtins(self, app_ctx):
+        from cmd2 import Cmd
+
         delattr(Cmd, "do_alias")
         delattr(Cmd, "do_macro")
 
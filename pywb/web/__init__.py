@@ -1,12 +1,26 @@
 from enum import Enum
-
-from pywb.web.chrome import Chrome
+from importlib import import_module
 
 By = Enum("By",
           {"BUTTON": "//button[contains(text(), '%s')]",
            "LINK": "//a[contains(text(), '%s')]",
            "TEXT": "//*[not(self::a) and not(self::button) and contains(text(),'%s')]"})
 
+# Backends are imported once they're used - Chrome pulls in selenium, Http lxml
 BrowserType = Enum("BrowserType", {
-    "CHROME": Chrome
+    "CHROME": "pywb.web.chrome:Chrome",
+    "HTTP": "pywb.web.http:Http",
+    "REPLAY": "pywb.web.replay:Replay"
 })
+
+
+def load_browser(browser_type) -> type:
+    module_name, class_name = browser_type.value.split(":")
+    return getattr(import_module(module_name), class_name)
+
+
+def __getattr__(name):
+    # i.e. 'from pywb.web import Http' - same classes as before, only imported on first use
+    if name.upper() in BrowserType.__members__ and name == name.capitalize():
+        return load_browser(BrowserType[name.upper()])
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -1,12 +1,171 @@
 from abc import ABC, abstractmethod
+from enum import Enum
+from logging import DEBUG
 from os import environ, mkdir, path
-from time import sleep
+from time import monotonic, sleep
 from urllib.parse import urlparse
 
 from pywb import ENVIRON_DEBUG_KEY
 from pywb.core.logger import logger
 from pywb.web.result import Result
 
+# Spoofing our own user agent
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "\
+    "Chrome/107.0.0.0 Safari/537.36"
+
+LoadStrategy = Enum("LoadStrategy", ["COMPLETE", "INTERACTIVE", "SELECTOR"])
+
+# Resolves as soon as the page reaches the requested state - driven by the page's own load events
+# instead of polling document.readyState. Resolves with the page's load time in ms, or false while
+# the previous document is still showing
+_WAIT_ON_PAGE_SCRIPT = """
+var strategy = arguments[0], selector = arguments[1], done = arguments[arguments.length - 1];
+if (window.__pywbStale || location.href === "about:blank") {
+    done(false);
+    return;
+}
+function ready() {
+    if (strategy === "SELECTOR") {
+        return document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+            .singleNodeValue !== null;
+    }
+    return strategy === "INTERACTIVE" ? document.readyState !== "loading" : document.readyState === "complete";
+}
+function loadTime() {
+    var nav = performance.getEntriesByType("navigation")[0];
+    if (nav && strategy === "COMPLETE" && nav.loadEventEnd) return nav.loadEventEnd;
+    if (nav && strategy === "INTERACTIVE" && nav.domInteractive) return nav.domInteractive;
+    return performance.now();
+}
+if (ready()) {
+    done(loadTime());
+    return;
+}
+var observer = null;
+function check() {
+    if (ready()) {
+        document.removeEventListener("readystatechange", check);
+        if (observer) observer.disconnect();
+        done(loadTime());
+    }
+}
+document.addEventListener("readystatechange", check);
+if (strategy === "SELECTOR") {
+    observer = new MutationObserver(check);
+    observer.observe(document, {childList: true, subtree: true, characterData: true});
+}
+"""
+
+
+# Evaluates a list of xpaths in one go and materializes the matches as [tag, text, {attribute: value}].
+# With fingerprinting, the page (its natively serialized html - text and attributes) is hashed (cyrb53)
+# before any xpath is evaluated, and nothing else is done when the hash matches the one from the last
+# scrape. A mutation observer keeps a document that hasn't changed since that scrape from being hashed again
+_SCRAPE_SCRIPT = """
+var xpaths = arguments[0], attributes = arguments[1], maxText = arguments[2];
+var useFingerprint = arguments[3], lastFingerprint = arguments[4], fingerprint = null;
+if (useFingerprint) {
+    var last = window.__pywbScrape;
+    if (last && !last.dirty && last.fingerprint === lastFingerprint) return [lastFingerprint, null];
+    if (last) last.observer.disconnect();
+    var page = document.documentElement ? document.documentElement.outerHTML : "";
+    var h1 = 0xdeadbeef ^ page.length, h2 = 0x41c6ce57;
+    for (var i = 0, ch; i < page.length; i++) {
+        ch = page.charCodeAt(i);
+        h1 = Math.imul(h1 ^ ch, 2654435761);
+        h2 = Math.imul(h2 ^ ch, 1597334677);
+    }
+    h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+    h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+    fingerprint = (h2 >>> 0).toString(16) + ":" + (h1 >>> 0).toString(16);
+    // Any change to the document from here on - the next scrape hashes it again
+    var state = window.__pywbScrape = {fingerprint: fingerprint, dirty: false};
+    state.observer = new MutationObserver(function () {
+        state.dirty = true;
+        state.observer.disconnect();
+    });
+    state.observer.observe(document, {childList: true, subtree: true, characterData: true, attributes: true});
+    if (fingerprint === lastFingerprint) return [fingerprint, null];
+}
+return [fingerprint, xpaths.map(function (xpath) {
+    var snapshot = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var records = [];
+    for (var i = 0; i < snapshot.snapshotLength; i++) {
+        var node = snapshot.snapshotItem(i), attrs = {};
+        attributes.forEach(function (name) {
+            if (node.hasAttribute && node.hasAttribute(name)) attrs[name] = node.getAttribute(name);
+        });
+        records.push([node.nodeName.toLowerCase(), (node.textContent || "").trim().slice(0, maxText), attrs]);
+    }
+    return records;
+})];
+"""
+
+# DOM of the current window as it is right now - what a snapshot records
+_SNAPSHOT_SCRIPT = "return document.documentElement.outerHTML;"
+
+# Resource types that can be blocked by name - chrome blocks by url, so types are matched on their extension
+# (with or without a query string) and trackers on their domain
+_BLOCK_EXTENSIONS = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+    "media": ("mp4", "webm", "ogg", "mp3", "wav", "m3u8", "m4s"),
+    "stylesheet": ("css",),
+}
+_BLOCK_DOMAINS = {
+    "tracker": ("doubleclick.net", "googlesyndication.com", "googleadservices.com", "google-analytics.com",
+                "googletagmanager.com", "facebook.net", "amazon-adsystem.com", "scorecardresearch.com", "hotjar.com",
+                "criteo.com", "taboola.com", "outbrain.com"),
+}
+BLOCK_TYPES = tuple(_BLOCK_EXTENSIONS) + tuple(_BLOCK_DOMAINS)
+
+
+def block_patterns(block) -> tuple:
+    # Resource types and url patterns ("*" wildcards) to the url patterns blocked in the browser
+    patterns = []
+    if isinstance(block, str):
+        block = block.split(",")
+    for entry in block or []:
+        entry = str(entry).strip()
+        if entry.lower() in _BLOCK_EXTENSIONS:
+            patterns.extend(p % ext for ext in _BLOCK_EXTENSIONS[entry.lower()] for p in ("*.%s", "*.%s?*"))
+        elif entry.lower() in _BLOCK_DOMAINS:
+            patterns.extend("*%s/*" % domain for domain in _BLOCK_DOMAINS[entry.lower()])
+        elif any(c in entry for c in "*./:"):
+            patterns.append(entry)
+        elif entry:
+            raise ValueError("Unable to block '%s' - not a url pattern or a resource type (Supported: %s)" % (
+                entry, str(list(BLOCK_TYPES))))
+    return tuple(dict.fromkeys(patterns))
+
+
+# Attributes captured with every scrape result
+SCRAPE_ATTRIBUTES = ("id", "class", "href", "disabled")
+MAX_RESULT_TEXT = 500
+
+
+class PageLoad(object):
+    DEFAULT_TIMEOUT = 30
+
+    def __init__(self, strategy=LoadStrategy.COMPLETE, selector=None, timeout=DEFAULT_TIMEOUT, parallel=True,
+                 block=None) -> None:
+        if isinstance(strategy, str):
+            try:
+                strategy = LoadStrategy[strategy.upper()]
+            except KeyError:
+                raise ValueError("Load strategy '%s' is unsupported" % strategy)
+        if strategy == LoadStrategy.SELECTOR and not selector:
+            raise ValueError("Load strategy 'selector' requires a selector xpath")
+        if timeout <= 0:
+            raise ValueError("Page load timeout must be greater than zero")
+        self.strategy = strategy
+        self.selector = selector
+        self.timeout = timeout
+        # Reload all windows at once and wait on them together instead of one after another
+        self.parallel = parallel
+        # Url patterns of requests blocked on refresh (images, trackers...) - none of it matters to a scrape
+        self.block = block_patterns(block)
+
 
 class _Browser(ABC):
 
@@ -14,10 +173,45 @@ class _Browser(ABC):
         super().__init__()
         self._driver = None
         self._window_map = {}
+        # Tracked locally to save a driver round trip on every switch
+        self._current_window = None
+        self.page_load = PageLoad()
+        # Seconds each url took to load on its last load/refresh
+        self.load_times = {}
+        # Reuse the last scrape results of pages whose fingerprint hasn't changed
+        self.fingerprint = False
+        self.fingerprint_hits = self.fingerprint_misses = 0
+        self._scrape_cache = {}
+        # Snapshot store every loaded/refreshed page is recorded into (if any)
+        self.snapshots = None
+        # Measure the bytes each page transfers - blocked pages are measured against their last unblocked refresh
+        self.network_stats = False
+        self.transfer_bytes = {}
+        self.bytes_saved = {}
+        self._reference_bytes = {}
+        self._blocked = {}
+        # Freeze tabs between checks - their timers, animations and scripts stop until they're refreshed/scraped
+        self.freeze_idle = False
+        self._frozen = set()
 
     def quit(self):
         if self._driver:
             self._driver.quit()
+        self._driver = None
+        self._window_map = {}
+        self._current_window = None
+        self.load_times = {}
+        self._scrape_cache = {}
+        self.transfer_bytes = {}
+        self.bytes_saved = {}
+        self._reference_bytes = {}
+        self._blocked = {}
+        self._frozen = set()
+
+    @property
+    def driver_pid(self):
+        # Process of the driver (if any) - the browser itself runs as its children
+        return None
 
     @abstractmethod
     def load_driver(self) -> None:
@@ -27,80 +221,258 @@ class _Browser(ABC):
     def emulate_location(self, lat, long) -> None:
         pass
 
-    def load_urls(self, urls) -> None:
+    def load_urls(self, urls, page_load=None) -> None:
         if not self._driver:
             raise RuntimeError(
                 "Unable to load urls - driver has not been loaded!")
 
-        for i in range(len(urls)):
-            url = urls[i]
+        for url in urls:
             # Only need to load the url once
             if url in self._window_map:
                 continue
-            logger.info("Loading '%s'", url)
-            # Load url for the current window
-            if i == 0:
+            logger.info("Loading '%s'", url, extra={"url": url})
+            if not self._window_map:
+                # Load url for the current (blank) window
                 self._driver.get(url)
+                window_handle = self._current_window = self._driver.current_window_handle
             else:
-                self._driver.execute_script(
-                    "window.open('%s', '_blank');" % url)
-            # Make sure the driver window handles are updated before loading another site
-            expected_handles = i + 1
-            while len(self._driver.window_handles) != expected_handles:
-                logger.debug("Waiting for %d window handles from driver..." %
-                             expected_handles)
-                sleep(0.5)
-            self._window_map[url] = self._driver.window_handles[i]
-            self.__wait_on_loading_page()
+                # Windows are opened by a script of the current one - it's frozen again on its next scrape
+                self.__thaw(self._current_window)
+                window_handle = self.__open_window(url)
+            self._window_map[url] = window_handle
+            self.switch_to(window_handle)
+            self.load_times[url] = self.__wait_on_loading_page(page_load or self.page_load)
+            if self.snapshots:
+                self._record(url)
+        if self.network_stats:
+            # First loads aren't measured - their cache is cold
+            self._take_transfer_bytes()
+
+    def __open_window(self, url) -> str:
+        known_handles = set(self._driver.window_handles)
+        self._driver.execute_script("window.open('%s', '_blank');" % url)
+        # Make sure the driver window handles are updated before loading another site
+        new_handles = set(self._driver.window_handles) - known_handles
+        while not new_handles:
+            logger.debug("Waiting for a new window handle from driver...")
+            sleep(0.5)
+            new_handles = set(self._driver.window_handles) - known_handles
+        return new_handles.pop()
+
+    def close_urls(self, urls) -> None:
+        for url in urls:
+            if url not in self._window_map:
+                continue
+            window_handle = self._window_map.pop(url)
+            self.load_times.pop(url, None)
+            self._scrape_cache.pop(url, None)
+            self._blocked.pop(window_handle, None)
+            for measured in (self.transfer_bytes, self.bytes_saved, self._reference_bytes):
+                measured.pop(url, None)
+            logger.info("Closing '%s'", url, extra={"url": url})
+            self.switch_to(window_handle)
+            # Thawed first - a frozen page may not navigate away or close cleanly
+            self.__thaw(window_handle)
+            if self._window_map:
+                self._driver.close()
+                # Closed windows can't be the active window - move to any window still open
+                self._current_window = None
+                self.switch_to(next(iter(self._window_map.values())))
+            else:
+                # Closing the last window ends the driver session - keep it around as a blank window
+                self._driver.get("about:blank")
 
     def switch_to(self, window_handle) -> None:
-        if self._driver.current_window_handle != window_handle:
+        if self._current_window != window_handle:
             self._driver.switch_to.window(window_handle)
+            self._current_window = window_handle
 
-    def refresh_sites(self) -> None:
-        logger.info("Refreshing all windows")
-        for _, window_handle in self._window_map.items():
-            self.switch_to(window_handle)
-            self._driver.refresh()
-            self.__wait_on_loading_page()
-
-    def __wait_on_loading_page(self) -> None:
-        page_state = ""
-        logger.debug("Waiting for {} page to be loaded.".format(
-            self._driver.current_url))
-        while page_state != "complete":
-            page_state = self._driver.execute_script(
-                'return document.readyState;')
-            if page_state != "complete":
-                logger.debug("Page has not loaded yet... Waiting")
-            sleep(1)
+    def refresh_sites(self, urls=None, page_load=None) -> dict:
+        page_load = page_load or self.page_load
+        windows = [(url, window_handle) for url, window_handle in self._window_map.items()
+                   if urls is None or url in urls]
+        logger.info("Refreshing %d window(s)%s", len(windows), " in parallel" if page_load.parallel else "")
+
+        started = monotonic()
+        if page_load.parallel:
+            # Start every reload first - the pages load side by side while we wait on them in turn
+            for url, window_handle in windows:
+                self.switch_to(window_handle)
+                self.__thaw(window_handle)
+                self.__block(url, window_handle, page_load)
+                self.__reload()
+            deadline = monotonic() + page_load.timeout
+            for url, window_handle in windows:
+                self.switch_to(window_handle)
+                self.load_times[url] = self.__wait_on_loading_page(page_load, deadline=deadline)
+        else:
+            for url, window_handle in windows:
+                self.switch_to(window_handle)
+                self.__thaw(window_handle)
+                self.__block(url, window_handle, page_load)
+                self.__reload()
+                self.load_times[url] = self.__wait_on_loading_page(page_load)
+
+        load_times = {url: self.load_times[url] for url, _ in windows}
+        if self.network_stats:
+            self.__measure_transfer(windows)
+        if self.snapshots:
+            for url, window_handle in windows:
+                self.switch_to(window_handle)
+                self._record(url)
+        if logger.isEnabledFor(DEBUG):
+            for url, load_time in load_times.items():
+                logger.debug("Window for '%s' loaded in %s", url,
+                             "%.2fs" % load_time if load_time is not None else "(deadline exceeded)", extra={"url": url})
+        logger.info("Refreshed %d window(s) in %.2fs", len(windows), monotonic() - started)
+        return load_times
+
+    def __block(self, url, window_handle, page_load) -> None:
+        # Windows are shared between actions - each refresh blocks what the refreshing action blocks.
+        # Measured pages are refreshed unblocked once first, it's what the savings are measured against
+        patterns = page_load.block if not self.network_stats or url in self._reference_bytes else ()
+        if self._blocked.get(window_handle, ()) != patterns:
+            logger.debug("Blocking %d url pattern(s) in window for '%s'", len(patterns), url, extra={"url": url})
+            self._block_urls(patterns)
+            self._blocked[window_handle] = patterns
+
+    def __measure_transfer(self, windows) -> None:
+        by_window = self._take_transfer_bytes()
+        for url, window_handle in windows:
+            self.bytes_saved.pop(url, None)
+            if window_handle not in by_window:
+                self.transfer_bytes.pop(url, None)
+                continue
+            self.transfer_bytes[url] = by_window[window_handle]
+            if not self._blocked.get(window_handle):
+                self._reference_bytes[url] = by_window[window_handle]
+            elif url in self._reference_bytes:
+                self.bytes_saved[url] = max(self._reference_bytes[url] - by_window[window_handle], 0)
+
+    def __thaw(self, window_handle) -> None:
+        # Frozen pages don't run scripts - thawed before anything is run in them
+        if window_handle in self._frozen:
+            self._set_frozen(False)
+            self._frozen.discard(window_handle)
+
+    def __freeze(self, window_handle) -> None:
+        if self.freeze_idle and window_handle not in self._frozen:
+            self._set_frozen(True)
+            self._frozen.add(window_handle)
+
+    def _set_frozen(self, frozen) -> None:
+        # Freezes/thaws the current window - backends without live pages have nothing to freeze
+        pass
+
+    def _block_urls(self, patterns) -> None:
+        # Blocks requests of the current window matching the patterns - backends only fetching the document have none
+        pass
+
+    def _take_transfer_bytes(self) -> dict:
+        # Bytes transferred by each window since the last call - only measured by backends that can
+        return {}
+
+    def __reload(self) -> None:
+        # Flag the current document so the wait can't mistake it for the reloaded one
+        self._driver.execute_script("window.__pywbStale = true; location.reload();")
+
+    def __wait_on_loading_page(self, page_load, deadline=None):
+        # Only WebDriver backends wait in the window - the other backends don't need selenium
+        from selenium.common.exceptions import JavascriptException, TimeoutException
+
+        deadline = deadline or (monotonic() + page_load.timeout)
+        logger.debug("Waiting for window '%s' to be loaded (%s)",
+                     self._current_window, page_load.strategy.name)
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                logger.warning("Page load deadline of %ss exceeded for window '%s' - Scraping the page as is",
+                               page_load.timeout, self._current_window)
+                self._driver.execute_script("window.stop();")
+                return None
+            self._driver.set_script_timeout(remaining)
+            try:
+                load_time = self._driver.execute_async_script(
+                    _WAIT_ON_PAGE_SCRIPT, page_load.strategy.name, page_load.selector)
+                if load_time is not False:
+                    break
+                # Navigation hasn't replaced the previous document yet
+                sleep(0.05)
+            except TimeoutException:
+                continue
+            except JavascriptException:
+                # Document was unloaded while waiting - the new document is on its way
+                continue
         logger.debug("Page successfully loaded")
+        return load_time / 1000
+
+    def _record(self, url, document=None) -> None:
+        # Documents are taken from the current window unless the backend already has them
+        if document is None:
+            document = (self._driver.execute_script(_SNAPSHOT_SCRIPT) or "").encode("utf-8")
+        try:
+            self.snapshots.put(url, document, self.load_times.get(url))
+        except OSError as e:
+            logger.warning("Unable to record snapshot of '%s' - %s", url, str(e), extra={"url": url})
 
-    def scrape(self, urls, bys, texts) -> list[Result]:
+    def scrape(self, urls, bys, texts, attributes=SCRAPE_ATTRIBUTES) -> list[Result]:
         if not self._window_map:
             raise RuntimeError("Browser windows are not intialized!")
         elif not texts:
             return []
 
+        if any(url not in self._window_map for url in urls):
+            logger.debug(
+                "Some URLs not found - Loading before scraping data...")
+            self.load_urls(urls)
+
         scrape_results = []
-        for i in range(len(urls)):
-            if urls[i] not in self._window_map:
-                logger.debug(
-                    "Some URLs not found - Loading before scraping data...")
-                self.load_urls(urls)
-            window_handle = self._window_map[urls[i]]
-            xpath = bys[i].value % texts[i]
-            logger.debug("Scraping window['%s']; xpath['%s']" % (
-                window_handle, xpath))
+        # One script evaluates every xpath of a window - a single round trip per window
+        for url, xpaths in self._xpaths_by_url(urls, bys, texts).items():
+            window_handle = self._window_map[url]
+            logger.debug("Scraping window['%s']; xpaths%s", window_handle, xpaths, extra={"url": url})
             self.switch_to(window_handle)
-            elements = self._driver.find_elements("xpath", xpath)
-            for e in elements:
-                if ENVIRON_DEBUG_KEY in environ:
-                    self.__save_element_image(
-                        e.screenshot_as_png, "%s-%s.png" % (urlparse(urls[i]).netloc, window_handle))
-                scrape_results.append(Result(e, urls[i], window_handle, self))
+            self.__thaw(window_handle)
+            cache_key = (tuple(xpaths), tuple(attributes))
+            cached = self._scrape_cache.get(url)
+            last_fingerprint = cached[0] if cached and cached[1] == cache_key else None
+            fingerprint, records = self._driver.execute_script(
+                _SCRAPE_SCRIPT, xpaths, list(attributes), MAX_RESULT_TEXT, self.fingerprint, last_fingerprint)
+            if records is None:
+                scrape_results.extend(self._cached_results(url))
+                # Idle until the next refresh
+                self.__freeze(window_handle)
+                continue
+
+            url_results = []
+            for xpath, xpath_records in zip(xpaths, records):
+                url_results.extend(Result(url, window_handle, xpath, tag, text, attrs)
+                                   for tag, text, attrs in xpath_records)
+            self._cache_results(url, fingerprint, cache_key, url_results)
+            scrape_results.extend(url_results)
+            if ENVIRON_DEBUG_KEY in environ:
+                self.__save_element_image(
+                    self._driver.get_screenshot_as_png(), "%s-%s.png" % (urlparse(url).netloc, window_handle))
+            self.__freeze(window_handle)
         return scrape_results
 
+    def _cached_results(self, url) -> list[Result]:
+        self.fingerprint_hits += 1
+        logger.debug("Fingerprint unchanged for '%s' - Reusing last scrape results", url, extra={"url": url})
+        return self._scrape_cache[url][2]
+
+    def _cache_results(self, url, fingerprint, cache_key, results) -> None:
+        if fingerprint is None:
+            return
+        self.fingerprint_misses += 1
+        self._scrape_cache[url] = (fingerprint, cache_key, results)
+
+    def _xpaths_by_url(self, urls, bys, texts) -> dict:
+        xpaths = {}
+        for i in range(len(urls)):
+            xpaths.setdefault(urls[i], []).append(bys[i].value % texts[i])
+        return xpaths
+
     def __save_element_image(self, img, filename):
         IMAGE_DIR = "pywb_scrape_results"
 
@@ -1,14 +1,25 @@
 
+import json
+from collections import Counter
 from os import environ
 
 from selenium.webdriver import Chrome as SeleniumChrome
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver import ChromeOptions
 
 from pywb import ENVIRON_DEBUG_KEY
-from pywb.web.browser import _Browser
+from pywb.core.logger import logger
+from pywb.web.browser import USER_AGENT, _Browser
 
 
 class Chrome(_Browser):
+    # CPU time a throttled window gets - used for windows the page lifecycle can't freeze
+    THROTTLING_RATE = 100
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.__lifecycle_freezing = True
+
     def load_driver(self) -> None:
         super().load_driver()
 
@@ -17,12 +28,23 @@ class Chrome(_Browser):
         # TODO: Use for taking a screenshot of the windows
         options.add_argument("--window-size=3440x1440")
         options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        # Spoofing our own user agent
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "\
-            "Chrome/107.0.0.0 Safari/537.36"
-        options.add_argument('user-agent={0}'.format(user_agent))
+        # Page loads are waited on by the browser's load strategy - driver calls return immediately
+        options.page_load_strategy = "none"
+        # Background windows are reloaded side by side - don't let chrome deprioritize them
+        options.add_argument("--disable-background-timer-throttling")
+        options.add_argument("--disable-backgrounding-occluded-windows")
+        options.add_argument("--disable-renderer-backgrounding")
+        options.add_argument('user-agent={0}'.format(USER_AGENT))
+        if self.network_stats:
+            # Network events of every window are buffered by the driver - drained after each load/refresh
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
         self._driver = SeleniumChrome(options=options)
 
+    @property
+    def driver_pid(self):
+        return self._driver.service.process.pid if self._driver else None
+
     def emulate_location(self, g_lat, g_long) -> None:
         super().emulate_location(g_lat, g_long)
         self._driver.execute_cdp_cmd(
@@ -38,5 +60,27 @@ class Chrome(_Browser):
             "Emulation.setGeolocationOverride", location_data
         )
 
-    def __init__(self):
-        super().__init__()
+    def _set_frozen(self, frozen) -> None:
+        if self.__lifecycle_freezing:
+            try:
+                self._driver.execute_cdp_cmd("Page.setWebLifecycleState", {"state": "frozen" if frozen else "active"})
+                return
+            except WebDriverException as e:
+                # i.e. visible pages can't be frozen - throttled instead from now on
+                logger.debug("Unable to freeze windows (%s) - throttling them instead", e.msg)
+                self.__lifecycle_freezing = False
+        self._driver.execute_cdp_cmd("Emulation.setCPUThrottlingRate", {"rate": self.THROTTLING_RATE if frozen else 1})
+
+    def _block_urls(self, patterns) -> None:
+        # Applies to the target of the current window only
+        self._driver.execute_cdp_cmd("Network.enable", {})
+        self._driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+
+    def _take_transfer_bytes(self) -> dict:
+        transferred = Counter()
+        for entry in self._driver.get_log("performance"):
+            message = json.loads(entry["message"])
+            if message["message"]["method"] == "Network.loadingFinished":
+                # Window handles are the ids of their targets
+                transferred[message["webview"]] += message["message"]["params"]["encodedDataLength"]
+        return transferred
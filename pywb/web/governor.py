@@ -0,0 +1,103 @@
+from math import inf
+from threading import Event, Thread
+from time import monotonic
+
+import psutil
+
+from pywb.core.logger import logger
+from pywb.core.metrics import METRICS
+
+
+class MemoryGovernor(Thread):
+    """
+    Watches the memory and CPU of every pooled browser's process tree. A browser that grows past
+    its own limit - or the largest one once all of them are past the budget - is recycled, i.e.
+    restarted with the same tabs. Near the budget, no new browser sessions are started.
+    """
+    INTERVAL = 15
+    # Share of the budget (and of the host's memory) from which on memory is considered short
+    NEAR_BUDGET = 0.9
+    # Recycled browsers get time to load their tabs again before they are measured against the limits
+    RECYCLE_COOLDOWN = 60
+
+    def __init__(self, pool, browser_max_bytes=0, budget_bytes=0, interval=None) -> None:
+        super().__init__(name="pywb-governor", daemon=True)
+        self.pool = pool
+        self.browser_max_bytes = browser_max_bytes
+        self.budget_bytes = budget_bytes
+        self.interval = interval or self.INTERVAL
+        # CPU usage is measured between calls on the same process objects
+        self.__processes = {}
+        self.__usage = {}
+        self.__recycled_at = {}
+        self.__stop_event = Event()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(rss for rss, _ in self.__usage.values())
+
+    def near_budget(self) -> bool:
+        if psutil.virtual_memory().percent >= self.NEAR_BUDGET * 100:
+            return True
+        return bool(self.budget_bytes) and self.total_bytes >= self.NEAR_BUDGET * self.budget_bytes
+
+    def run(self) -> None:
+        while not self.__stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # Recycling failed to bring a browser back - its runners report the errors of their own
+                logger.error("Governor check failed - %s", str(e))
+
+    def stop(self) -> None:
+        self.__stop_event.set()
+
+    def check(self) -> None:
+        processes = {}
+        usage = {}
+        for pooled_browser in self.pool.browsers:
+            pid = pooled_browser.browser.driver_pid
+            if pid is not None:
+                usage[pooled_browser.browser_id] = self.__tree_usage(pid, processes)
+        self.__processes = processes
+        self.__usage = usage
+        for browser_id, (rss, cpu) in usage.items():
+            METRICS.set("browser_cpu_percent", cpu, browser=browser_id)
+
+        now = monotonic()
+        candidates = {browser_id: rss for browser_id, (rss, _) in usage.items()
+                      if now - self.__recycled_at.get(browser_id, -inf) >= self.RECYCLE_COOLDOWN}
+        recycle = [browser_id for browser_id, rss in candidates.items()
+                   if self.browser_max_bytes and rss > self.browser_max_bytes]
+        if not recycle and self.budget_bytes and self.total_bytes > self.budget_bytes and candidates:
+            logger.warning("Browsers use %.0f MB - over the memory budget of %.0f MB",
+                           self.total_bytes / 2 ** 20, self.budget_bytes / 2 ** 20)
+            # One at a time - the next check sees what recycling the largest one freed
+            recycle = [max(candidates, key=candidates.get)]
+        for browser_id in recycle:
+            logger.warning("Recycling pooled browser %d - its processes use %.0f MB", browser_id,
+                           candidates[browser_id] / 2 ** 20)
+            self.pool.recycle(browser_id)
+            self.__recycled_at[browser_id] = monotonic()
+            METRICS.inc("browser_recycles_total", browser=browser_id)
+
+    def __tree_usage(self, pid, processes) -> tuple:
+        rss = cpu = 0
+        try:
+            root = psutil.Process(pid)
+            tree = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return rss, cpu
+        # The browser and its renderers are children of the driver
+        for process in tree:
+            cached = self.__processes.get(process.pid)
+            # Compared on pid and creation time - pids of exited processes get reused
+            process = processes[process.pid] = cached if cached == process else process
+            try:
+                with process.oneshot():
+                    rss += process.memory_info().rss
+                    cpu += process.cpu_percent()
+            except psutil.Error:
+                # Renderers come and go with tabs
+                continue
+        return rss, cpu
@@ -0,0 +1,206 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from threading import Lock
+from time import monotonic
+from urllib.parse import urljoin, urlsplit
+
+from lxml import html
+
+from pywb.core.logger import logger
+from pywb.web.browser import MAX_RESULT_TEXT, SCRAPE_ATTRIBUTES, USER_AGENT, _Browser
+from pywb.web.result import Result
+
+
+class _ConnectionPool(object):
+    # Keep-alive connections reused per (scheme, host) - stands in for the driver of a real browser
+    TIMEOUT = 30
+    MAX_REDIRECTS = 5
+
+    def __init__(self) -> None:
+        self.__connections = {}
+        self.__lock = Lock()
+
+    def __acquire(self, scheme, netloc):
+        with self.__lock:
+            idle = self.__connections.setdefault((scheme, netloc), [])
+            if idle:
+                return idle.pop()
+        conn_type = HTTPSConnection if scheme == "https" else HTTPConnection
+        return conn_type(netloc, timeout=self.TIMEOUT)
+
+    def __release(self, scheme, netloc, conn) -> None:
+        with self.__lock:
+            self.__connections.setdefault((scheme, netloc), []).append(conn)
+
+    def get(self, url, timeout=TIMEOUT) -> tuple:
+        for _ in range(self.MAX_REDIRECTS + 1):
+            status, headers, body = self.__request(url, timeout)
+            location = headers.get("location")
+            if status not in (301, 302, 303, 307, 308) or not location:
+                return status, body
+            url = urljoin(url, location)
+            logger.debug("Following redirect to '%s'", url)
+        raise RuntimeError("Too many redirects loading '%s'" % url)
+
+    def __request(self, url, timeout) -> tuple:
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+
+        # A pooled connection may have been closed by the server while idle - retry once on a new one
+        for attempt in range(2):
+            conn = self.__acquire(parts.scheme, parts.netloc)
+            conn.timeout = timeout
+            if conn.sock:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request("GET", target, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (HTTPException, ConnectionError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except OSError:
+                # Timed out mid-response - whatever is left of it would be read by the next request
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self.__release(parts.scheme, parts.netloc, conn)
+            break
+
+        encoding = resp.getheader("content-encoding", "")
+        if encoding in ("gzip", "deflate"):
+            body = zlib.decompress(body, zlib.MAX_WBITS | 32)
+        return resp.status, {k.lower(): v for k, v in resp.getheaders()}, body
+
+    def quit(self) -> None:
+        with self.__lock:
+            for idle in self.__connections.values():
+                for conn in idle:
+                    conn.close()
+            self.__connections = {}
+
+
+class Http(_Browser):
+    """
+    Browser-less backend for static pages - fetches documents over pooled keep-alive
+    connections and evaluates the scrape xpaths with lxml. No javascript is executed.
+    """
+    MAX_PARALLEL_FETCHES = 8
+
+    def __init__(self):
+        super().__init__()
+        self.__documents = {}
+        self.__fingerprints = {}
+
+    def load_driver(self) -> None:
+        super().load_driver()
+        self._driver = _ConnectionPool()
+
+    def emulate_location(self, g_lat, g_long) -> None:
+        super().emulate_location(g_lat, g_long)
+        logger.warning("Geolocation emulation is not supported by the Http browser - Ignoring")
+
+    def quit(self):
+        super().quit()
+        self.__documents = {}
+        self.__fingerprints = {}
+
+    def load_urls(self, urls, page_load=None) -> None:
+        if not self._driver:
+            raise RuntimeError(
+                "Unable to load urls - driver has not been loaded!")
+
+        for url in urls:
+            if url in self._window_map:
+                continue
+            logger.info("Loading '%s'", url, extra={"url": url})
+            self.__fetch(url, page_load or self.page_load)
+            # Urls double as window handles - there are no windows to switch between. Only mapped
+            # once fetched, so every mapped url has a document
+            self._window_map[url] = url
+
+    def close_urls(self, urls) -> None:
+        for url in urls:
+            if url in self._window_map:
+                logger.info("Closing '%s'", url, extra={"url": url})
+                del self._window_map[url]
+                self.__documents.pop(url, None)
+                self.__fingerprints.pop(url, None)
+                self.load_times.pop(url, None)
+                self._scrape_cache.pop(url, None)
+
+    def switch_to(self, window_handle) -> None:
+        pass
+
+    def refresh_sites(self, urls=None, page_load=None) -> dict:
+        page_load = page_load or self.page_load
+        refresh_urls = [url for url in self._window_map if urls is None or url in urls]
+        logger.info("Refreshing %d window(s)%s", len(refresh_urls), " in parallel" if page_load.parallel else "")
+
+        if page_load.parallel and len(refresh_urls) > 1:
+            # Connections are pooled per host - concurrent fetches to the same host open extra connections
+            with ThreadPoolExecutor(max_workers=min(len(refresh_urls), self.MAX_PARALLEL_FETCHES)) as executor:
+                list(executor.map(lambda url: self.__fetch(url, page_load), refresh_urls))
+        else:
+            for url in refresh_urls:
+                self.__fetch(url, page_load)
+        return {url: self.load_times[url] for url in refresh_urls}
+
+    def __fetch(self, url, page_load) -> None:
+        # Documents are complete once fetched - only the deadline of the load strategy applies
+        started = monotonic()
+        status, body = self._driver.get(url, timeout=page_load.timeout)
+        if status >= 400:
+            logger.warning("Received status %d loading '%s'", status, url, extra={"url": url})
+        logger.debug("Fetched %d bytes from '%s'", len(body), url, extra={"url": url})
+        self.load_times[url] = monotonic() - started
+        if self.snapshots:
+            self._record(url, body)
+        fingerprint = blake2b(body, digest_size=16).digest() if self.fingerprint else None
+        # An unchanged response keeps its parsed document - no need to parse it again
+        if fingerprint is None or fingerprint != self.__fingerprints.get(url) or url not in self.__documents:
+            self.__documents[url] = self._parse(body)
+        self.__fingerprints[url] = fingerprint
+
+    def _parse(self, document):
+        return html.document_fromstring(document) if document.strip() else None
+
+    def scrape(self, urls, bys, texts, attributes=SCRAPE_ATTRIBUTES) -> list[Result]:
+        if not self._window_map:
+            raise RuntimeError("Browser windows are not intialized!")
+        elif not texts:
+            return []
+
+        if any(url not in self._window_map for url in urls):
+            logger.debug(
+                "Some URLs not found - Loading before scraping data...")
+            self.load_urls(urls)
+
+        scrape_results = []
+        for url, xpaths in self._xpaths_by_url(urls, bys, texts).items():
+            cache_key = (tuple(xpaths), tuple(attributes))
+            cached = self._scrape_cache.get(url)
+            fingerprint = self.__fingerprints.get(url)
+            if fingerprint is not None and cached and cached[0] == fingerprint and cached[1] == cache_key:
+                scrape_results.extend(self._cached_results(url))
+                continue
+
+            document = self.__documents[url]
+            url_results = []
+            logger.debug("Scraping document['%s']; xpaths%s", url, xpaths, extra={"url": url})
+            for xpath in (xpaths if document is not None else []):
+                url_results.extend(Result(url, url, xpath, e.tag, e.text_content().strip()[:MAX_RESULT_TEXT],
+                                          {a: e.get(a) for a in attributes if e.get(a) is not None})
+                                   for e in document.xpath(xpath))
+            self._cache_results(url, fingerprint, cache_key, url_results)
+            scrape_results.extend(url_results)
+        return scrape_results
@@ -0,0 +1,303 @@
+from collections import Counter, deque
+from threading import Lock
+
+import psutil
+
+from pywb.core.logger import logger
+from pywb.core.metrics import METRICS
+
+
+class _FairLock(object):
+    # Threading locks make no ordering guarantees - waiters are served in arrival order here
+    # so a busy runner can't starve the other runners sharing the same browser
+    def __init__(self) -> None:
+        self.__mutex = Lock()
+        self.__waiters = deque()
+        self.__locked = False
+
+    def acquire(self) -> None:
+        with self.__mutex:
+            if not self.__locked:
+                self.__locked = True
+                return
+            waiter = Lock()
+            waiter.acquire()
+            self.__waiters.append(waiter)
+        # Released by the owner handing the lock over to us
+        waiter.acquire()
+
+    def release(self) -> None:
+        with self.__mutex:
+            if self.__waiters:
+                # Hand over directly to the longest waiting thread - the lock stays held
+                self.__waiters.popleft().release()
+            else:
+                self.__locked = False
+
+    @property
+    def n_waiting(self) -> int:
+        return len(self.__waiters)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.release()
+
+
+class _PooledBrowser(object):
+    def __init__(self, browser_id, browser, fingerprint=False, snapshots=None, network_stats=False,
+                 freeze_tabs=False) -> None:
+        self.browser_id = browser_id
+        self.browser = browser()
+        self.browser.fingerprint = fingerprint
+        self.browser.freeze_idle = freeze_tabs
+        self.browser.snapshots = snapshots
+        self.browser.network_stats = network_stats
+        self.lock = _FairLock()
+        self.leases = set()
+        self.url_refs = Counter()
+        self.recycles = 0
+        self.__geolocation = None
+
+    @property
+    def driver_loaded(self) -> bool:
+        return self.browser._driver is not None
+
+    def load_driver(self) -> None:
+        with self.lock:
+            if not self.driver_loaded:
+                logger.info("Loading driver for pooled browser %d", self.browser_id)
+                self.browser.load_driver()
+                self.__geolocation = None
+
+    def emulate_location(self, g_lat, g_long) -> None:
+        with self.lock:
+            # Every runner shares the same geolocation setting - only needs to be applied once per driver
+            if self.__geolocation != (g_lat, g_long):
+                self.browser.emulate_location(g_lat, g_long)
+                self.__geolocation = (g_lat, g_long)
+
+    def quit(self) -> None:
+        with self.lock:
+            self.quit_unlocked()
+
+    def recycle(self) -> None:
+        # Restarts the session with the same tabs - leases (and the plugins holding them) are unaffected
+        with self.lock:
+            if not self.driver_loaded:
+                return
+            urls = list(self.browser._window_map)
+            geolocation = self.__geolocation
+            logger.info("Recycling pooled browser %d with %d tab(s)", self.browser_id, len(urls))
+            self.browser.quit()
+            self.__geolocation = None
+            self.browser.load_driver()
+            if geolocation:
+                self.browser.emulate_location(*geolocation)
+                self.__geolocation = geolocation
+            self.browser.load_urls(urls)
+            self.recycles += 1
+
+    def quit_unlocked(self) -> None:
+        if self.driver_loaded:
+            logger.info("Quitting pooled browser %d", self.browser_id)
+        self.browser.quit()
+        self.url_refs.clear()
+        self.__geolocation = None
+
+
+class BrowserLease(object):
+    """
+    A runner's handle on a pooled browser. Exposes the same interface plugins use on a
+    browser, scoped to the urls the runner loaded and serialized with the other runners
+    sharing the browser.
+    """
+
+    def __init__(self, pool, pooled_browser, page_load=None, label=None) -> None:
+        self.__pool = pool
+        self.__pooled_browser = pooled_browser
+        self.page_load = page_load
+        # Metrics of the lease are recorded under the label (i.e. the action title)
+        self.label = label
+        self.urls = []
+
+    @property
+    def browser_id(self) -> int:
+        return self.__pooled_browser.browser_id
+
+    def load_driver(self) -> None:
+        self.__pooled_browser.load_driver()
+
+    def emulate_location(self, g_lat, g_long) -> None:
+        self.__pooled_browser.emulate_location(g_lat, g_long)
+
+    def __timed(self, metric, func, *args, **kwargs):
+        try:
+            with METRICS.timer(metric, action=self.label):
+                return func(*args, **kwargs)
+        except Exception:
+            METRICS.inc("driver_errors_total", action=self.label)
+            raise
+
+    def load_urls(self, urls) -> None:
+        with self.__pooled_browser.lock:
+            new_urls = [url for url in urls if url not in self.urls]
+            self.__pooled_browser.url_refs.update(new_urls)
+            self.urls.extend(new_urls)
+            self.__timed("load_seconds", self.__pooled_browser.browser.load_urls, urls, self.page_load)
+
+    def refresh_sites(self) -> dict:
+        browser = self.__pooled_browser.browser
+        with self.__pooled_browser.lock:
+            load_times = self.__timed("refresh_seconds", browser.refresh_sites, self.urls, self.page_load)
+            transfer_bytes = [browser.transfer_bytes[url] for url in load_times if url in browser.transfer_bytes]
+            bytes_saved = [browser.bytes_saved[url] for url in load_times if url in browser.bytes_saved]
+        if transfer_bytes:
+            METRICS.set("page_transfer_bytes", sum(transfer_bytes), action=self.label)
+        if bytes_saved:
+            # Per cycle - compared to what the blocked pages transferred on their last unblocked refresh
+            METRICS.set("block_saved_bytes", sum(bytes_saved), action=self.label)
+            METRICS.inc("block_saved_bytes_total", sum(bytes_saved), action=self.label)
+        for url, load_time in load_times.items():
+            if load_time is None:
+                METRICS.inc("page_load_timeouts_total", action=self.label, url=url)
+            else:
+                METRICS.observe("page_load_seconds", load_time, action=self.label, url=url)
+        return load_times
+
+    def scrape(self, urls, bys, texts, **kwargs) -> list:
+        with self.__pooled_browser.lock:
+            missing_urls = [url for url in urls if url not in self.urls]
+            if missing_urls:
+                self.__pooled_browser.url_refs.update(missing_urls)
+                self.urls.extend(missing_urls)
+            return self.__timed("scrape_seconds", self.__pooled_browser.browser.scrape, urls, bys, texts, **kwargs)
+
+    def switch_to(self, window_handle) -> None:
+        with self.__pooled_browser.lock:
+            self.__pooled_browser.browser.switch_to(window_handle)
+
+    def quit(self) -> None:
+        self.__pool.release(self)
+
+
+class BrowserPool(object):
+    """
+    Bounded set of browser sessions shared by all runners. Each session hosts the tabs of
+    many actions - runners lease a session instead of starting their own driver.
+    """
+
+    def __init__(self, browser, max_browsers=1, fingerprint=False, snapshots=None, network_stats=False,
+                 freeze_tabs=False) -> None:
+        if max_browsers < 1:
+            raise ValueError("Browser pool requires at least one browser")
+        self.max_browsers = max_browsers
+        self.fingerprint = fingerprint
+        # Tabs are frozen between checks
+        self.freeze_tabs = freeze_tabs
+        # Snapshot store shared by every session - recorded into, or replayed from by the replay browser
+        self.snapshots = snapshots
+        # Sessions measure the bytes their pages transfer - only needed to report what blocking saves
+        self.network_stats = network_stats
+        # Memory governor of the pool (if any) - no new sessions are started while memory is short
+        self.governor = None
+        self.__browser = browser
+        self.__browsers = []
+        self.__lock = Lock()
+        METRICS.register_collector(self.__collect_metrics)
+
+    def lease(self, page_load=None, label=None) -> BrowserLease:
+        with self.__lock:
+            pooled_browser = min(self.__browsers, key=lambda b: len(b.leases), default=None)
+            # Only start another session when every existing one is already in use (and memory allows it)
+            if len(self.__browsers) < self.max_browsers and (not pooled_browser or pooled_browser.leases
+                                                             and not self.__memory_short()):
+                pooled_browser = _PooledBrowser(len(self.__browsers), self.__browser, self.fingerprint,
+                                                self.snapshots, self.network_stats, self.freeze_tabs)
+                self.__browsers.append(pooled_browser)
+            lease = BrowserLease(self, pooled_browser, page_load, label)
+            pooled_browser.leases.add(lease)
+        logger.debug("Leased pooled browser %d", lease.browser_id)
+        return lease
+
+    def __memory_short(self) -> bool:
+        if self.governor and self.governor.near_budget():
+            logger.warning("Memory is short - sharing an open browser session instead of starting another")
+            return True
+        return False
+
+    @property
+    def browsers(self) -> list:
+        with self.__lock:
+            return list(self.__browsers)
+
+    def recycle(self, browser_id) -> None:
+        self.browsers[browser_id].recycle()
+
+    def release(self, lease) -> None:
+        with self.__lock:
+            pooled_browser = next((b for b in self.__browsers if lease in b.leases), None)
+            if not pooled_browser:
+                # Pool has already been closed
+                return
+            pooled_browser.leases.discard(lease)
+        logger.debug("Released lease on pooled browser %d", pooled_browser.browser_id)
+
+        with pooled_browser.lock:
+            # Re-check under the browser lock - another runner may have leased it in the meantime
+            with self.__lock:
+                last_lease = not pooled_browser.leases
+            if last_lease:
+                pooled_browser.quit_unlocked()
+                return
+
+            pooled_browser.url_refs.subtract(lease.urls)
+            unused_urls = [url for url in lease.urls if pooled_browser.url_refs[url] <= 0]
+            for url in unused_urls:
+                del pooled_browser.url_refs[url]
+            if pooled_browser.driver_loaded:
+                pooled_browser.browser.close_urls(unused_urls)
+
+    def close(self) -> None:
+        METRICS.unregister_collector(self.__collect_metrics)
+        with self.__lock:
+            browsers = list(self.__browsers)
+            for pooled_browser in browsers:
+                pooled_browser.leases.clear()
+        for pooled_browser in browsers:
+            pooled_browser.quit()
+
+    def __collect_metrics(self, metrics) -> None:
+        with self.__lock:
+            browsers = list(self.__browsers)
+        for b in browsers:
+            metrics.set("browser_tabs", len(b.browser._window_map), browser=b.browser_id)
+            if self.freeze_tabs:
+                metrics.set("browser_frozen_tabs", len(b.browser._frozen), browser=b.browser_id)
+            pid = b.browser.driver_pid
+            if pid is None:
+                continue
+            # The driver's whole process tree - the browser and its renderers are children of the driver
+            try:
+                process = psutil.Process(pid)
+                rss = sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+            except psutil.Error:
+                continue
+            metrics.set("browser_rss_bytes", rss, browser=b.browser_id)
+
+    def generate_status_table(self) -> str:
+        from cmd2.table_creator import Column, SimpleTable
+
+        columns = [Column("Browser ID", width=15), Column("Leases", width=10),
+                   Column("Tabs", width=10), Column("Waiting", width=10), Column("Driver", width=10),
+                   Column("Recycles", width=10), Column("Fingerprint Hits/Misses", width=25)]
+        with self.__lock:
+            browser_data = [[b.browser_id, len(b.leases), len(b.browser._window_map), b.lock.n_waiting,
+                             "LOADED" if b.driver_loaded else "-", b.recycles,
+                             "%d/%d" % (b.browser.fingerprint_hits, b.browser.fingerprint_misses)
+                             if self.fingerprint else "OFF"] for b in self.__browsers]
+        n_in_use = len([b for b in browser_data if b[1] > 0])
+        return "%s\n\nBROWSERS IN USE: (%s/%s)" % (
+            SimpleTable(columns).generate_table(browser_data), n_in_use, self.max_browsers)
@@ -0,0 +1,166 @@
+import json
+import zlib
+from collections import OrderedDict
+from hashlib import blake2b
+from os import getpid, makedirs, path, replace
+from threading import Lock
+from time import time
+
+from pywb.core.logger import logger
+from pywb.web.browser import PageLoad
+from pywb.web.http import Http
+
+
+class SnapshotStore(object):
+    """
+    On-disk store of page snapshots. Documents are compressed and stored once per content hash -
+    an index appended to on every snapshot keeps each url's timeline of (hash, load time).
+    """
+    INDEX_FILE = "index.jsonl"
+    OBJECTS_DIR = "objects"
+    # Decompressed documents kept in memory - the least recently replayed are dropped first
+    MAX_CACHED_DOCUMENTS = 128
+
+    def __init__(self, store_path) -> None:
+        self.store_path = store_path
+        self.__index_path = path.join(store_path, self.INDEX_FILE)
+        self.__lock = Lock()
+        self.__documents = OrderedDict()
+        self.__timelines = None
+        makedirs(path.join(store_path, self.OBJECTS_DIR), exist_ok=True)
+
+    def __object_path(self, digest) -> str:
+        return path.join(self.store_path, self.OBJECTS_DIR, digest[:2], digest)
+
+    def put(self, url, document, load_time) -> str:
+        digest = blake2b(document, digest_size=16).hexdigest()
+        object_path = self.__object_path(digest)
+        with self.__lock:
+            # Unchanged pages only add a line to the index
+            if not path.exists(object_path):
+                makedirs(path.dirname(object_path), exist_ok=True)
+                # Written aside and moved in place - processes recording into the same store never see a partial file
+                tmp_path = "%s.%d.tmp" % (object_path, getpid())
+                with open(tmp_path, "wb") as f:
+                    f.write(zlib.compress(document))
+                replace(tmp_path, object_path)
+            with open(self.__index_path, "a") as f:
+                f.write(json.dumps({"url": url, "hash": digest, "load_time": load_time, "at": time()}) + "\n")
+            if self.__timelines is not None:
+                self.__timelines.setdefault(url, []).append((digest, load_time))
+        return digest
+
+    def get(self, digest) -> bytes:
+        with self.__lock:
+            document = self.__documents.get(digest)
+            if document is None:
+                with open(self.__object_path(digest), "rb") as f:
+                    document = self.__documents[digest] = zlib.decompress(f.read())
+                if len(self.__documents) > self.MAX_CACHED_DOCUMENTS:
+                    self.__documents.popitem(last=False)
+            else:
+                self.__documents.move_to_end(digest)
+        return document
+
+    def timeline(self, url) -> list:
+        with self.__lock:
+            if self.__timelines is None:
+                self.__timelines = self.__read_index()
+            return self.__timelines.get(url, [])
+
+    def __read_index(self) -> dict:
+        timelines = {}
+        if not path.exists(self.__index_path):
+            return timelines
+        entries = []
+        with open(self.__index_path, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A recording cut short leaves a partial last line behind
+                    continue
+        # Processes recording at once append out of order - timelines follow the time of the snapshot
+        for entry in sorted(entries, key=lambda e: e["at"]):
+            timelines.setdefault(entry["url"], []).append((entry["hash"], entry["load_time"]))
+        return timelines
+
+
+class _ReplayDriver(object):
+    # Stands in for the connection pool of the http browser - serves each url's snapshots in recorded order
+    def __init__(self, store) -> None:
+        self.__store = store
+        self.__cursors = {}
+        self.load_times = {}
+
+    def get(self, url, timeout=None) -> tuple:
+        timeline = self.__store.timeline(url)
+        if not timeline:
+            logger.warning("No snapshots of '%s' in '%s'", url, self.__store.store_path)
+            self.load_times[url] = 0
+            return 404, b""
+        # Every load/refresh moves on to the next snapshot - starting over once the recording ran out
+        cursor = self.__cursors.get(url, -1) + 1
+        self.__cursors[url] = cursor
+        digest, self.load_times[url] = timeline[cursor % len(timeline)]
+        return 200, self.__store.get(digest)
+
+    def quit(self) -> None:
+        self.__cursors = {}
+
+
+class Replay(Http):
+    """
+    Serves pages recorded into a snapshot store instead of loading them - each load/refresh of
+    a url replays its next snapshot with the recorded load time. No network and no browser, so
+    plugins can be run offline against the same pages as often as needed.
+    """
+    # Parsed documents kept for reuse - the least recently replayed are dropped first
+    MAX_PARSED_DOCUMENTS = 64
+
+    def __init__(self):
+        super().__init__()
+        # Parsed once per distinct document - snapshots repeat across urls and refreshes
+        self.__parsed = OrderedDict()
+
+    def load_driver(self) -> None:
+        if not self.snapshots:
+            raise RuntimeError("Unable to replay - no snapshot store was given (set 'replay_path')")
+        self._driver = _ReplayDriver(self.snapshots)
+
+    def emulate_location(self, g_lat, g_long) -> None:
+        pass
+
+    def quit(self):
+        super().quit()
+        self.__parsed = OrderedDict()
+
+    def load_urls(self, urls, page_load=None) -> None:
+        super().load_urls(urls, page_load)
+        self.__replay_load_times(urls)
+
+    def refresh_sites(self, urls=None, page_load=None) -> dict:
+        page_load = page_load or self.page_load
+        # Snapshots are in memory - fetching them in parallel would only add overhead
+        load_times = super().refresh_sites(urls, PageLoad(strategy=page_load.strategy, selector=page_load.selector,
+                                                          timeout=page_load.timeout, parallel=False))
+        self.__replay_load_times(load_times)
+        return {url: self.load_times[url] for url in load_times}
+
+    def __replay_load_times(self, urls) -> None:
+        for url in urls:
+            if url in self._driver.load_times:
+                self.load_times[url] = self._driver.load_times[url]
+
+    def _parse(self, document):
+        if document in self.__parsed:
+            self.__parsed.move_to_end(document)
+            return self.__parsed[document]
+        parsed = self.__parsed[document] = super()._parse(document)
+        if len(self.__parsed) > self.MAX_PARSED_DOCUMENTS:
+            self.__parsed.popitem(last=False)
+        return parsed
+
+    def _record(self, url, document=None) -> None:
+        # Snapshots are what's being replayed - nothing to record
+        pass
@@ -1,14 +1,16 @@
 
 
 class Result(object):
-    def __init__(self, element, url, window_handle, browser):
+    # Snapshot of a scraped element - materialized when scraped so reading it never touches the driver
+    __slots__ = ("url", "window_handle", "xpath", "tag", "text", "attributes")
+
+    def __init__(self, url, window_handle, xpath, tag=None, text="", attributes=None):
         self.url = url
         self.window_handle = window_handle
-        self.__browser = browser
-        self.__element = element
-
-    @property
-    def element(self):
-        # Selenium throws a stale reference if not on the active window - switch to the window before returning the element
-        self.__browser.switch_to(self.window_handle)
-        return self.__element
+        self.xpath = xpath
+        self.tag = tag
+        self.text = text
+        self.attributes = attributes or {}
+
+    def __repr__(self) -> str:
+        return "Result(url='%s', tag='%s', text='%s')" % (self.url, self.tag, self.text)
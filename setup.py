@@ -14,5 +14,5 @@ setuptools.setup(
     install_requires=reqs,
     include_package_data=True,
     python_requires=">=3.9.0",
-    entry_points={"console_scripts": ["pywb = pywb.app:run"]}
+    entry_points={"console_scripts": ["pywb = pywb.cli:run"]}
 )
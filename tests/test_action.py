@@ -0,0 +1,62 @@
+import pytest
+
+from pywb.core.action import compile_actions
+from pywb.core.plugin_manager import PluginManager
+
+ACTION = """
+product:
+  - plugin: InStockNotifier
+    urls: ["http://localhost/product"]
+    watch: [Button]
+    text: [Sold Out]
+    notify_on: [Disappear]
+%s
+"""
+
+
+@pytest.fixture(scope="module")
+def plugins():
+    plugin_manager = PluginManager()
+    plugin_manager.load_builtin_plugins()
+    return plugin_manager.loaded_plugins
+
+
+def _compile(tmp_path, plugins, options):
+    actions_path = tmp_path / "actions.yml"
+    actions_path.write_text(ACTION % "\n".join("    %s" % option for option in options))
+    return compile_actions(str(actions_path), plugins, cache_dir=str(tmp_path / "plans"))
+
+
+def test_options_are_converted(tmp_path, plugins):
+    actions = _compile(tmp_path, plugins, ["refresh_rate: '5'", "jitter: 0.5", "priority: 2.0", "load_timeout: 10",
+                                           "adaptive_refresh: true", "min_refresh_rate: 1", "max_refresh_rate: 60",
+                                           "load_strategy: interactive", "block: [image, '*/ads/*']"])
+    assert actions[0].options == {"refresh_rate": 5, "jitter": 0.5, "priority": 2, "load_timeout": 10,
+                                  "adaptive_refresh": True, "min_refresh_rate": 1, "max_refresh_rate": 60,
+                                  "load_strategy": "interactive", "block": ["image", "*/ads/*"]}
+
+
+@pytest.mark.parametrize("option", [
+    "priority: high",
+    "priority: 1.5",
+    "refresh_rate: fast",
+    "refresh_rate: -1",
+    "refresh_rate: true",
+    "jitter: [5]",
+    "load_timeout: 0",
+    "load_timeout: ten",
+    "min_refresh_rate: 0",
+    "parallel_refresh: 'yes'",
+    "load_strategy: eventually",
+    "load_strategy: 5",
+    "load_strategy: selector",
+    "block: [images]",
+])
+def test_invalid_options_are_rejected(tmp_path, plugins, option):
+    with pytest.raises(ValueError, match="action 'product'"):
+        _compile(tmp_path, plugins, [option])
+
+
+def test_adaptive_bounds_are_ordered(tmp_path, plugins):
+    with pytest.raises(ValueError, match="min_refresh_rate"):
+        _compile(tmp_path, plugins, ["min_refresh_rate: 60", "max_refresh_rate: 10"])
@@ -0,0 +1,46 @@
+import pytest
+
+from pywb.core.scheduler import AdaptiveInterval
+
+
+def test_interval_starts_within_bounds():
+    assert AdaptiveInterval(100, 5, 60).interval == 60
+    assert AdaptiveInterval(1, 5, 60).interval == 5
+
+
+@pytest.mark.parametrize("min_interval, max_interval", [(0, 10), (10, 5)])
+def test_invalid_bounds(min_interval, max_interval):
+    with pytest.raises(ValueError):
+        AdaptiveInterval(10, min_interval, max_interval)
+
+
+def test_first_change_shrinks():
+    interval = AdaptiveInterval(40, 1, 100)
+    assert interval.record(True, now=0) == 40 / AdaptiveInterval.SHRINK
+
+
+def test_quiet_page_backs_off_to_max():
+    interval = AdaptiveInterval(10, 1, 30)
+    assert interval.record(False, now=0) == 10 * AdaptiveInterval.BACKOFF
+    for now in range(1, 10):
+        interval.record(False, now=now)
+    assert interval.interval == 30
+
+
+def test_follows_change_rate():
+    interval = AdaptiveInterval(10, 1, 100)
+    for now in (0, 20, 40, 60):
+        interval.record(True, now=now)
+    # Changes every 20s - polled at twice that rate
+    assert interval.mean_gap == 20
+    assert interval.interval == 10
+    # Not backed off while the page is within its usual gap
+    assert interval.record(False, now=70) == 10
+    # Backed off once it's quiet for longer than usual
+    assert interval.record(False, now=110) == 15
+
+
+def test_shrinks_to_min():
+    interval = AdaptiveInterval(10, 2, 100)
+    interval.record(True, now=0)
+    assert interval.record(True, now=1) == 2
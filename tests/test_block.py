@@ -0,0 +1,25 @@
+import pytest
+
+from pywb.web.browser import PageLoad, block_patterns
+
+
+def test_resource_types_to_patterns():
+    patterns = block_patterns(["image", "Tracker"])
+    assert "*.png" in patterns and "*.png?*" in patterns
+    assert "*doubleclick.net/*" in patterns
+
+
+def test_url_patterns_and_comma_separated():
+    assert block_patterns("*/ads/*, font,*/ads/*") == ("*/ads/*",) + block_patterns("font")
+
+
+def test_nothing_blocked():
+    assert block_patterns(None) == ()
+    assert block_patterns("") == ()
+
+
+def test_unknown_resource_type():
+    with pytest.raises(ValueError, match="Unable to block 'images'"):
+        block_patterns(["images"])
+    with pytest.raises(ValueError):
+        PageLoad(block="video")
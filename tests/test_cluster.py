@@ -0,0 +1,114 @@
+import socket
+from threading import Thread
+from time import monotonic, sleep
+
+from pywb.core.action import Action
+from pywb.core.cluster import _MSG_HELLO, Coordinator, HashRing, _action_key, _Channel, _keyed_actions, parse_address
+from pywb.core.runner import RunConfig
+
+TIMEOUT = 5
+KEYS = ["action-%d" % i for i in range(500)]
+
+
+def _placement(ring) -> dict:
+    return {key: ring.node_for(key) for key in KEYS}
+
+
+def test_empty_ring_has_no_node():
+    assert HashRing().node_for("action") is None
+
+
+def test_placement_is_stable():
+    assert _placement(HashRing(["a", "b", "c"])) == _placement(HashRing(["c", "a", "b"]))
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    ring = HashRing(["a", "b", "c"])
+    before = _placement(ring)
+    ring.add("d")
+    after = _placement(ring)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved
+    assert all(after[key] == "d" for key in moved)
+    # Roughly its share of the keys - not a reshuffle
+    assert len(moved) < len(KEYS) / 2
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(["a", "b", "c"])
+    before = _placement(ring)
+    ring.remove("b")
+    after = _placement(ring)
+    for key in KEYS:
+        if before[key] != "b":
+            assert after[key] == before[key]
+        else:
+            assert after[key] in ("a", "c")
+
+
+def test_action_key_covers_options_and_kwargs():
+    action = Action("title", "Plugin", ["http://localhost/"], options={"refresh_rate": 5}, watch=["Button"])
+    assert _action_key(action) != _action_key(
+        Action("title", "Plugin", ["http://localhost/"], options={"refresh_rate": 10}, watch=["Button"]))
+    assert _action_key(action) != _action_key(
+        Action("title", "Plugin", ["http://localhost/"], options={"refresh_rate": 5}, watch=["Div"]))
+
+
+def test_repeated_actions_are_all_kept():
+    action = Action("title", "Plugin", ["http://localhost/"])
+    keyed = _keyed_actions([action, Action("title", "Plugin", ["http://localhost/"]), action])
+    assert len(keyed) == 3
+    assert list(keyed) == list(_keyed_actions([action] * 3))
+
+
+def _free_address() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return "127.0.0.1:%d" % sock.getsockname()[1]
+
+
+class _FakeNode(object):
+    # Connects like a worker node and keeps the last assignment it got
+    def __init__(self, address, node_id) -> None:
+        host, port = parse_address(address)
+        self.channel = _Channel(socket.create_connection((host, port)))
+        self.node_id = node_id
+        self.titles = None
+        self.n_assignments = 0
+
+    def join(self) -> None:
+        self.channel.send(_MSG_HELLO, node_id=self.node_id)
+        try:
+            while True:
+                msg = self.channel.recv()
+                self.titles = sorted(a["title"] for a in msg["actions"])
+                self.n_assignments += 1
+        except (ConnectionError, OSError, ValueError):
+            pass
+
+
+def test_concurrent_joins_end_with_the_latest_assignments():
+    actions = [Action("action-%d" % i, "Plugin", ["http://localhost/%d" % i]) for i in range(50)]
+    titles = {key: action.title for key, action in _keyed_actions(actions).items()}
+    coordinator = Coordinator(actions, RunConfig(cluster_address=_free_address()))
+    coordinator.start()
+    nodes = [_FakeNode(coordinator.run_cfg.cluster_address, "node-%d" % i) for i in range(6)]
+    try:
+        for node in nodes:
+            Thread(target=node.join, daemon=True).start()
+        deadline = monotonic() + TIMEOUT
+        while len(coordinator.workers) < len(nodes) and monotonic() < deadline:
+            sleep(0.01)
+        assert len(coordinator.workers) == len(nodes)
+
+        # Once settled, the last assignment every node got is the one the coordinator has it down for
+        def assigned():
+            return {w.worker_id: sorted(titles[k] for k in w.action_keys) for w in coordinator.workers}
+
+        while {node.node_id: node.titles for node in nodes} != assigned() and monotonic() < deadline:
+            sleep(0.01)
+        sleep(0.2)
+        assert {node.node_id: node.titles for node in nodes} == assigned()
+        assert sorted(t for node in nodes for t in node.titles) == sorted(titles.values())
+    finally:
+        coordinator.shut_down()
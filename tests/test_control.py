@@ -0,0 +1,65 @@
+import os
+import stat
+
+import pytest
+
+from pywb.core import service
+from pywb.core.control import ControlClient, ControlServer
+from pywb.settings import SETTINGS
+
+
+def _handle_command(command, **args):
+    if command == "reload":
+        raise RuntimeError("The pywb service is not running")
+    return {"command": command, "args": args}
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = ControlServer(_handle_command, socket_path=str(tmp_path / "pywb.sock"))
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_request_round_trip(server):
+    client = ControlClient(server.socket_path)
+    assert client.available()
+    assert client.request("status", table=True) == {"command": "status", "args": {"table": True}}
+    with pytest.raises(RuntimeError, match="not running"):
+        client.request("reload")
+    with pytest.raises(RuntimeError, match="Unknown command"):
+        client.request("restart")
+
+
+def test_stop_removes_socket(tmp_path):
+    server = ControlServer(_handle_command, socket_path=str(tmp_path / "pywb.sock"))
+    server.start()
+    server.stop()
+    assert not ControlClient(server.socket_path).available()
+    assert not (tmp_path / "pywb.sock").exists()
+
+
+def test_second_server_is_refused(server):
+    with pytest.raises(RuntimeError, match="already serving"):
+        ControlServer(_handle_command, socket_path=server.socket_path).start()
+    # The first one keeps serving
+    assert ControlClient(server.socket_path).request("status")["command"] == "status"
+
+
+def test_serve_fails_while_another_daemon_serves(server, monkeypatch):
+    monkeypatch.setattr(SETTINGS, "configure_logging", lambda: None)
+    assert service.serve(socket_path=server.socket_path) == 1
+    assert ControlClient(server.socket_path).available()
+
+
+def test_socket_is_private_to_the_user(server):
+    assert stat.S_IMODE(os.stat(server.socket_path).st_mode) == 0o600
+
+
+def test_serve_fails_on_missing_actions(tmp_path, monkeypatch):
+    monkeypatch.setattr(SETTINGS, "configure_logging", lambda: None)
+    monkeypatch.setattr(service.signal, "signal", lambda *_: None)
+    socket_path = str(tmp_path / "pywb.sock")
+    assert service.serve(actions_path=str(tmp_path / "missing.yml"), socket_path=socket_path) == 1
+    assert not ControlClient(socket_path).available()
@@ -0,0 +1,67 @@
+import socket
+from time import sleep
+
+import pytest
+
+from pywb.web import By
+from pywb.web.browser import PageLoad
+from pywb.web.http import Http
+
+
+@pytest.fixture
+def browser():
+    browser = Http()
+    browser.load_driver()
+    yield browser
+    browser.quit()
+
+
+def _closed_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return "http://127.0.0.1:%d/product" % sock.getsockname()[1]
+
+
+def test_load_and_scrape(server, browser):
+    url = server + "/product"
+    browser.load_urls([url])
+    results = browser.scrape([url, url], [By.BUTTON, By.LINK], ["Sold Out", "Cart"])
+    assert [(r.tag, r.text) for r in results] == [("button", "Sold Out"), ("a", "Cart")]
+    assert "disabled" in results[0].attributes
+    assert results[1].attributes["href"] == "/cart"
+
+
+def test_follows_redirects(server, browser):
+    url = server + "/moved"
+    browser.load_urls([url])
+    assert [r.text for r in browser.scrape([url], [By.BUTTON], ["Sold Out"])] == ["Sold Out"]
+
+
+def test_failed_fetch_leaves_url_unloaded(server, browser):
+    url = _closed_port_url()
+    with pytest.raises(OSError):
+        browser.load_urls([url])
+    assert url not in browser._window_map
+    browser.close_urls([url])
+    # Loaded urls are scraped as usual
+    loaded = server + "/product"
+    browser.load_urls([loaded])
+    assert browser.refresh_sites() == {loaded: browser.load_times[loaded]}
+    assert len(browser.scrape([loaded], [By.BUTTON], ["Sold Out"])) == 1
+
+
+def test_close_urls(server, browser):
+    url = server + "/product"
+    browser.load_urls([url])
+    browser.close_urls([url, url])
+    assert url not in browser._window_map
+
+
+def test_fetch_after_timeout(server, browser):
+    with pytest.raises(OSError):
+        browser.load_urls([server + "/slow"], page_load=PageLoad(timeout=0.2))
+    # The late response of the timed out request must not be read as this one's
+    url = server + "/product"
+    sleep(1)
+    browser.load_urls([url])
+    assert len(browser.scrape([url], [By.BUTTON], ["Sold Out"])) == 1
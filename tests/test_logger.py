@@ -0,0 +1,44 @@
+import json
+import logging
+import sys
+from queue import Queue
+
+from pywb.core.logger import _JsonFormatter, _LogQueueHandler, _RotatingLogHandler
+
+
+def _open_log(log_path) -> None:
+    handler = _RotatingLogHandler(str(log_path), max_bytes=0, backup_count=3, rotate_seconds=0)
+    handler.stream.write("line\n")
+    handler.close()
+
+
+def test_log_is_rolled_over_once_per_process(tmp_path):
+    log_path = tmp_path / "pywb.out"
+    log_path.write_text("previous run\n")
+    _open_log(log_path)
+    assert (tmp_path / "pywb.out.1.gz").exists()
+    # Reconfigured (i.e. 'set log_format') - same log, kept as it is
+    _open_log(log_path)
+    assert not (tmp_path / "pywb.out.2.gz").exists()
+    assert log_path.read_text() == "line\nline\n"
+
+
+def _prepared_error_record():
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = logging.getLogger("test").makeRecord("test", logging.ERROR, __file__, 0, "Check of '%s' failed",
+                                                      ("action",), sys.exc_info())
+    return _LogQueueHandler(Queue()).prepare(record)
+
+
+def test_exception_is_a_field_of_json_records():
+    entry = json.loads(_JsonFormatter().format(_prepared_error_record()))
+    assert entry["message"] == "Check of 'action' failed"
+    assert "ZeroDivisionError" in entry["exception"]
+
+
+def test_exception_follows_the_message_of_text_records():
+    lines = logging.Formatter("%(message)s").format(_prepared_error_record()).splitlines()
+    assert lines[0] == "Check of 'action' failed"
+    assert lines[-1] == "ZeroDivisionError: division by zero"
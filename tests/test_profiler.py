@@ -0,0 +1,26 @@
+from threading import Barrier, Thread
+
+from pywb.core.profiler import run_profiled
+
+TIMEOUT = 5
+
+
+def test_concurrent_runners_are_sampled(tmp_path):
+    # Both functions run at the same time - only one of them can hold cProfile
+    barrier = Barrier(2, timeout=TIMEOUT)
+    threads = [Thread(target=run_profiled, args=(barrier.wait, str(tmp_path / ("runner-%d" % i))))
+               for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(list(tmp_path.glob("*.pstats"))) == 1
+    assert len(list(tmp_path.glob("*.collapsed"))) == 1
+    assert len(list(tmp_path.glob("*.txt"))) == 2
+
+
+def test_profiles_one_after_another(tmp_path):
+    for i in range(2):
+        run_profiled(lambda: sum(range(1000)), str(tmp_path / ("runner-%d" % i)))
+    assert len(list(tmp_path.glob("*.pstats"))) == 2
@@ -0,0 +1,154 @@
+import threading
+from time import monotonic, sleep
+
+import pytest
+
+from pywb.core.action import Action
+from pywb.core.metrics import METRICS
+from pywb.core.plugin import Plugin
+from pywb.core.plugin_manager import PluginManager
+from pywb.core.run_manager import RunManager, RunManagerStatus, _action_key
+from pywb.core.runner import RunConfig
+from pywb.web.http import Http
+
+TIMEOUT = 10
+
+
+class _Notifier(object):
+    def notify(self, title, message, link) -> None:
+        pass
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def _action(server, i, title=None, **options) -> Action:
+    return Action(title or "action-%d" % i, "InStockNotifier", ["%s/product/%d" % (server, i)], options=options,
+                  watch=["Button"], text=["Sold Out"], notify_on=["Disappear"])
+
+
+def test_action_key_matches_content():
+    action = Action("title", "Plugin", ["http://localhost/"], options={"refresh_rate": 5}, watch=["Button"],
+                    text=["Sold Out"])
+    same = Action("title", "Plugin", ["http://localhost/"], options={"refresh_rate": 5}, text=["Sold Out"],
+                  watch=["Button"])
+    assert _action_key(action) == _action_key(same)
+    assert _action_key(action) != _action_key(Action("title", "Plugin", ["http://localhost/other"],
+                                                     options={"refresh_rate": 5}, watch=["Button"], text=["Sold Out"]))
+
+
+def test_action_key_without_schedule_options():
+    action = Action("title", "Plugin", ["http://localhost/"], options={"refresh_rate": 5, "priority": 1})
+    rescheduled = Action("title", "Plugin", ["http://localhost/"], options={"refresh_rate": 10, "jitter": 2})
+    assert _action_key(action) != _action_key(rescheduled)
+    assert _action_key(action, schedule=False) == _action_key(rescheduled, schedule=False)
+    # Other options still tell actions apart
+    blocked = Action("title", "Plugin", ["http://localhost/"], options={"refresh_rate": 5, "block": ["image"]})
+    assert _action_key(action, schedule=False) != _action_key(blocked, schedule=False)
+
+
+@pytest.fixture
+def run_manager(server):
+    plugin_manager = PluginManager()
+    plugin_manager.load_builtin_plugins()
+    run_cfg = RunConfig(actions_path="actions.yml", refresh_rate=1, notifier=_Notifier(), max_browsers=2,
+                        load_timeout=5)
+    run_manager = RunManager(actions=[_action(server, i) for i in range(4)], plugins=plugin_manager.loaded_plugins,
+                             browser=Http, run_cfg=run_cfg)
+    run_manager.start()
+    assert run_manager.wait_started(TIMEOUT)
+    yield run_manager
+    run_manager.shut_down()
+    run_manager.join(TIMEOUT)
+    assert run_manager.status == RunManagerStatus.STOPPED
+
+
+def test_reload_applies_only_the_difference(server, run_manager):
+    runners = {row[0]: row for row in run_manager.runner_status_rows()}
+    result = run_manager.reload([
+        # Unchanged
+        _action(server, 0),
+        # Repeated - a runner of its own
+        _action(server, 0),
+        # Only its schedule changed
+        _action(server, 1, refresh_rate=5),
+        # Replaced by an action with another title
+        _action(server, 2, title="renamed"),
+    ])
+    assert result == {"started": 2, "stopped": 2, "reconfigured": 1, "unchanged": 1}
+    rows = run_manager.runner_status_rows()
+    assert sorted(row[0] for row in rows) == ["action-0", "action-0", "action-1", "renamed"]
+    rescheduled = next(row for row in rows if row[0] == "action-1")
+    assert rescheduled[3] == "5"
+    # Reconfigured in place - still the same browser
+    assert rescheduled[2] == runners["action-1"][2]
+
+
+def test_reload_without_changes(server, run_manager):
+    result = run_manager.reload([_action(server, i) for i in range(4)])
+    assert result == {"started": 0, "stopped": 0, "reconfigured": 0, "unchanged": 4}
+
+
+def _wait_for(condition) -> bool:
+    deadline = monotonic() + TIMEOUT
+    while not condition() and monotonic() < deadline:
+        sleep(0.05)
+    return condition()
+
+
+def test_reload_drops_the_metrics_of_removed_actions(server, run_manager):
+    assert _wait_for(lambda: 'action="action-3"' in METRICS.render_prometheus())
+    run_manager.reload([_action(server, i) for i in range(3)])
+    # Once its runner exited
+    assert _wait_for(lambda: 'action="action-3"' not in METRICS.render_prometheus())
+    assert 'action="action-0"' in METRICS.render_prometheus()
+
+
+class _SyncPlugin(Plugin):
+    # Blocks in its run loop like any plugin that isn't async
+    def __init__(self) -> None:
+        super().__init__("SyncPlugin", "0.1")
+
+    def initialize(self, browser, run_cfg) -> None:
+        super().initialize(browser, run_cfg)
+
+    def validate(self) -> None:
+        pass
+
+    def run(self) -> None:
+        super().run()
+        while not self._shut_down:
+            self._sleep_on_refresh_rate()
+
+    def stop(self) -> None:
+        super().stop()
+
+
+def _sync_action(server, i) -> Action:
+    return Action("sync-%d" % i, "SyncPlugin", ["%s/product/%d" % (server, i)])
+
+
+def _plugin_threads() -> list:
+    return [t for t in threading.enumerate() if t.name.startswith("pywb-plugin")]
+
+
+def test_reloads_share_the_plugin_threads(server):
+    run_cfg = RunConfig(actions_path="actions.yml", refresh_rate=1, notifier=_Notifier(), max_browsers=2,
+                        load_timeout=5, engine="async")
+    run_manager = RunManager(actions=[_sync_action(server, i) for i in range(2)], plugins={"SyncPlugin": _SyncPlugin},
+                             browser=Http, run_cfg=run_cfg)
+    run_manager.start()
+    assert run_manager.wait_started(TIMEOUT)
+    try:
+        for i in range(2, 8):
+            # One action replaced by another every time
+            run_manager.reload([_sync_action(server, 0), _sync_action(server, i)])
+            # Until the replaced plugin exited and the new one runs
+            sleep(0.2)
+        # Threads of the plugins that exited are reused - no more than ran at once
+        assert len(_plugin_threads()) <= 3
+    finally:
+        run_manager.shut_down()
+        run_manager.join(TIMEOUT)
+    assert run_manager.status == RunManagerStatus.STOPPED
+    assert _wait_for(lambda: not _plugin_threads())
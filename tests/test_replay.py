@@ -0,0 +1,22 @@
+from pywb.web.replay import Replay, SnapshotStore
+
+PAGES = [b"<html><body><button>Page %d</button></body></html>" % i for i in range(3)]
+
+
+def test_parsed_documents_are_bounded(monkeypatch):
+    monkeypatch.setattr(Replay, "MAX_PARSED_DOCUMENTS", 2)
+    replay = Replay()
+    first, second = replay._parse(PAGES[0]), replay._parse(PAGES[1])
+    # Reused, which also makes it the most recently used one
+    assert replay._parse(PAGES[0]) is first
+    replay._parse(PAGES[2])
+    assert replay._parse(PAGES[0]) is first
+    assert replay._parse(PAGES[1]) is not second
+
+
+def test_stored_documents_outlive_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(SnapshotStore, "MAX_CACHED_DOCUMENTS", 1)
+    store = SnapshotStore(str(tmp_path))
+    digests = [store.put("http://localhost/product", page, 0.1) for page in PAGES]
+    for _ in range(2):
+        assert [store.get(digest) for digest in digests] == PAGES
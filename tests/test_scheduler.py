@@ -0,0 +1,180 @@
+from threading import Thread
+from time import monotonic, sleep
+
+import pytest
+
+from pywb.core.action import Action
+from pywb.core.plugin import Plugin
+from pywb.core.runner import RunConfig, Runner
+from pywb.core.scheduler import Scheduler
+
+TIMEOUT = 5
+
+
+class _Browser(object):
+    def load_driver(self):
+        pass
+
+    def load_urls(self, urls):
+        pass
+
+    def quit(self):
+        pass
+
+
+class _RaisingPlugin(Plugin):
+    def __init__(self) -> None:
+        super().__init__("RaisingPlugin", "0.0.1")
+
+    def initialize(self, browser, run_cfg) -> None:
+        super().initialize(browser, run_cfg)
+
+    def validate(self) -> None:
+        pass
+
+    def run(self) -> None:
+        super().run()
+        # Fails while holding the browser's slot
+        self._sleep_on_refresh_rate()
+        raise RuntimeError("check failed")
+
+    def stop(self) -> None:
+        super().stop()
+
+
+def _wait_turn(scheduler, schedule) -> bool:
+    # True once the schedule was admitted
+    waiter = Thread(target=scheduler.wait_turn, args=(schedule,), daemon=True)
+    waiter.start()
+    waiter.join(TIMEOUT)
+    return not waiter.is_alive()
+
+
+def _until(predicate) -> bool:
+    deadline = monotonic() + TIMEOUT
+    while not predicate():
+        if monotonic() > deadline:
+            return False
+        sleep(0.01)
+    return True
+
+
+def _scheduler(max_in_flight=1) -> Scheduler:
+    scheduler = Scheduler(max_in_flight=max_in_flight)
+    scheduler.start()
+    return scheduler
+
+
+def test_admits_up_to_max_in_flight_per_resource():
+    scheduler = _scheduler(max_in_flight=1)
+    first = scheduler.register("first", 0, resource="browser")
+    second = scheduler.register("second", 0, resource="browser")
+    other = scheduler.register("other", 0, resource="other-browser")
+    try:
+        assert _wait_turn(scheduler, first)
+        assert first.granted_at is not None
+        # The browser is saturated - other browsers aren't
+        waiter = Thread(target=scheduler.wait_turn, args=(second,), daemon=True)
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive()
+        assert _wait_turn(scheduler, other)
+        # Ending the first check frees its slot
+        Thread(target=scheduler.wait_turn, args=(first,), daemon=True).start()
+        waiter.join(TIMEOUT)
+        assert not waiter.is_alive()
+        assert first.n_checks == 1
+    finally:
+        scheduler.shut_down()
+
+
+def test_unregister_releases_slot():
+    scheduler = _scheduler()
+    first = scheduler.register("first", 0, resource="browser")
+    second = scheduler.register("second", 0, resource="browser")
+    try:
+        assert _wait_turn(scheduler, first)
+        scheduler.unregister(first)
+        assert not first.active
+        assert first.granted_at is None
+        assert _wait_turn(scheduler, second)
+    finally:
+        scheduler.shut_down()
+
+
+def test_higher_priority_admitted_first():
+    scheduler = _scheduler()
+    holder = scheduler.register("holder", 0, resource="browser")
+    low = scheduler.register("low", 0, priority=0, resource="browser")
+    high = scheduler.register("high", 0, priority=5, resource="browser")
+    try:
+        assert _wait_turn(scheduler, holder)
+        admitted = []
+        for schedule in (low, high):
+            Thread(target=lambda s=schedule: (scheduler.wait_turn(s), admitted.append(s.key)), daemon=True).start()
+        assert _until(lambda: low._wake is not None and high._wake is not None)
+        scheduler.unregister(holder)
+        assert _until(lambda: admitted)
+        assert admitted == ["high"]
+    finally:
+        scheduler.shut_down()
+
+
+def test_shut_down_wakes_waiting_checks():
+    scheduler = _scheduler()
+    first = scheduler.register("first", 0, resource="browser")
+    second = scheduler.register("second", 0, resource="browser")
+    assert _wait_turn(scheduler, first)
+    waiter = Thread(target=scheduler.wait_turn, args=(second,), daemon=True)
+    waiter.start()
+    scheduler.shut_down()
+    waiter.join(TIMEOUT)
+    assert not waiter.is_alive()
+
+
+def test_raising_plugin_frees_its_browser_slot():
+    scheduler = _scheduler()
+    run_cfg = RunConfig(action=Action("raising", "RaisingPlugin", ["http://localhost/"]))
+    run_cfg.scheduler = scheduler
+    run_cfg.schedule = scheduler.register("raising", 0, resource="browser")
+    other = scheduler.register("other", 0, resource="browser")
+    try:
+        runner = Runner(_RaisingPlugin, _Browser(), run_cfg)
+        runner.start()
+        runner.join(TIMEOUT)
+        assert not runner.is_alive()
+        assert run_cfg.schedule.granted_at is None
+        assert _wait_turn(scheduler, other)
+    finally:
+        scheduler.shut_down()
+
+
+@pytest.mark.parametrize("interval, jitter, priority", [("fast", 0, 0), (5, "a lot", 0), (5, 0, "high"), (-1, 0, 0),
+                                                        (5, -1, 0)])
+def test_invalid_timing_is_rejected(interval, jitter, priority):
+    scheduler = Scheduler()
+    with pytest.raises(ValueError, match="'action'"):
+        scheduler.register("action", interval, jitter=jitter, priority=priority)
+    schedule = scheduler.register("action", 5)
+    with pytest.raises(ValueError, match="'action'"):
+        scheduler.reconfigure(schedule, interval, jitter=jitter, priority=priority)
+
+
+def test_timing_is_converted():
+    schedule = Scheduler().register("action", "5", jitter="0.5", priority="2")
+    assert (schedule.interval, schedule.jitter, schedule.priority) == (5, 0.5, 2)
+
+
+def test_bad_schedule_does_not_stop_the_scheduler():
+    scheduler = _scheduler()
+    bad = scheduler.register("bad", 0, resource="browser")
+    good = scheduler.register("good", 0, resource="browser")
+    # Changed behind the scheduler's back - never ordered
+    bad.priority = "high"
+    try:
+        Thread(target=scheduler.wait_turn, args=(bad,), daemon=True).start()
+        assert _until(lambda: bad._wake is not None and bad._seq is None)
+        assert scheduler.is_alive()
+        assert _wait_turn(scheduler, good)
+    finally:
+        scheduler.shut_down()
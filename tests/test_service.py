@@ -0,0 +1,75 @@
+from functools import partial
+from time import monotonic, sleep
+
+import pytest
+
+from pywb.core import service
+from pywb.core.action import compile_actions
+from pywb.core.plugin_manager import PluginManager
+from pywb.core.run_manager import RunManagerStatus
+from pywb.web.http import Http
+
+TIMEOUT = 10
+ACTIONS = """
+product:
+  - plugin: InStockNotifier
+    urls: ["%s/product"]
+    watch: [Button]
+    text: [Sold Out]
+    notify_on: [Disappear]
+"""
+
+
+class _Notifier(object):
+    instances = []
+
+    def __init__(self, remote_notifications=False) -> None:
+        self.shut_down_calls = 0
+        _Notifier.instances.append(self)
+
+    def notify(self, title, message, link) -> None:
+        pass
+
+    def shut_down(self, timeout=10) -> None:
+        self.shut_down_calls += 1
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+@pytest.fixture
+def bot_service(server, tmp_path, monkeypatch):
+    _Notifier.instances = []
+    monkeypatch.setattr(service, "Notifier", _Notifier)
+    monkeypatch.setattr(service, "load_browser", lambda _: Http)
+    monkeypatch.setattr(service, "compile_actions", partial(compile_actions, cache_dir=str(tmp_path / "plans")))
+    plugin_manager = PluginManager()
+    plugin_manager.load_builtin_plugins()
+    actions_path = tmp_path / "actions.yml"
+    actions_path.write_text(ACTIONS % server)
+    bot_service = service.BotService(plugin_manager)
+    yield bot_service, str(actions_path)
+    bot_service.stop(blocking=True)
+
+
+def test_failed_start_shuts_down_the_notifier(bot_service, monkeypatch):
+    def fail(_):
+        raise RuntimeError("No browser")
+
+    monkeypatch.setattr(service, "load_browser", fail)
+    with pytest.raises(RuntimeError, match="No browser"):
+        bot_service[0].start(bot_service[1], engine="thread")
+    assert [n.shut_down_calls for n in _Notifier.instances] == [1]
+
+
+def test_stop_shuts_down_the_notifier(bot_service):
+    bot_service, actions_path = bot_service
+    bot_service.start(actions_path, engine="thread")
+    assert bot_service.status == RunManagerStatus.RUNNING
+    # Not waiting for the runners - the notifier is shut down once they are done
+    assert bot_service.stop()
+    notifier = bot_service.run_manager.run_cfg.notifier
+    deadline = monotonic() + TIMEOUT
+    while not notifier.shut_down_calls and monotonic() < deadline:
+        sleep(0.01)
+    assert notifier.shut_down_calls == 1
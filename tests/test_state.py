@@ -0,0 +1,64 @@
+from pywb.core.state import PluginState, StateStore
+
+
+def test_round_trip(tmp_path):
+    db_path = str(tmp_path / "state" / "plugin_state.db")
+    store = StateStore(db_path)
+    store.put("Plugin", "action", "http://localhost/a", "baseline", {"Sold Out": True})
+    store.put("Plugin", "action", "http://localhost/b", "baseline", [1, 2])
+    store.put("Plugin", "action", "http://localhost/c", "baseline", "removed")
+    store.delete("Plugin", "action", "http://localhost/c", "baseline")
+    store.put("Plugin", "other action", "http://localhost/a", "baseline", "other")
+    store.close()
+
+    store = StateStore(db_path)
+    try:
+        assert store.load("Plugin", "action") == {("http://localhost/a", "baseline"): {"Sold Out": True},
+                                                  ("http://localhost/b", "baseline"): [1, 2]}
+        assert store.load("Plugin", "other action") == {("http://localhost/a", "baseline"): "other"}
+        assert store.load("Other", "action") == {}
+    finally:
+        store.close()
+
+
+def test_load_sees_pending_writes(tmp_path):
+    store = StateStore(str(tmp_path / "plugin_state.db"))
+    # Nothing is written before the next batch
+    store.FLUSH_INTERVAL = 60
+    try:
+        store.put("Plugin", "action", "url", "key", 1)
+        store.flush()
+        store.put("Plugin", "action", "url", "key", 2)
+        store.delete("Plugin", "action", "url", "other")
+        assert store.load("Plugin", "action") == {("url", "key"): 2}
+        store.delete("Plugin", "action", "url", "key")
+        assert store.load("Plugin", "action") == {}
+    finally:
+        store.close()
+
+
+def test_plugin_state_writes_through(tmp_path):
+    db_path = str(tmp_path / "plugin_state.db")
+    store = StateStore(db_path)
+    state = PluginState(store, "Plugin", "action")
+    state.set("http://localhost/a", "baseline", True)
+    state.set("http://localhost/b", "baseline", False)
+    state.delete("http://localhost/b", "baseline")
+    assert state.items("baseline") == {"http://localhost/a": True}
+    store.close()
+
+    store = StateStore(db_path)
+    try:
+        state = PluginState(store, "Plugin", "action")
+        assert state.get("http://localhost/a", "baseline") is True
+        assert state.get("http://localhost/b", "baseline", "missing") == "missing"
+    finally:
+        store.close()
+
+
+def test_plugin_state_in_memory():
+    state = PluginState(None, "Plugin", "action")
+    state.set("url", "key", 1)
+    assert state.get("url", "key") == 1
+    state.delete("url", "key")
+    assert state.items("key") == {}
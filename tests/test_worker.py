@@ -0,0 +1,51 @@
+import subprocess
+import sys
+from multiprocessing import get_context
+from time import monotonic, sleep
+
+import psutil
+
+from pywb.core.worker import _terminate_tree
+
+TIMEOUT = 10
+# Stands in for a driver - ignores SIGTERM like a hung one would
+_HUNG_CHILD = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(60)"
+
+
+def _worker_with_children(n_children, ignore_term) -> None:
+    children = [subprocess.Popen([sys.executable, "-c", _HUNG_CHILD if ignore_term else "import time; time.sleep(60)"])
+                for _ in range(n_children)]
+    for child in children:
+        child.wait()
+
+
+def _start_worker(ignore_term):
+    process = get_context("spawn").Process(target=_worker_with_children, args=(2, ignore_term), daemon=True)
+    process.start()
+    deadline = monotonic() + TIMEOUT
+    while len(psutil.Process(process.pid).children()) < 2 and monotonic() < deadline:
+        sleep(0.05)
+    children = psutil.Process(process.pid).children(recursive=True)
+    assert len(children) == 2
+    return process, children
+
+
+def _alive(process) -> bool:
+    try:
+        return process.status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def test_children_of_a_terminated_worker_are_terminated():
+    process, children = _start_worker(ignore_term=False)
+    _terminate_tree(process, timeout=TIMEOUT)
+    assert not process.is_alive()
+    assert not any(_alive(child) for child in children)
+
+
+def test_children_ignoring_terminate_are_killed():
+    process, children = _start_worker(ignore_term=True)
+    _terminate_tree(process, timeout=1)
+    assert not process.is_alive()
+    assert not any(_alive(child) for child in children)